@@ -0,0 +1,131 @@
+"""
+Buffered audit log writer.
+
+Views call record() instead of AuditLog.objects.create(). Entries are queued
+when the request's transaction commits (so rolled-back writes leave no
+trail) and a background thread writes them with one bulk_create every
+AUDIT_LOG_FLUSH_INTERVAL seconds, or sooner once AUDIT_LOG_BATCH_SIZE are
+waiting. The request never waits on the audit insert.
+
+If a flush fails (database unreachable) the batch is appended to the
+AUDIT_LOG_SPOOL_PATH JSON-lines file; `manage.py replay_audit_spool` loads it
+back. Whatever is still queued when the process exits is flushed then.
+
+With AUDIT_LOG_ASYNC = False entries are written synchronously on commit,
+which is what management commands and scripts that exit straight away want.
+"""
+import atexit
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_queue = []
+_wake = threading.Event()
+_worker = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def record(actor, action, entity=None, diff=None):
+    """
+    Queue an audit entry. `entity` is the model instance acted on; its type
+    and id are stored alongside the free-text `action`. `diff` is a dict of
+    the field values the action set (or, for deletes, removed).
+    """
+    entry = AuditLog(
+        user_name=actor or "Unknown",
+        action=action[:255],
+        timestamp=timezone.now(),
+        entity_type=entity._meta.model_name if entity is not None else "",
+        entity_id=entity.pk if entity is not None else None,
+        diff=json.loads(json.dumps(diff, cls=DjangoJSONEncoder)) if diff else None,
+    )
+    transaction.on_commit(lambda: _enqueue(entry))
+
+
+def snapshot(instance, fields):
+    """{field: value} of `instance` for use as a record() diff."""
+    return {field: getattr(instance, field) for field in fields}
+
+
+def _enqueue(entry):
+    if not _setting("AUDIT_LOG_ASYNC", True):
+        _write([entry])
+        return
+
+    with _lock:
+        _queue.append(entry)
+        backlog = len(_queue)
+    _ensure_worker()
+    if backlog >= _setting("AUDIT_LOG_BATCH_SIZE", 100):
+        _wake.set()
+
+
+def _ensure_worker():
+    global _worker
+    with _lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=_run, name="audit-log-writer", daemon=True)
+        _worker.start()
+
+
+def _run():
+    while True:
+        _wake.wait(_setting("AUDIT_LOG_FLUSH_INTERVAL", 2.0))
+        _wake.clear()
+        flush()
+        # This thread's connection would otherwise stay open between flushes
+        close_old_connections()
+
+
+def flush():
+    """Write everything queued so far. Returns the number of entries handled."""
+    with _lock:
+        batch = _queue[:]
+        del _queue[:]
+    if batch:
+        _write(batch)
+    return len(batch)
+
+
+def _write(batch):
+    try:
+        AuditLog.objects.bulk_create(batch, batch_size=500)
+    except Exception:
+        logger.exception("Audit log flush failed; spooling %d entries", len(batch))
+        _spool(batch)
+
+
+def _spool(batch):
+    path = _setting("AUDIT_LOG_SPOOL_PATH", "audit_spool.jsonl")
+    try:
+        with open(path, "a", encoding="utf-8") as spool:
+            for entry in batch:
+                spool.write(json.dumps({
+                    "user_name": entry.user_name,
+                    "action": entry.action,
+                    "timestamp": entry.timestamp,
+                    "entity_type": entry.entity_type,
+                    "entity_id": entry.entity_id,
+                    "diff": entry.diff,
+                }, cls=DjangoJSONEncoder) + "\n")
+    except OSError:
+        # Nowhere left to put them — at least get them into the logs
+        for entry in batch:
+            logger.error("Lost audit entry: %s | %s | %s", entry.timestamp, entry.user_name, entry.action)
+
+
+atexit.register(flush)
@@ -0,0 +1,245 @@
+"""
+Bulk import of receipts and payments from CSV files such as bank statements.
+
+Rows are read as a stream and handled in batches of IMPORT_BATCH_SIZE. Each
+batch is validated with TransactionImportSerializer (TransactionSerializer's
+rules, with job and client ids looked up once per batch), numbered from one
+VoucherSequence.allocate() block per prefix and written with one
+bulk_create. bulk_create skips Transaction.save(), so the batch's ledger
+movement is added to ClientBalanceSnapshot once per client-month and the
+clients' revisions are bumped once, here.
+
+The import is one database transaction. If any row is invalid nothing is
+written, unless skip_invalid is set, in which case the valid rows go in and
+the rest are reported. A dry run does everything and then rolls back.
+
+Columns (header names are case-insensitive):
+    date, amount, trans_type (CR/CP/BR/BP), description, party_name,
+    client (id), job (id), bank_name, cheque_no, voucher_no
+A bank statement can give `debit` and `credit` columns instead of
+trans_type/amount: a credit (money in) becomes a BR receipt and a debit
+(money out) a BP payment.
+"""
+import csv
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from . import audit
+from .models import Client, ClientBalanceSnapshot, Job, Transaction, VoucherSequence
+from .serializers import TransactionImportSerializer
+
+IMPORT_BATCH_SIZE = 1000
+# Errors beyond this many are counted but not listed in the report
+IMPORT_MAX_REPORTED_ERRORS = 200
+
+COLUMN_ALIASES = {
+    "type": "trans_type",
+    "party": "party_name",
+    "bank": "bank_name",
+    "cheque": "cheque_no",
+    "voucher": "voucher_no",
+    "client_id": "client",
+    "job_id": "job",
+}
+COLUMNS = {
+    "date", "amount", "trans_type", "description", "party_name", "client", "job",
+    "bank_name", "cheque_no", "voucher_no", "debit", "credit",
+}
+
+
+class ImportFormatError(ValueError):
+    """The file as a whole can't be imported (wrong columns, not CSV)."""
+
+
+def read_csv(stream):
+    """
+    Yields (line number, row dict) for each data row of the CSV text
+    `stream`, with the header names mapped to the import columns.
+    """
+    reader = csv.reader(stream)
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise ImportFormatError("The file is empty.")
+
+    names = []
+    for name in header:
+        name = name.strip().lower().replace(" ", "_")
+        names.append(COLUMN_ALIASES.get(name, name))
+
+    if "date" not in names:
+        raise ImportFormatError("The file needs a 'date' column.")
+    if "amount" not in names and not {"debit", "credit"} & set(names):
+        raise ImportFormatError("The file needs an 'amount' column or 'debit'/'credit' columns.")
+
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        row = {}
+        for name, value in zip(names, values):
+            if name in COLUMNS and value.strip():
+                row[name] = value.strip()
+        yield reader.line_num, row
+
+
+def _normalise(row):
+    """
+    (serializer data, None) for a parsed row, or (None, errors) when its
+    debit/credit columns don't make sense.
+    """
+    data = dict(row)
+    if "amount" in data:
+        data["amount"] = data["amount"].replace(",", "")
+
+    debit = data.pop("debit", "").replace(",", "")
+    credit = data.pop("credit", "").replace(",", "")
+    if debit and credit:
+        return None, {"non_field_errors": ["Fill in either debit or credit, not both."]}
+    if (debit or credit) and "amount" not in data:
+        data["amount"] = credit or debit
+        data.setdefault("trans_type", "BR" if credit else "BP")
+
+    if "trans_type" in data:
+        data["trans_type"] = data["trans_type"].upper()
+    return data, None
+
+
+def _ids(parsed, field):
+    ids = set()
+    for _, data, _ in parsed:
+        try:
+            ids.add(int(data[field]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return ids
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_transactions(rows, actor=None, source="CSV", dry_run=False, skip_invalid=False):
+    """
+    Imports (line number, row dict) pairs as read_csv() yields them and
+    returns a report: how many rows were read, valid and written, the
+    per-row errors and the voucher numbers issued.
+    """
+    report = {
+        "rows": 0,
+        "valid": 0,
+        "imported": 0,
+        "error_count": 0,
+        "errors": [],
+        "vouchers": {},
+        "dry_run": dry_run,
+    }
+
+    with transaction.atomic():
+        for batch in _batches(rows, IMPORT_BATCH_SIZE):
+            # Once a row has failed an all-or-nothing import, later batches
+            # are only validated so every error can be reported
+            write = skip_invalid or not report["error_count"]
+            _import_batch(batch, report, write)
+
+        failed = report["error_count"] and not skip_invalid
+        if failed or dry_run:
+            transaction.set_rollback(True)
+            if failed:
+                report["vouchers"] = {}
+            return report
+
+        report["imported"] = report["valid"]
+        if report["imported"]:
+            audit.record(
+                actor,
+                f"Imported {report['imported']} transactions from {source}"[:255],
+                diff={
+                    "rows": report["rows"],
+                    "imported": report["imported"],
+                    "skipped": report["error_count"],
+                    "vouchers": report["vouchers"],
+                },
+            )
+    return report
+
+
+def _import_batch(batch, report, write):
+    parsed = []
+    for line, row in batch:
+        data, errors = _normalise(row)
+        parsed.append((line, data, errors))
+    report["rows"] += len(parsed)
+
+    jobs = Job.objects.only("id", "client_id").in_bulk(_ids(parsed, "job"))
+    client_ids = _ids(parsed, "client") | {job.client_id for job in jobs.values()}
+    clients = dict(Client.objects.filter(pk__in=client_ids).values_list("id", "name"))
+    # One serializer validates the whole batch, as a ListSerializer's child
+    # would; building its fields per row would cost more than the inserts
+    validator = TransactionImportSerializer(context={"jobs": jobs, "clients": clients})
+
+    valid = []
+    for line, data, errors in parsed:
+        if errors is None:
+            try:
+                valid.append(Transaction(**validator.run_validation(data)))
+                continue
+            except ValidationError as exc:
+                errors = exc.detail
+        report["error_count"] += 1
+        if len(report["errors"]) < IMPORT_MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line, "errors": errors})
+
+    report["valid"] += len(valid)
+    if not write or not valid:
+        return
+
+    # What Transaction.save() would have filled in
+    for txn in valid:
+        if txn.job_id:
+            # Loaded already; ledger_effects() reads the job's client
+            txn.job = jobs[txn.job_id]
+            if not txn.client_id:
+                txn.client_id = txn.job.client_id
+        if txn.client_id and not txn.party_name:
+            txn.party_name = clients[txn.client_id]
+    _number_vouchers(valid, report["vouchers"])
+
+    Transaction.objects.bulk_create(valid, batch_size=500)
+
+    movement = defaultdict(lambda: [Decimal("0.000"), Decimal("0.000")])
+    for txn in valid:
+        for client_id, month, debit, credit in txn.ledger_effects():
+            movement[client_id, month][0] += debit
+            movement[client_id, month][1] += credit
+    for (client_id, month), (debit, credit) in movement.items():
+        ClientBalanceSnapshot.apply_delta(client_id, month, debit, credit)
+
+    Client.touch(client_ids=[txn.client_id for txn in valid])
+
+
+def _number_vouchers(transactions, issued):
+    """
+    Gives every row without a voucher number the next one for its prefix,
+    one allocate() per prefix. `issued` collects {prefix: [first, last]}.
+    """
+    by_prefix = defaultdict(list)
+    for txn in transactions:
+        if not txn.voucher_no:
+            by_prefix[Transaction.VOUCHER_PREFIXES.get(txn.trans_type, "TXN")].append(txn)
+
+    for prefix, rows in by_prefix.items():
+        first = VoucherSequence.allocate(prefix, len(rows))
+        for number, txn in enumerate(rows, start=first):
+            txn.voucher_no = VoucherSequence.format(prefix, number)
+        span = issued.setdefault(prefix, [VoucherSequence.format(prefix, first), None])
+        span[1] = VoucherSequence.format(prefix, first + len(rows) - 1)
@@ -0,0 +1,185 @@
+"""
+Keeps each job's INVOICE ledger transaction in step with its line items.
+
+Item writes, job saves and the bulk item endpoint all call
+mark_invoice_dirty() instead of recomputing straight away. Marks are
+coalesced per job, so however many items of a job change inside one
+transaction, SUM(total) and the INVOICE transaction are only touched once.
+
+The API's write views run inside syncing_invoices(), which does the
+recompute at the end of their atomic block: a failing recompute rolls the
+whole write back, as when the sync ran inline. Writes made anywhere else
+(admin, shell, commands) are recomputed by transaction.on_commit instead.
+"""
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job, Transaction
+
+logger = logging.getLogger(__name__)
+
+# job_id -> weak references to that job's pending marks. Each mark is owned
+# by its on_commit callback, so a rollback that discards the callback drops
+# the mark too, and it can't leak into a later transaction's recompute.
+_pending = threading.local()
+
+_stats_lock = threading.Lock()
+_stats = {"requested": 0, "recomputed": 0, "collapsed": 0, "skipped": 0, "failed": 0}
+
+
+class _Mark:
+    __slots__ = ("only_if_invoiced", "remove_when_empty", "__weakref__")
+
+    def __init__(self, only_if_invoiced, remove_when_empty):
+        self.only_if_invoiced = only_if_invoiced
+        self.remove_when_empty = remove_when_empty
+
+
+def invoice_sync_stats():
+    """Counters since process start: how many recomputes were asked for,
+    actually run, collapsed into another one, skipped (job not invoiced) or
+    failed after commit."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _pending_jobs():
+    if not hasattr(_pending, "jobs"):
+        _pending.jobs = {}
+    return _pending.jobs
+
+
+def _live_marks(job_id):
+    jobs = _pending_jobs()
+    marks = [mark for mark in (ref() for ref in jobs.get(job_id, ())) if mark is not None]
+    if marks:
+        jobs[job_id] = [weakref.ref(mark) for mark in marks]
+    else:
+        jobs.pop(job_id, None)
+    return marks
+
+
+def mark_invoice_dirty(job_id, only_if_invoiced=False, remove_when_empty=True):
+    """
+    Schedule an INVOICE transaction recompute for `job_id`, run at the end
+    of the enclosing syncing_invoices() block or else once the current
+    transaction commits (immediately when not in one). Repeated marks for
+    the same job before then collapse into a single recompute.
+
+    only_if_invoiced: skip the recompute unless the job is invoiced (item
+    signals). remove_when_empty: delete the INVOICE transaction when the job
+    has no billable items left; job saves pass False so editing a job's own
+    fields never removes ledger rows.
+    """
+    _count("requested")
+    mark = _Mark(only_if_invoiced, remove_when_empty)
+    _live_marks(job_id)
+    _pending_jobs().setdefault(job_id, []).append(weakref.ref(mark))
+
+    # One callback per mark; the first to run does the work and the rest
+    # find the job already flushed
+    transaction.on_commit(lambda: _flush_after_commit(job_id, mark))
+
+
+def _flush(job_id):
+    """Recompute `job_id` for its live marks, if it still has any."""
+    marks = _live_marks(job_id)
+    if not marks:
+        _count("collapsed")
+        return
+    _pending_jobs().pop(job_id, None)
+
+    # An unconditional mark wins over a conditional one, and any removal
+    # path may delete the transaction
+    only_if_invoiced = all(mark.only_if_invoiced for mark in marks)
+    remove_when_empty = any(mark.remove_when_empty for mark in marks)
+
+    job = Job.objects.select_related("client").filter(pk=job_id).first()
+    if job is None or (only_if_invoiced and not job.is_invoiced):
+        _count("skipped")
+        return
+
+    sync_invoice_transaction(job, remove_when_empty=remove_when_empty)
+    _count("recomputed")
+    logger.debug("Invoice transaction synced for job #%s (%s)", job_id, invoice_sync_stats())
+
+
+def _flush_after_commit(job_id, mark):
+    # `mark` is only here to keep it alive until the callback runs. The
+    # write is already committed, so an error can't undo it and must not
+    # turn the request into a 500; log it for reconcile_invoice_ledger.
+    try:
+        _flush(job_id)
+    except Exception:
+        _count("failed")
+        logger.exception("Invoice transaction sync failed for job #%s", job_id)
+
+
+def flush_invoice_syncs():
+    """Run every pending recompute now, inside the current transaction."""
+    for job_id in list(_pending_jobs()):
+        _flush(job_id)
+
+
+@contextmanager
+def syncing_invoices():
+    """
+    transaction.atomic() that runs the recomputes marked inside it before
+    the block ends, so an error in one rolls the writes back with it.
+    """
+    with transaction.atomic():
+        yield
+        flush_invoice_syncs()
+
+
+def invoice_transaction_fields(job, amount):
+    """Field values for a new INVOICE transaction of `amount` on `job`."""
+    return {
+        "amount": amount,
+        "description": f"Job #{job.id} - Invoiced Charges",
+        "date": timezone.now().date(),
+        "client": job.client,
+        "party_name": job.client.name if job.client else "",
+    }
+
+
+def sync_invoice_transaction(job, remove_when_empty=True):
+    """
+    Create/update the job's INVOICE debit to match its line items. When the
+    job has no billable items left the debit is removed, or with
+    remove_when_empty=False left as it is.
+    """
+    total_amount = job.get_total_amount()
+
+    with transaction.atomic():
+        if total_amount <= 0:
+            if remove_when_empty:
+                # All items removed — wipe the debit from the ledger
+                Transaction.objects.filter(job=job, trans_type="INVOICE").delete()
+            return
+
+        invoice_txn, created = Transaction.objects.get_or_create(
+            job=job,
+            trans_type="INVOICE",
+            defaults=invoice_transaction_fields(job, total_amount),
+        )
+
+        unchanged = (
+            invoice_txn.amount == total_amount
+            and invoice_txn.client_id == job.client_id
+        )
+        if not created and not unchanged:
+            invoice_txn.amount = total_amount
+            invoice_txn.client = job.client
+            invoice_txn.party_name = job.client.name if job.client else ""
+            invoice_txn.save()
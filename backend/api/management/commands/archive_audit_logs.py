@@ -0,0 +1,105 @@
+"""
+Management command to move old audit log rows out of the database into
+monthly gzip-compressed JSON-lines files (audit-YYYY-MM.jsonl.gz)
+"""
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from api.models import AuditLog
+
+FIELDS = ('id', 'user_name', 'action', 'timestamp', 'entity_type', 'entity_id', 'diff')
+
+
+class Command(BaseCommand):
+    help = 'Archive AuditLog rows older than the retention period to monthly .jsonl.gz files and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'AUDIT_LOG_RETENTION_DAYS', 365),
+            help='Keep this many days in the database (default AUDIT_LOG_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--dir',
+            default=getattr(settings, 'AUDIT_LOG_ARCHIVE_DIR', 'audit_archive'),
+            help='Directory for the archive files (default AUDIT_LOG_ARCHIVE_DIR)',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be archived and exit')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old = AuditLog.objects.filter(timestamp__lt=cutoff)
+
+        months = list(
+            old.annotate(month=TruncMonth('timestamp'))
+            .values_list('month', flat=True)
+            .distinct()
+            .order_by('month')
+        )
+        if not months:
+            self.stdout.write(self.style.SUCCESS(f'✅ Nothing older than {cutoff:%Y-%m-%d} to archive'))
+            return
+
+        if options['dry_run']:
+            for month in months:
+                count = old.filter(timestamp__gte=month, timestamp__lt=_next_month(month)).count()
+                self.stdout.write(f'{month:%Y-%m}: {count} entries')
+            return
+
+        os.makedirs(options['dir'], exist_ok=True)
+
+        total = 0
+        for month in months:
+            path = os.path.join(options['dir'], f'audit-{month:%Y-%m}.jsonl.gz')
+            in_month = old.filter(timestamp__gte=month, timestamp__lt=_next_month(month)).order_by('id')
+            archived = self._archive(in_month, path, options['batch_size'])
+            total += archived
+            self.stdout.write(f'{month:%Y-%m}: {archived} entries → {path}')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Archived {total} audit entries older than {cutoff:%Y-%m-%d}'))
+
+    def _archive(self, rows, path, batch_size):
+        """
+        Append `rows` to the month's file a batch at a time, deleting each
+        batch only after it is safely on disk. Every batch is its own gzip
+        member, which gzip readers concatenate transparently, so an
+        interrupted run just leaves the remaining rows for next time.
+        """
+        archived = 0
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id).values(*FIELDS)[:batch_size])
+            if not batch:
+                return archived
+
+            with open(path, 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+                    for row in batch:
+                        archive.write((json.dumps(row, cls=DjangoJSONEncoder) + '\n').encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+
+            ids = [row['id'] for row in batch]
+            with transaction.atomic():
+                AuditLog.objects.filter(id__in=ids).delete()
+
+            archived += len(batch)
+            last_id = ids[-1]
+
+
+def _next_month(month):
+    return (month.replace(day=1) + timedelta(days=32)).replace(day=1)
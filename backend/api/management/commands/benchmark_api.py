@@ -0,0 +1,263 @@
+"""
+Management command to benchmark the busiest API endpoints in-process
+against whatever database is configured (generate one with
+`manage.py generate_load_data`, or pass --generate)
+
+Each scenario is requested --warmup times untimed and then --iterations
+times timed, reporting latency percentiles and queries per request. Peak
+Python memory is measured on one further request under tracemalloc, kept
+out of the timings because tracing slows everything down. --output writes
+the results as JSON, and --compare prints the change against an earlier
+file, so a regression shows up between two commits.
+"""
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api import audit
+from api.models import ChargeType, Client, InvoiceItem, Job, Transaction
+
+
+def _percentile(samples, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    index = max(0, min(len(samples) - 1, round(fraction * len(samples) + 0.5) - 1))
+    return samples[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark latency, query count and memory of the hot API endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per scenario first')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO', help='Run just these scenarios')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Earlier --output file to compare against')
+        parser.add_argument(
+            '--generate',
+            metavar='SIZE',
+            help='Run generate_load_data --size SIZE first (e.g. 10k, 100k, 1m)',
+        )
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            call_command('generate_load_data', size=options['generate'], stdout=self.stdout)
+
+        fixture = self._fixture()
+        scenarios = self._scenarios(fixture)
+        if options['only']:
+            unknown = set(options['only']) - set(scenarios)
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}. Have: {', '.join(scenarios)}")
+            scenarios = {name: scenarios[name] for name in options['only']}
+
+        self.api = APIClient()
+        # Unsaved, so benchmarking adds no user row
+        self.api.force_authenticate(User(username='benchmark'))
+
+        results = {}
+        self.stdout.write(f"{'scenario':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KiB':>9}")
+        for name, (request, cleanup) in scenarios.items():
+            results[name] = self._measure(request, cleanup, options['warmup'], max(1, options['iterations']))
+            row = results[name]
+            self.stdout.write(
+                f"{name:<26} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+                f"{row['queries']:>8} {row['peak_kib']:>9.0f}"
+            )
+        # Item writes queue audit entries; don't leave them to the exit hook
+        audit.flush()
+
+        report = {'meta': self._meta(fixture, options), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as out:
+                json.dump(report, out, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"✅ Results written to {options['output']}"))
+        if options['compare']:
+            self._compare(results, options['compare'])
+
+    # ── fixture ───────────────────────────────────────────────────────────
+
+    def _fixture(self):
+        """The rows the scenarios point at: the busiest client and an invoiced job with items."""
+        client = (
+            Client.objects.annotate(n=Count('transactions')).order_by('-n', 'id').values('id', 'n').first()
+        )
+        job = (
+            Job.objects.filter(is_invoiced=True, invoice_items__isnull=False)
+            .order_by('id').values_list('id', flat=True).first()
+        )
+        charge_type = ChargeType.objects.values_list('id', flat=True).first()
+        if not client or not job or not charge_type:
+            raise CommandError(
+                'Not enough data to benchmark — run `manage.py generate_load_data` (or pass --generate 10k) first.'
+            )
+        return {
+            'client_id': client['id'],
+            'client_transactions': client['n'],
+            'job_id': job,
+            'charge_type_id': charge_type,
+        }
+
+    def _scenarios(self, fixture):
+        """{name: (request(api) -> response, cleanup(response) or None)}"""
+        client_id, job_id = fixture['client_id'], fixture['job_id']
+        items = list(
+            InvoiceItem.objects.filter(job_id=job_id).order_by('id').values('id', 'charge_type', 'description', 'amount', 'vat')
+        )
+        original = [{**item, 'amount': str(item['amount']), 'vat': str(item['vat'])} for item in items]
+        bumped = [{**item, 'amount': str(Decimal(item['amount']) + 1)} for item in original]
+        put_count = [0]
+
+        def put_items(api):
+            # Alternate so every PUT really changes the amounts
+            put_count[0] += 1
+            payload = bumped if put_count[0] % 2 else original
+            return api.put(f'/api/jobs/{job_id}/invoice-items/', payload, format='json')
+
+        def restore_items(response):
+            if put_count[0] % 2:
+                put_count[0] += 1
+                self.api.put(f'/api/jobs/{job_id}/invoice-items/', original, format='json')
+
+        def delete_created(response):
+            if response.status_code == 201:
+                self.api.delete(f"/api/invoice-items/{response.data['id']}/")
+
+        return {
+            'transactions_list': (lambda api: api.get('/api/transactions/'), None),
+            'transactions_client': (lambda api: api.get('/api/transactions/', {'client': client_id}), None),
+            'jobs_list': (lambda api: api.get('/api/jobs/'), None),
+            'ledger': (lambda api: api.get('/api/reports/ledger/', {'client_id': client_id}), None),
+            'ledger_last_year': (lambda api: api.get('/api/reports/ledger/', {
+                'client_id': client_id,
+                'start_date': f'{datetime.now().year - 1}-01-01',
+                'end_date': f'{datetime.now().year - 1}-12-31',
+            }), None),
+            'statement': (lambda api: api.get('/api/reports/statement/'), None),
+            'statement_by_month': (lambda api: api.get('/api/reports/statement/', {'group_by': 'month'}), None),
+            'dashboard_stats': (lambda api: api.get('/api/dashboard/stats/'), None),
+            'invoice_item_create': (lambda api: api.post('/api/invoice-items/', {
+                'job': job_id,
+                'charge_type': fixture['charge_type_id'],
+                'amount': '10.000',
+                'vat': '0.500',
+            }, format='json'), delete_created),
+            'job_invoice_items_put': (put_items, restore_items),
+        }
+
+    # ── measuring ─────────────────────────────────────────────────────────
+
+    def _call(self, request):
+        response = request(self.api)
+        # Streamed bodies are only produced as they're read
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        else:
+            response.content
+        return response
+
+    def _measure(self, request, cleanup, warmup, iterations):
+        def run():
+            response = self._call(request)
+            if cleanup:
+                cleanup(response)
+            return response
+
+        for _ in range(warmup):
+            run()
+
+        timings, queries, statuses = [], [], set()
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self._call(request)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+            if cleanup:
+                cleanup(response)
+
+        tracemalloc.start()
+        try:
+            response = self._call(request)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        if cleanup:
+            cleanup(response)
+
+        timings.sort()
+        return {
+            'iterations': iterations,
+            'p50_ms': round(_percentile(timings, 0.50), 3),
+            'p95_ms': round(_percentile(timings, 0.95), 3),
+            'p99_ms': round(_percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'min_ms': round(timings[0], 3),
+            'max_ms': round(timings[-1], 3),
+            'queries': max(queries),
+            'peak_kib': round(peak / 1024, 1),
+            'status': sorted(statuses),
+        }
+
+    # ── reporting ─────────────────────────────────────────────────────────
+
+    def _meta(self, fixture, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+
+        return {
+            'commit': commit,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': options['iterations'],
+            'rows': {
+                'clients': Client.objects.count(),
+                'jobs': Job.objects.count(),
+                'invoice_items': InvoiceItem.objects.count(),
+                'transactions': Transaction.objects.count(),
+            },
+            'fixture': fixture,
+        }
+
+    def _compare(self, results, path):
+        try:
+            with open(path, encoding='utf-8') as previous_file:
+                previous = json.load(previous_file)['results']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Could not read {path}: {exc}')
+
+        self.stdout.write(f"\nAgainst {path}:")
+        self.stdout.write(f"{'scenario':<26} {'p50 ms':>16} {'p95 ms':>16} {'queries':>10}")
+        for name, row in results.items():
+            before = previous.get(name)
+            if not before:
+                self.stdout.write(f"{name:<26} {'(new)':>16}")
+                continue
+            change = (row['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            line = (
+                f"{name:<26} {before['p50_ms']:>7.2f}→{row['p50_ms']:<7.2f} "
+                f"{before['p95_ms']:>7.2f}→{row['p95_ms']:<7.2f} "
+                f"{before['queries']:>4}→{row['queries']:<4} {change:+.0f}%"
+            )
+            slower = change > 20 or row['queries'] > before['queries']
+            self.stdout.write(self.style.WARNING(line) if slower else line)
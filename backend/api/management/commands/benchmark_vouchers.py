@@ -0,0 +1,76 @@
+"""
+Management command to show voucher number allocation cost as the transactions table grows.
+Everything it writes is rolled back at the end.
+"""
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Transaction, VoucherSequence
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark voucher allocation (counter row vs. legacy startswith scan) at growing table sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Table size to grow to')
+        parser.add_argument('--step', type=int, default=20000, help='Rows added between measurements')
+        parser.add_argument('--samples', type=int, default=200, help='Inserts timed at each size')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['rows'], options['step'], options['samples'])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write('Benchmark rows rolled back.')
+
+    def _run(self, rows, step, samples):
+        self.stdout.write(f"{'rows':>10} {'save() ms':>12} {'legacy scan ms':>16}")
+
+        size = Transaction.objects.count()
+        while True:
+            self.stdout.write(
+                f"{size:>10} {self._time_saves(samples):>12.3f} {self._time_legacy_scan(samples):>16.3f}"
+            )
+            if size >= rows:
+                break
+            self._grow(min(step, rows - size))
+            size = Transaction.objects.count()
+
+    def _time_saves(self, samples):
+        start = time.perf_counter()
+        for _ in range(samples):
+            Transaction(trans_type='CR', amount=Decimal('1.000'), date=date.today()).save()
+        return (time.perf_counter() - start) * 1000 / samples
+
+    def _time_legacy_scan(self, samples):
+        # The query the old generate_voucher_no ran on every save
+        start = time.perf_counter()
+        for _ in range(samples):
+            Transaction.objects.filter(
+                trans_type='CR', voucher_no__startswith='CR'
+            ).order_by('-id').first()
+        return (time.perf_counter() - start) * 1000 / samples
+
+    def _grow(self, count):
+        first = VoucherSequence.allocate('CR', count)
+        Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    trans_type='CR',
+                    amount=Decimal('1.000'),
+                    date=date.today(),
+                    voucher_no=VoucherSequence.format('CR', first + i),
+                )
+                for i in range(count)
+            ],
+            batch_size=2000,
+        )
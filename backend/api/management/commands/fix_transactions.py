@@ -1,58 +1,71 @@
 """
 Management command to fix existing transactions that are missing client or party_name
+
+Works set-based: each batch is one UPDATE that takes client_id from the
+job (and party_name from the client) through a correlated subquery, so the
+cost no longer grows with one query and one save() per row. The ledger
+already counts a transaction for its job's client, so linking it to that
+client leaves the balance snapshots as they are; the clients' revisions
+are bumped in the same database transaction.
 """
 from django.core.management.base import BaseCommand
-from api.models import Transaction
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, When
+
+from api.models import Client, Job, Transaction
 
 
 class Command(BaseCommand):
     help = 'Fix existing transactions by populating missing client and party_name fields'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many transactions need fixing',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Transactions updated per statement (default: 5000)',
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write('Starting transaction fix...')
-        
-        # Find transactions with job but no client
+        batch_size = max(1, options['batch_size'])
+
         orphaned = Transaction.objects.filter(job__isnull=False, client__isnull=True)
+        no_party_name = Transaction.objects.filter(
+            Q(party_name='') | Q(party_name__isnull=True),
+        )
         orphaned_count = orphaned.count()
-        
+        # Orphans get their party_name in the same pass as their client, so
+        # only count the rows that already have a client here
+        no_party_count = no_party_name.filter(client__isnull=False).count()
+
+        if options['dry_run']:
+            self.stdout.write(f'{orphaned_count} transactions with job but no client')
+            self.stdout.write(f'{no_party_count} transactions with client but no party_name')
+            return
+
+        self.stdout.write('Starting transaction fix...')
+
         if orphaned_count > 0:
             self.stdout.write(f'Found {orphaned_count} transactions with job but no client')
-            for transaction in orphaned:
-                if transaction.job and transaction.job.client:
-                    transaction.client = transaction.job.client
-                    if not transaction.party_name:
-                        transaction.party_name = transaction.job.client.name
-                    transaction.save()
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'✓ Fixed transaction #{transaction.id}: '
-                            f'linked to {transaction.client.name}'
-                        )
-                    )
+            fixed = self._in_batches(orphaned, batch_size, orphaned_count, self._link_clients)
+            self.stdout.write(self.style.SUCCESS(f'✓ Linked {fixed} transactions to their job\'s client'))
         else:
             self.stdout.write(self.style.SUCCESS('No orphaned transactions found'))
-        
-        # Find transactions with client but no party_name
-        no_party_name = Transaction.objects.filter(
-            client__isnull=False, 
-            party_name__in=['', None]
-        )
-        no_party_count = no_party_name.count()
-        
+
         if no_party_count > 0:
             self.stdout.write(f'Found {no_party_count} transactions with no party_name')
-            for transaction in no_party_name:
-                transaction.party_name = transaction.client.name
-                transaction.save()
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'✓ Fixed transaction #{transaction.id}: '
-                        f'set party_name to {transaction.party_name}'
-                    )
-                )
+            fixed = self._in_batches(
+                no_party_name.filter(client__isnull=False), batch_size, no_party_count, self._fill_party_names,
+            )
+            self.stdout.write(self.style.SUCCESS(f'✓ Set party_name on {fixed} transactions'))
         else:
             self.stdout.write(self.style.SUCCESS('No transactions missing party_name'))
-        
+
         # Summary
         total_fixed = orphaned_count + no_party_count
         if total_fixed > 0:
@@ -67,3 +80,55 @@ class Command(BaseCommand):
                     '\n✅ All transactions are already correct!'
                 )
             )
+
+    def _in_batches(self, queryset, batch_size, total, fix):
+        """
+        Walks `queryset` in id order, calling fix(batch) on id-range slices
+        of up to `batch_size` rows, each in its own transaction.
+        """
+        done = 0
+        last_id = 0
+        while True:
+            remaining = queryset.filter(pk__gt=last_id).order_by('pk')
+            upper = remaining.values_list('pk', flat=True)[batch_size - 1:batch_size].first()
+            batch = remaining.filter(pk__lte=upper) if upper is not None else remaining
+
+            with transaction.atomic():
+                fixed = fix(batch)
+            if not fixed:
+                break
+
+            done += fixed
+            self.stdout.write(f'  … {done}/{total}')
+            if upper is None:
+                break
+            last_id = upper
+        return done
+
+    def _link_clients(self, batch):
+        # A row with a job already shows on its job's client's ledger, so
+        # giving it that client moves no balance; only the revisions change
+        client_ids = set(batch.values_list('job__client_id', flat=True).distinct())
+
+        fixed = batch.update(
+            client_id=Subquery(Job.objects.filter(pk=OuterRef('job_id')).values('client_id')[:1]),
+            party_name=Case(
+                When(
+                    Q(party_name='') | Q(party_name__isnull=True),
+                    then=Subquery(Client.objects.filter(jobs=OuterRef('job_id')).values('name')[:1]),
+                ),
+                default=F('party_name'),
+            ),
+        )
+
+        Client.touch(client_ids=client_ids)
+        return fixed
+
+    def _fill_party_names(self, batch):
+        client_ids = set(batch.values_list('client_id', flat=True).distinct())
+        fixed = batch.update(
+            party_name=Subquery(Client.objects.filter(pk=OuterRef('client_id')).values('name')[:1]),
+        )
+        Client.touch(client_ids=client_ids)
+        return fixed
+
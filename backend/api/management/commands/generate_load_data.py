@@ -0,0 +1,327 @@
+"""
+Management command to fill the database with a realistic, reproducible
+dataset for load testing: clients, parties, jobs with containers and
+invoice items, and years of CR/CP/BR/BP/INVOICE transactions
+
+Everything is written with bulk_create in batches, so none of the model
+save() bookkeeping runs row by row. The command does that bookkeeping
+itself: job totals are set from the items it generates, voucher numbers
+come from one VoucherSequence block per prefix, and the balance snapshots
+are rebuilt once at the end. The same --seed always gives the same data.
+"""
+import random
+import time
+from collections import Counter
+from itertools import accumulate
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api import refcache
+from api.models import (
+    ChargeType, Client, ClientBalanceSnapshot, Container, InvoiceItem, Job, Party, Transaction,
+    VoucherSequence,
+)
+
+# --size presets: transactions, clients, jobs
+SIZES = {
+    '10k': (10_000, 50, 2_500),
+    '100k': (100_000, 300, 25_000),
+    '1m': (1_000_000, 2_000, 250_000),
+}
+
+# The charge types seed.py adds
+CHARGE_TYPES = [
+    "Sea Freight Charges", "Air Freight Charges", "Land Transportation",
+    "Customs Clearance", "Port Handling Charges", "Documentation Fee",
+    "Delivery Order (DO) Charges", "Terminal Handling Charges (THC)",
+    "Inspection Charges", "Customs Duty", "Insurance", "Bayan Charges",
+    "Miscellaneous",
+]
+
+NAME_WORDS = [
+    "Al Noor", "Gulf", "Muscat", "Sohar", "Salalah", "Oasis", "Falcon", "Desert",
+    "Horizon", "Crescent", "Pearl", "Majan", "Dhofar", "Sea Star", "Al Batinah",
+    "Atlas", "Summit", "Zenith", "Harbour", "Caravan",
+]
+NAME_TRADES = [
+    "Trading", "Logistics", "Foods", "Building Materials", "Electronics", "Textiles",
+    "Auto Parts", "Pharma", "Steel", "Furniture",
+]
+NAME_SUFFIXES = ["LLC", "SAOC", "& Co", "Enterprises", "Est."]
+PORTS = ["Sohar", "Salalah", "Duqm", "Jebel Ali", "Mundra", "Nhava Sheva", "Shanghai", "Ningbo", "Hamad", "Dammam"]
+PLACES = ["Muscat", "Rusayl", "Nizwa", "Sur", "Ibri", "Barka", "Seeb"]
+CARRIER_PREFIXES = ["MSCU", "MAEU", "CMAU", "HLXU", "OOLU", "TGHU"]
+BANKS = ["Bank Muscat", "National Bank of Oman", "Bank Dhofar", "Sohar International"]
+
+# Share of the non-INVOICE transactions of each type
+TRANSACTION_MIX = [('BR', 0.40), ('CR', 0.15), ('BP', 0.25), ('CP', 0.20)]
+TRANSPORT_MIX = [('SEA', 0.65), ('AIR', 0.20), ('LAND', 0.15)]
+VAT_RATE = Decimal('0.05')
+THREE_DP = Decimal('0.001')
+
+
+class Command(BaseCommand):
+    help = 'Generate a seeded-random load-testing dataset with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(SIZES), default='10k', help='Dataset preset (default: 10k)')
+        parser.add_argument('--transactions', type=int, help='Transactions to create (overrides --size)')
+        parser.add_argument('--clients', type=int, help='Clients to create (overrides --size)')
+        parser.add_argument('--jobs', type=int, help='Jobs to create (overrides --size)')
+        parser.add_argument('--years', type=int, default=3, help='Years of history to spread dates over')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed (same seed, same data)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT batch')
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Run even with DEBUG off (it adds a lot of rows to whatever database is configured)',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError(
+                'DEBUG is off — this may be a production database. Use --force if you really mean it.'
+            )
+
+        transactions, clients, jobs = SIZES[options['size']]
+        self.transactions = options['transactions'] or transactions
+        self.client_count = options['clients'] or clients
+        self.job_count = options['jobs'] or jobs
+        self.batch_size = max(1, options['batch_size'])
+        self.rng = random.Random(options['seed'])
+        self.today = date.today()
+        self.first_day = self.today - timedelta(days=365 * max(1, options['years']))
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            charge_types = self._charge_types()
+            parties = self._parties()
+            clients = self._clients()
+            invoices = self._jobs(clients, charge_types)
+            self._transactions(clients, parties, invoices)
+
+            self._step('Balance snapshots', ClientBalanceSnapshot.rebuild)
+            # bulk_create sends no signals, so retire the cached lists here
+            refcache.invalidate('chargetypes', 'parties', 'clients', 'clients_from_jobs')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Done in {time.perf_counter() - started:.1f}s'))
+
+    # ── helpers ────────────────────────────────────────────────────────────
+
+    def _step(self, label, work):
+        started = time.perf_counter()
+        result = work()
+        self.stdout.write(f'  {label}: {time.perf_counter() - started:.1f}s')
+        return result
+
+    def _report(self, label, count, started):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed * 60 if elapsed else 0
+        self.stdout.write(f'  {label}: {count} rows in {elapsed:.1f}s ({rate:,.0f}/min)')
+
+    def _date(self, start=None, spread_days=None):
+        start = start or self.first_day
+        span = (self.today - start).days if spread_days is None else spread_days
+        return min(self.today, start + timedelta(days=self.rng.randint(0, max(0, span))))
+
+    def _money(self, low, high):
+        return Decimal(self.rng.randint(low * 1000, high * 1000)) / 1000
+
+    def _weighted(self, mix):
+        return self.rng.choices([value for value, _ in mix], weights=[weight for _, weight in mix])[0]
+
+    def _insert(self, model, rows):
+        return model.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    # ── reference data ────────────────────────────────────────────────────
+
+    def _charge_types(self):
+        existing = set(ChargeType.objects.values_list('name', flat=True))
+        self._insert(ChargeType, [ChargeType(name=name) for name in CHARGE_TYPES if name not in existing])
+        return list(ChargeType.objects.values_list('id', flat=True))
+
+    def _parties(self):
+        existing = set(Party.objects.values_list('name', flat=True))
+        names = []
+        for index in range(max(10, self.client_count // 5)):
+            name = f"{self.rng.choice(NAME_WORDS)} {self.rng.choice(NAME_TRADES)} Supplies {index + 1}"
+            if name not in existing:
+                names.append(name)
+        self._insert(Party, [Party(name=name) for name in names])
+        return names or sorted(existing)
+
+    def _clients(self):
+        started = time.perf_counter()
+        clients = self._insert(Client, [
+            Client(
+                name=f"{self.rng.choice(NAME_WORDS)} {self.rng.choice(NAME_TRADES)} "
+                     f"{self.rng.choice(NAME_SUFFIXES)} {index + 1}",
+                address=f"PO Box {self.rng.randint(100, 999)}, {self.rng.choice(PLACES)}",
+                postal_code=str(self.rng.randint(100, 999)),
+                phone=f"+968 {self.rng.randint(2000_0000, 9999_9999)}",
+                vat_number=f"OM{self.rng.randint(10**9, 10**10 - 1)}",
+            )
+            for index in range(self.client_count)
+        ])
+        self._report('Clients', len(clients), started)
+        return [(client.id, client.name) for client in clients]
+
+    # ── jobs, containers, items ───────────────────────────────────────────
+
+    def _jobs(self, clients, charge_types):
+        """
+        Creates the jobs in batches with their containers and items, and
+        returns (job_id, client_id, job_date, grand_total) for each
+        invoiced job so its INVOICE transaction can be made alongside the rest.
+        """
+        started = time.perf_counter()
+        # A few clients bring most of the work, as in the real book
+        weights = list(accumulate(1 / (rank + 1) for rank in range(len(clients))))
+        invoices = []
+        counts = {'jobs': 0, 'containers': 0, 'items': 0}
+
+        for offset in range(0, self.job_count, self.batch_size):
+            size = min(self.batch_size, self.job_count - offset)
+            jobs, items_by_job = [], []
+            for _ in range(size):
+                client_id, _ = self.rng.choices(clients, cum_weights=weights)[0]
+                job_date = self._date()
+                items = [
+                    (self.rng.choice(charge_types), self._money(5, 1500))
+                    for _ in range(self.rng.randint(1, 6))
+                ]
+                subtotal = sum(amount for _, amount in items)
+                vat_total = sum((amount * VAT_RATE).quantize(THREE_DP) for _, amount in items)
+                age = (self.today - job_date).days
+                mode = self._weighted(TRANSPORT_MIX)
+                jobs.append(Job(
+                    job_date=job_date,
+                    client_id=client_id,
+                    shipment_invoice_no=f"SI-{self.rng.randint(10**5, 10**6 - 1)}",
+                    invoice_no=f"{job_date:%y}/{self.rng.randint(1, 99999):05d}",
+                    transport_document_no=f"{'BL' if mode == 'SEA' else 'AWB' if mode == 'AIR' else 'CMR'}"
+                                          f"{self.rng.randint(10**7, 10**8 - 1)}",
+                    transport_mode=mode,
+                    port_loading=self.rng.choice(PORTS),
+                    place_loading=self.rng.choice(PLACES),
+                    port_discharge=self.rng.choice(PORTS),
+                    place_discharge=self.rng.choice(PLACES),
+                    no_of_packages=self.rng.randint(1, 400),
+                    gross_weight=self._money(100, 25000),
+                    net_weight=self._money(80, 24000),
+                    cbm=self._money(1, 70),
+                    # Older jobs are mostly closed out
+                    is_finished=age > 30 or self.rng.random() < 0.3,
+                    is_invoiced=age > 14 and self.rng.random() < 0.9,
+                    subtotal=subtotal,
+                    vat_total=vat_total,
+                    grand_total=subtotal + vat_total,
+                ))
+                items_by_job.append(items)
+
+            jobs = self._insert(Job, jobs)
+            containers, invoice_items = [], []
+            for job, items in zip(jobs, items_by_job):
+                if job.transport_mode == 'SEA':
+                    for _ in range(self.rng.randint(1, 4)):
+                        containers.append(Container(
+                            job_id=job.id,
+                            number=f"{self.rng.choice(CARRIER_PREFIXES)}{self.rng.randint(10**6, 10**7 - 1)}",
+                            seal=str(self.rng.randint(10**5, 10**6 - 1)),
+                            size=self.rng.choice(['20', '40', '40HC']),
+                        ))
+                for charge_type_id, amount in items:
+                    vat = (amount * VAT_RATE).quantize(THREE_DP)
+                    invoice_items.append(InvoiceItem(
+                        job_id=job.id, charge_type_id=charge_type_id, amount=amount, vat=vat, total=amount + vat,
+                    ))
+                if job.is_invoiced:
+                    invoices.append((job.id, job.client_id, job.job_date, job.grand_total))
+
+            self._insert(Container, containers)
+            self._insert(InvoiceItem, invoice_items)
+            counts['jobs'] += len(jobs)
+            counts['containers'] += len(containers)
+            counts['items'] += len(invoice_items)
+
+        self._report('Jobs, containers and items', sum(counts.values()), started)
+        self.stdout.write(
+            f"    {counts['jobs']} jobs, {counts['containers']} containers, {counts['items']} invoice items"
+        )
+        return invoices
+
+    # ── transactions ──────────────────────────────────────────────────────
+
+    def _transactions(self, clients, parties, invoices):
+        """
+        One INVOICE per invoiced job (as far as the --transactions budget
+        goes), the rest split across receipts and payments.
+        """
+        started = time.perf_counter()
+        names = dict(clients)
+        invoices = invoices[:self.transactions]
+        others = self.transactions - len(invoices)
+
+        kinds = ['INVOICE'] * len(invoices) + [self._weighted(TRANSACTION_MIX) for _ in range(others)]
+        next_number = {
+            Transaction.VOUCHER_PREFIXES[kind]: VoucherSequence.allocate(Transaction.VOUCHER_PREFIXES[kind], count)
+            for kind, count in Counter(kinds).items()
+        }
+
+        client_ids = [client_id for client_id, _ in clients]
+        weights = list(accumulate(1 / (rank + 1) for rank in range(len(clients))))
+        created = 0
+        batch = []
+        for index, kind in enumerate(kinds):
+            prefix = Transaction.VOUCHER_PREFIXES[kind]
+            voucher_no = VoucherSequence.format(prefix, next_number[prefix])
+            next_number[prefix] += 1
+
+            if kind == 'INVOICE':
+                job_id, client_id, job_date, total = invoices[index]
+                batch.append(Transaction(
+                    trans_type='INVOICE',
+                    amount=total,
+                    description=f"Job #{job_id} - Invoiced Charges",
+                    date=self._date(job_date, spread_days=10),
+                    voucher_no=voucher_no,
+                    party_name=names[client_id],
+                    job_id=job_id,
+                    client_id=client_id,
+                ))
+            else:
+                batch.append(self._cash_transaction(kind, voucher_no, client_ids, weights, names, parties))
+
+            if len(batch) >= self.batch_size:
+                created += len(self._insert(Transaction, batch))
+                batch = []
+
+        created += len(self._insert(Transaction, batch))
+        self._report('Transactions', created, started)
+
+    def _cash_transaction(self, kind, voucher_no, client_ids, weights, names, parties):
+        by_bank = kind in ('BR', 'BP')
+        # Receipts always come from a client; a third of payments are
+        # general expenses paid to a supplier
+        client_id = None
+        if kind in Transaction.RECEIPT_TYPES or self.rng.random() < 0.66:
+            client_id = self.rng.choices(client_ids, cum_weights=weights)[0]
+
+        return Transaction(
+            trans_type=kind,
+            amount=self._money(10, 5000) if kind in Transaction.RECEIPT_TYPES else self._money(5, 800),
+            description=(
+                "Payment received" if kind in Transaction.RECEIPT_TYPES
+                else self.rng.choice(["Customs duty paid", "Port charges", "Transport", "Fuel", "Office expenses"])
+            ),
+            date=self._date(),
+            bank_name=self.rng.choice(BANKS) if by_bank else None,
+            cheque_no=str(self.rng.randint(10**5, 10**6 - 1)) if by_bank and self.rng.random() < 0.5 else None,
+            voucher_no=voucher_no,
+            party_name=names[client_id] if client_id else self.rng.choice(parties),
+            client_id=client_id,
+        )
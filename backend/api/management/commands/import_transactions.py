@@ -0,0 +1,64 @@
+"""
+Management command to import receipts and payments from a CSV file (for
+example a bank statement) in bulk — see api/importing.py for the columns
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importing import ImportFormatError, import_transactions, read_csv
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import transactions from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and number every row, then roll back',
+        )
+        parser.add_argument(
+            '--skip-invalid',
+            action='store_true',
+            help='Import the valid rows even if some rows fail',
+        )
+        parser.add_argument(
+            '--user',
+            default='System',
+            help='Name recorded in the audit log (default: System)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                report = import_transactions(
+                    read_csv(stream),
+                    actor=options['user'],
+                    source=options['path'],
+                    dry_run=options['dry_run'],
+                    skip_invalid=options['skip_invalid'],
+                )
+        except (OSError, ImportFormatError, UnicodeDecodeError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f"⚠️  Line {error['line']}: {error['errors']}"))
+        if report['error_count'] > len(report['errors']):
+            hidden = report['error_count'] - len(report['errors'])
+            self.stdout.write(self.style.WARNING(f'⚠️  ...and {hidden} more invalid rows'))
+
+        for prefix, (first, last) in report['vouchers'].items():
+            self.stdout.write(f'{prefix}: {first} … {last}')
+
+        if report['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Dry run: {report['valid']} of {report['rows']} rows would be imported"
+            ))
+        elif report['error_count'] and not options['skip_invalid']:
+            raise CommandError(
+                f"{report['error_count']} of {report['rows']} rows are invalid; nothing was imported"
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Imported {report['imported']} of {report['rows']} transactions"
+            ))
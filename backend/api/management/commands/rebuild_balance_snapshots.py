@@ -0,0 +1,18 @@
+"""
+Management command to rebuild the per-client monthly balance snapshots from scratch
+"""
+from django.core.management.base import BaseCommand
+from api.models import ClientBalanceSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Recompute ClientBalanceSnapshot rows from the transactions table'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding client balance snapshots...')
+        ClientBalanceSnapshot.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Rebuilt {ClientBalanceSnapshot.objects.count()} snapshot rows'
+            )
+        )
@@ -0,0 +1,221 @@
+"""
+Management command to check every job's INVOICE ledger transaction against
+its invoice items in one pass, and optionally repair what has drifted
+
+Flags, per job:
+  drift      the INVOICE amount differs from SUM(items.total)
+  duplicate  more than one INVOICE transaction
+  stale      an INVOICE transaction but no billable items
+  missing    an invoiced job with billable items and no INVOICE transaction
+  client     the INVOICE transaction is on a different client than the job
+and INVOICE transactions whose job has been deleted (orphans).
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, F, IntegerField, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from api.invoicing import invoice_transaction_fields
+from api.models import Client, ClientBalanceSnapshot, InvoiceItem, Job, Transaction, VoucherSequence
+
+THREE_DP = Decimal('0.001')
+ZERO = Value(Decimal('0.000'), output_field=DecimalField(max_digits=20, decimal_places=3))
+# Jobs repaired per locked re-check; keeps the IN lists bounded
+FIX_BATCH_SIZE = 1000
+
+
+def _invoices():
+    return Transaction.objects.filter(trans_type='INVOICE')
+
+
+def _items_total(job_ref):
+    """SUM(total) of the items of the job `job_ref` points at."""
+    return Coalesce(
+        Subquery(
+            InvoiceItem.objects.filter(job=job_ref).order_by().values('job').annotate(s=Sum('total')).values('s')
+        ),
+        ZERO,
+    )
+
+
+def _ledger_check(job_ids=None):
+    """
+    Jobs whose INVOICE transactions don't match their items, annotated with
+    items_total, invoice_count, invoice_amount and wrong_client. Every figure
+    is a correlated subquery on an indexed job_id, so this is one pass over
+    the jobs with no GROUP BY across the whole table.
+    """
+    per_job = _invoices().filter(job=OuterRef('pk')).order_by().values('job')
+    jobs = (
+        Job.objects
+        .select_related('client')
+        .annotate(
+            items_total=_items_total(OuterRef('pk')),
+            invoice_count=Coalesce(
+                Subquery(per_job.annotate(n=Count('id')).values('n')), Value(0), output_field=IntegerField(),
+            ),
+            invoice_amount=Coalesce(Subquery(per_job.annotate(s=Sum('amount')).values('s')), ZERO),
+            wrong_client=Exists(_invoices().filter(job=OuterRef('pk')).exclude(client_id=OuterRef('client_id'))),
+        )
+        .filter(
+            Q(invoice_count__gt=1)
+            | Q(invoice_count=1, items_total__lte=0)
+            | (Q(invoice_count=1) & ~Q(invoice_amount=F('items_total')))
+            | Q(invoice_count=0, is_invoiced=True, items_total__gt=0)
+            | Q(wrong_client=True)
+        )
+        .order_by('id')
+    )
+    if job_ids is not None:
+        jobs = jobs.filter(id__in=job_ids)
+    return jobs
+
+
+def _problems(job):
+    expected = job.items_total.quantize(THREE_DP)
+    if job.invoice_count == 0:
+        return ['missing']
+    if expected <= 0:
+        return ['stale']
+
+    problems = []
+    if job.invoice_count > 1:
+        problems.append('duplicate')
+    if job.invoice_amount.quantize(THREE_DP) != expected * job.invoice_count:
+        problems.append('drift')
+    if job.wrong_client:
+        problems.append('client')
+    return problems
+
+
+class Command(BaseCommand):
+    help = 'Compare INVOICE transactions with their jobs\' invoice items (--fix to repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Remove duplicate and stale INVOICE rows, correct amounts and clients, create missing ones',
+        )
+        parser.add_argument(
+            '--delete-orphans',
+            action='store_true',
+            help='With --fix, also delete INVOICE transactions whose job no longer exists',
+        )
+
+    def handle(self, *args, **options):
+        # SQLite sums decimals as floats, so re-check what SQL flagged at 3dp
+        rows = [job for job in _ledger_check() if _problems(job)]
+        orphans = _invoices().filter(job__isnull=True).count()
+
+        for job in rows:
+            self.stdout.write(
+                f'Job #{job.id}: {", ".join(_problems(job))} — items {job.items_total.quantize(THREE_DP)}, '
+                f'{job.invoice_count} INVOICE row(s) totalling {job.invoice_amount.quantize(THREE_DP)}'
+            )
+        if orphans:
+            self.stdout.write(f'{orphans} INVOICE transaction(s) belong to deleted jobs')
+
+        if not rows and not orphans:
+            self.stdout.write(self.style.SUCCESS('✅ Every INVOICE transaction matches its invoice items'))
+            return
+
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️  {len(rows)} job(s) out of step, {orphans} orphan(s) — rerun with --fix to repair'
+            ))
+            return
+
+        removed = corrected = created = 0
+        with transaction.atomic():
+            ids = [job.id for job in rows]
+            for start in range(0, len(ids), FIX_BATCH_SIZE):
+                batch = ids[start:start + FIX_BATCH_SIZE]
+                # Lock the jobs and re-check under the lock so an item saved
+                # since the report above is not lost
+                list(Job.objects.select_for_update().filter(id__in=batch).values_list('id', flat=True))
+                jobs = [job for job in _ledger_check(batch) if _problems(job)]
+                removed += self._remove_extra_rows(jobs)
+                corrected += self._correct_rows(jobs)
+                created += self._create_missing_rows(jobs)
+
+            deleted_orphans = 0
+            if options['delete_orphans']:
+                # Deletes go through the post_delete receiver, which keeps
+                # the balance snapshots and client revisions in step
+                deleted_orphans, _ = _invoices().filter(job__isnull=True).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Removed {removed}, corrected {corrected} and created {created} INVOICE transaction(s)'
+            + (f', deleted {deleted_orphans} orphan(s)' if deleted_orphans else '')
+        ))
+
+    def _remove_extra_rows(self, rows):
+        """Deletes every INVOICE row of stale jobs and all but the oldest of duplicated ones."""
+        stale = [job.id for job in rows if job.invoice_count and job.items_total <= 0]
+        duplicated = [job.id for job in rows if job.invoice_count > 1 and job.items_total > 0]
+
+        keep = _invoices().filter(job_id__in=duplicated).order_by().values('job').annotate(keep=Min('id'))
+        extra = _invoices().filter(
+            Q(job_id__in=stale) | (Q(job_id__in=duplicated) & ~Q(pk__in=[row['keep'] for row in keep]))
+        )
+        # post_delete takes each row's effect off the snapshots
+        deleted, _ = extra.delete()
+        return deleted
+
+    def _correct_rows(self, rows):
+        """
+        Sets amount, client and party_name of each remaining INVOICE row from
+        its job in one UPDATE, moving the snapshots by the difference.
+        """
+        job_ids = [job.id for job in rows if job.invoice_count and job.items_total > 0]
+        candidates = (
+            _invoices()
+            .filter(job_id__in=job_ids)
+            .annotate(expected=_items_total(OuterRef('job_id')))
+            .values_list('pk', 'amount', 'expected', 'client_id', 'job__client_id')
+        )
+        ids = [
+            pk for pk, amount, expected, client_id, job_client_id in candidates
+            if amount.quantize(THREE_DP) != expected.quantize(THREE_DP) or client_id != job_client_id
+        ]
+        if not ids:
+            return 0
+
+        changed = Transaction.objects.filter(pk__in=ids)
+        before = ClientBalanceSnapshot.movement(changed)
+        changed.update(
+            amount=_items_total(OuterRef('job_id')),
+            client_id=Subquery(Job.objects.filter(pk=OuterRef('job_id')).values('client_id')[:1]),
+            party_name=Subquery(Client.objects.filter(jobs=OuterRef('job_id')).values('name')[:1]),
+        )
+        after = ClientBalanceSnapshot.movement(changed)
+
+        ClientBalanceSnapshot.apply_difference(before, after)
+        Client.touch(client_ids=[client_id for client_id, _ in before.keys() | after.keys()])
+        return len(ids)
+
+    def _create_missing_rows(self, rows):
+        """Creates the INVOICE row of invoiced jobs that have none, numbered in one block."""
+        missing = [job for job in rows if job.invoice_count == 0]
+        if not missing:
+            return 0
+
+        first = VoucherSequence.allocate('INV', len(missing))
+        created = []
+        for number, job in enumerate(missing, start=first):
+            txn = Transaction(
+                job=job,
+                trans_type='INVOICE',
+                voucher_no=VoucherSequence.format('INV', number),
+                **invoice_transaction_fields(job, job.items_total.quantize(THREE_DP)),
+            )
+            created.append(txn)
+        Transaction.objects.bulk_create(created, batch_size=500)
+
+        ClientBalanceSnapshot.add_effects(effect for txn in created for effect in txn.ledger_effects())
+        Client.touch(client_ids=[txn.client_id for txn in created])
+        return len(created)
+
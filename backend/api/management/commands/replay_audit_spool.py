@@ -0,0 +1,66 @@
+"""
+Management command to load audit entries that api/audit.py spooled to disk
+(because the database was unreachable) back into the AuditLog table
+"""
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from api.models import AuditLog
+
+
+class Command(BaseCommand):
+    help = 'Insert spooled audit log entries and clear the spool file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=getattr(settings, 'AUDIT_LOG_SPOOL_PATH', 'audit_spool.jsonl'),
+            help='Spool file to replay (defaults to AUDIT_LOG_SPOOL_PATH)',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        replaying = f'{path}.replaying'
+        if not os.path.exists(path) and not os.path.exists(replaying):
+            self.stdout.write(self.style.SUCCESS('✅ No spooled audit entries'))
+            return
+
+        replayed = 0
+        # A run that was interrupted leaves its entries in .replaying; load
+        # those first so moving the spool aside below can't overwrite them
+        if os.path.exists(replaying):
+            replayed += self._replay(replaying)
+
+        if os.path.exists(path):
+            # Move the file aside first so entries spooled while we work are
+            # kept for the next run rather than truncated with this one
+            os.replace(path, replaying)
+            replayed += self._replay(replaying)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Replayed {replayed} audit entries'))
+
+    def _replay(self, replaying):
+        """Insert the entries in `replaying` and remove it; returns the count."""
+        entries = []
+        with open(replaying, encoding='utf-8') as spool:
+            for line_no, line in enumerate(spool, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    self.stdout.write(self.style.WARNING(f'⚠️  Skipping unreadable line {line_no}'))
+                    continue
+                row['timestamp'] = parse_datetime(row['timestamp'])
+                entries.append(AuditLog(**row))
+
+        # All or nothing, so a failed insert leaves the file to retry as a whole
+        with transaction.atomic():
+            AuditLog.objects.bulk_create(entries, batch_size=500)
+        os.remove(replaying)
+        return len(entries)
@@ -0,0 +1,75 @@
+"""
+Management command to check the maintained Job invoice totals against the
+job's items, and optionally repair any that have drifted
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from api.models import Job
+
+
+THREE_DP = Decimal('0.001')
+
+
+def _drifted(job):
+    return any(
+        getattr(job, field).quantize(THREE_DP) != getattr(job, f'items_{field}').quantize(THREE_DP)
+        for field in Job.TOTAL_FIELDS
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare Job subtotal/vat_total/grand_total with their invoice items (--fix to repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Overwrite drifted totals with the figures recomputed from the items',
+        )
+
+    def handle(self, *args, **options):
+        drifted = (
+            Job.item_totals()
+            .filter(
+                ~Q(subtotal=F('items_subtotal'))
+                | ~Q(vat_total=F('items_vat_total'))
+                | ~Q(grand_total=F('items_grand_total'))
+            )
+            .order_by('id')
+        )
+
+        # SQLite sums decimals as floats, so re-check what SQL flagged at 3dp
+        rows = [job for job in drifted if _drifted(job)]
+        if not rows:
+            self.stdout.write(self.style.SUCCESS('✅ All job totals match their invoice items'))
+            return
+
+        for job in rows:
+            self.stdout.write(
+                f'Job #{job.id}: stored {job.subtotal} + {job.vat_total} = {job.grand_total}, '
+                f'items {job.items_subtotal} + {job.items_vat_total} = {job.items_grand_total}'
+            )
+
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(f'⚠️  {len(rows)} job(s) drifted — rerun with --fix to repair'))
+            return
+
+        with transaction.atomic():
+            # Lock the jobs and recompute under the lock so an item saved
+            # since the check above is not lost
+            ids = [job.id for job in rows]
+            list(Job.objects.select_for_update().filter(id__in=ids).values_list('id', flat=True))
+            rows = [job for job in Job.item_totals().filter(id__in=ids) if _drifted(job)]
+            ids = [job.id for job in rows]
+            for job in rows:
+                job.subtotal = job.items_subtotal
+                job.vat_total = job.items_vat_total
+                job.grand_total = job.items_grand_total
+            Job.objects.bulk_update(rows, list(Job.TOTAL_FIELDS), batch_size=500)
+            Job.objects.filter(id__in=ids).update(revision=F('revision') + 1)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Repaired totals on {len(rows)} job(s)'))
@@ -0,0 +1,235 @@
+"""
+Per-request timing and query instrumentation.
+
+RequestMetricsMiddleware times every request, and a connection
+execute_wrapper counts and times its queries. It also counts the
+statements the request had already run with different parameters, which
+is what an N+1 loop looks like. The figures go out in three ways:
+
+  * a Server-Timing header (app and db durations), which browser devtools
+    show under the request's Timing tab
+  * one JSON log line on the "api.metrics" logger for a
+    REQUEST_METRICS_SAMPLE_RATE fraction of requests, and a warning for
+    every request that is slow or repeats a statement
+    REQUEST_METRICS_DUPLICATE_THRESHOLD times
+  * running totals per view, method and status, which /api/metrics/
+    renders in the Prometheus text format
+
+The totals are kept in process memory. Each worker reports its own, and
+they start again from zero when the worker restarts. Prometheus' rate()
+and increase() handle both. A streamed response (the CSV exports) is
+timed up to its first byte. Its size isn't known then, and any queries
+run while the body is produced are not counted.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .invoicing import invoice_sync_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+# (view, method, status) -> running totals
+_totals = defaultdict(lambda: {
+    "requests": 0,
+    "db_seconds": 0.0,
+    "queries": 0,
+    "duplicates": 0,
+    "response_bytes": 0,
+})
+# (view, method) -> [count per bucket..., sum of seconds, count]
+_durations = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _buckets():
+    return tuple(sorted(_setting("REQUEST_METRICS_BUCKETS", DEFAULT_BUCKETS)))
+
+
+class _QueryRecorder:
+    """execute_wrapper that times the connection's queries and spots repeats."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            # Parameters stay out of the SQL, so the same statement with
+            # other values is the same string
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        return self.count - len(self.statements)
+
+    def most_repeated(self):
+        sql, count = self.statements.most_common(1)[0] if self.statements else ("", 0)
+        return sql, count
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    # Route names (or the view's dotted path) keep the label set bounded,
+    # unlike raw paths with ids in them
+    return match.view_name if match else "unmatched"
+
+
+def _response_size(response):
+    if getattr(response, "streaming", False):
+        return None
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        if not _setting("REQUEST_METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = _QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        seconds = time.perf_counter() - started
+
+        size = _response_size(response)
+        view = _view_name(request)
+        _add(view, request.method, response.status_code, seconds, queries, size)
+
+        response["Server-Timing"] = (
+            f"app;dur={seconds * 1000:.1f}, "
+            f'db;dur={queries.seconds * 1000:.1f};desc="{queries.count} queries, {queries.duplicates} repeated"'
+        )
+        self._log(request, response, view, seconds, queries, size)
+        return response
+
+    def _log(self, request, response, view, seconds, queries, size):
+        threshold = _setting("REQUEST_METRICS_DUPLICATE_THRESHOLD", 10)
+        slow = seconds * 1000 >= _setting("REQUEST_METRICS_SLOW_MS", 1000)
+        repeated_sql, repeated = queries.most_repeated()
+        flagged = slow or repeated >= threshold
+        if not flagged and random.random() >= _setting("REQUEST_METRICS_SAMPLE_RATE", 1.0):
+            return
+
+        entry = {
+            "method": request.method,
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "duration_ms": round(seconds * 1000, 2),
+            "db_ms": round(queries.seconds * 1000, 2),
+            "queries": queries.count,
+            "duplicate_queries": queries.duplicates,
+            "response_bytes": size,
+        }
+        if repeated >= threshold:
+            entry["repeated_sql"] = repeated_sql[:300]
+            entry["repeated_count"] = repeated
+        if slow:
+            entry["slow"] = True
+
+        if flagged:
+            logger.warning(json.dumps(entry))
+        else:
+            logger.info(json.dumps(entry))
+
+
+def _add(view, method, status, seconds, queries, size):
+    buckets = _buckets()
+    with _lock:
+        totals = _totals[view, method, status]
+        totals["requests"] += 1
+        totals["db_seconds"] += queries.seconds
+        totals["queries"] += queries.count
+        totals["duplicates"] += queries.duplicates
+        totals["response_bytes"] += size or 0
+
+        histogram = _durations.setdefault((view, method), [0] * len(buckets) + [0.0, 0])
+        index = bisect_left(buckets, seconds)
+        if index < len(buckets):
+            histogram[index] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+# ── Prometheus text format ───────────────────────────────────────────────
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """The running totals (and the invoice sync counters) as Prometheus text."""
+    buckets = _buckets()
+    with _lock:
+        totals = {key: dict(values) for key, values in _totals.items()}
+        durations = {key: list(values) for key, values in _durations.items()}
+
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{labels} {_number(value)}")
+
+    counters = (
+        ("logistics_http_requests_total", "requests", "Requests handled."),
+        ("logistics_http_db_seconds_total", "db_seconds", "Time spent in database queries."),
+        ("logistics_http_db_queries_total", "queries", "Database queries run."),
+        ("logistics_http_duplicate_queries_total", "duplicates",
+         "Queries repeating a statement the same request had already run."),
+        ("logistics_http_response_bytes_total", "response_bytes", "Response body bytes (streamed bodies excluded)."),
+    )
+    for name, field, help_text in counters:
+        family(name, "counter", help_text, [
+            ("", _labels(view=view, method=method, status=status), values[field])
+            for (view, method, status), values in sorted(totals.items())
+        ])
+
+    samples = []
+    for (view, method), histogram in sorted(durations.items()):
+        cumulative = 0
+        for bound, count in zip(buckets, histogram):
+            cumulative += count
+            samples.append(("_bucket", _labels(view=view, method=method, le=bound), cumulative))
+        samples.append(("_bucket", _labels(view=view, method=method, le="+Inf"), histogram[-1]))
+        samples.append(("_sum", _labels(view=view, method=method), histogram[-2]))
+        samples.append(("_count", _labels(view=view, method=method), histogram[-1]))
+    family("logistics_http_request_duration_seconds", "histogram", "Request wall time.", samples)
+
+    family("logistics_invoice_sync_total", "counter", "INVOICE transaction recomputes by outcome.", [
+        ("", _labels(outcome=outcome), count) for outcome, count in sorted(invoice_sync_stats().items())
+    ])
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_snapshots(apps, schema_editor):
+    Transaction = apps.get_model('api', 'Transaction')
+    ClientBalanceSnapshot = apps.get_model('api', 'ClientBalanceSnapshot')
+
+    rows = (
+        Transaction.objects
+        .filter(client__isnull=False)
+        .annotate(month=TruncMonth('date'))
+        .values('client_id', 'month')
+        .annotate(
+            debit=Sum('amount', filter=Q(trans_type__in=['INVOICE', 'CP', 'BP'])),
+            credit=Sum('amount', filter=Q(trans_type__in=['CR', 'BR'])),
+        )
+        .order_by()
+    )
+    ClientBalanceSnapshot.objects.bulk_create(
+        [
+            ClientBalanceSnapshot(
+                client_id=row['client_id'],
+                month=row['month'],
+                debit=row['debit'] or 0,
+                credit=row['credit'] or 0,
+            )
+            for row in rows
+            if row['debit'] or row['credit']
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_alter_transaction_options_job_is_invoiced_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('debit', models.DecimalField(decimal_places=3, default=0.0, max_digits=20)),
+                ('credit', models.DecimalField(decimal_places=3, default=0.0, max_digits=20)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='api.client')),
+            ],
+            options={
+                'ordering': ['client', 'month'],
+                'unique_together': {('client', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
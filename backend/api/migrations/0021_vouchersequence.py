@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_clientbalancesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoucherSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10, unique=True)),
+                ('last_number', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_vouchersequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date', 'id'], name='api_transac_date_305668_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:54
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_job_totals(apps, schema_editor):
+    Job = apps.get_model('api', 'Job')
+    InvoiceItem = apps.get_model('api', 'InvoiceItem')
+
+    rows = (
+        InvoiceItem.objects
+        .values('job_id')
+        .annotate(subtotal=Sum('amount'), vat_total=Sum('vat'), grand_total=Sum('total'))
+        .order_by()
+    )
+    Job.objects.bulk_update(
+        [
+            Job(
+                id=row['job_id'],
+                subtotal=row['subtotal'] or 0,
+                vat_total=row['vat_total'] or 0,
+                grand_total=row['grand_total'] or 0,
+            )
+            for row in rows
+        ],
+        ['subtotal', 'vat_total', 'grand_total'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_transaction_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='grand_total',
+            field=models.DecimalField(db_index=True, decimal_places=3, default=0.0, editable=False, max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=3, default=0.0, editable=False, max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='vat_total',
+            field=models.DecimalField(decimal_places=3, default=0.0, editable=False, max_digits=20),
+        ),
+        migrations.RunPython(backfill_job_totals, migrations.RunPython.noop),
+    ]
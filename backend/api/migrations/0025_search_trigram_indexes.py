@@ -0,0 +1,44 @@
+# Trigram indexes backing api/search.py. Postgres only: other databases
+# (SQLite in development) search without them.
+
+from django.db import migrations
+
+# (index name, table, column) — indexed as UPPER(column) to match the SQL
+# Django emits for icontains/istartswith on Postgres
+TRIGRAM_INDEXES = [
+    ('api_client_name_trgm', 'api_client', 'name'),
+    ('api_party_name_trgm', 'api_party', 'name'),
+    ('api_job_transport_document_no_trgm', 'api_job', 'transport_document_no'),
+    ('api_job_invoice_no_trgm', 'api_job', 'invoice_no'),
+    ('api_job_shipment_invoice_no_trgm', 'api_job', 'shipment_invoice_no'),
+    ('api_container_number_trgm', 'api_container', 'number'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _table, _column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_revision_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
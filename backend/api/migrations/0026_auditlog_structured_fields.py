@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='diff',
+            field=models.JSONField(blank=True, help_text='Field values changed (or removed) by the action', null=True),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='entity_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='entity_type',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def rebuild_snapshots(apps, schema_editor):
+    """
+    Snapshots used to count a transaction for its client only; the ledger
+    also shows it to its job's client. Recount every row for both.
+    """
+    Transaction = apps.get_model('api', 'Transaction')
+    ClientBalanceSnapshot = apps.get_model('api', 'ClientBalanceSnapshot')
+
+    def monthly(transactions, owner):
+        return (
+            transactions
+            .annotate(month=TruncMonth('date'))
+            .values(owner, 'month')
+            .annotate(
+                debit=Sum('amount', filter=Q(trans_type__in=['INVOICE', 'CP', 'BP'])),
+                credit=Sum('amount', filter=Q(trans_type__in=['CR', 'BR'])),
+            )
+            .order_by()
+        )
+
+    totals = {}
+    for owner, transactions in (
+        ('client_id', Transaction.objects.filter(client__isnull=False)),
+        ('job__client_id', Transaction.objects.filter(job__client__isnull=False).exclude(client_id=F('job__client_id'))),
+    ):
+        for row in monthly(transactions, owner):
+            debit, credit = totals.get((row[owner], row['month']), (0, 0))
+            totals[row[owner], row['month']] = (debit + (row['debit'] or 0), credit + (row['credit'] or 0))
+
+    ClientBalanceSnapshot.objects.all().delete()
+    ClientBalanceSnapshot.objects.bulk_create(
+        [
+            ClientBalanceSnapshot(client_id=client_id, month=month, debit=debit, credit=credit)
+            for (client_id, month), (debit, credit) in totals.items()
+            if debit or credit
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_auditlog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,26 @@
-from django.db import models
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce, TruncMonth
 from django.utils import timezone
 
 
+def _save_kwargs_without(instance, maintained, kwargs):
+    """
+    save() kwargs that leave `maintained` columns out of a plain UPDATE, so an
+    instance loaded before they last moved can't write stale values back.
+    """
+    if not instance._state.adding and instance.pk and kwargs.get('update_fields') is None \
+            and not kwargs.get('force_insert'):
+        kwargs['update_fields'] = [
+            f.name for f in instance._meta.concrete_fields
+            if not f.primary_key and f.name not in maintained
+        ]
+    return kwargs
+
+
 # 1. The Client
 class Client(models.Model):
     name = models.CharField(max_length=200)
@@ -11,9 +30,30 @@ class Client(models.Model):
     email = models.EmailField(max_length=254, blank=True, null=True)
     vat_number = models.CharField(max_length=50, blank=True, null=True)
 
+    # Bumped by every write to the client or to a transaction on its ledger;
+    # the ledger and job ETags are built from it
+    revision = models.PositiveIntegerField(default=1, editable=False)
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **_save_kwargs_without(self, ('revision',), kwargs))
+        if not adding:
+            Client.touch(client_ids=[self.pk])
+
+    @classmethod
+    def touch(cls, client_ids=(), job_ids=()):
+        """Bump the revision of the given clients and of the clients of the given jobs."""
+        client_ids = {pk for pk in client_ids if pk}
+        job_ids = {pk for pk in job_ids if pk}
+        if not client_ids and not job_ids:
+            return
+        cls.objects.filter(models.Q(pk__in=client_ids) | models.Q(jobs__in=job_ids)).update(
+            revision=models.F('revision') + 1,
+        )
+
 
 # 2. The Job
 class Job(models.Model):
@@ -54,15 +94,77 @@ class Job(models.Model):
     is_invoiced = models.BooleanField(default=False, help_text="Marks job as invoiced and creates shadow entry")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Running sums of the job's invoice items, kept in step by InvoiceItem
+    # save/delete (see adjust_totals) — never written from a Job instance
+    TOTAL_FIELDS = ('subtotal', 'vat_total', 'grand_total')
+    subtotal = models.DecimalField(max_digits=20, decimal_places=3, default=0.000, editable=False)
+    vat_total = models.DecimalField(max_digits=20, decimal_places=3, default=0.000, editable=False)
+    grand_total = models.DecimalField(max_digits=20, decimal_places=3, default=0.000, editable=False, db_index=True)
+
+    # Bumped by every write to the job or its items; the job and item-list
+    # ETags are built from it
+    revision = models.PositiveIntegerField(default=1, editable=False)
+    MAINTAINED_FIELDS = TOTAL_FIELDS + ('revision',)
+
     def __str__(self):
         return f"Job #{self.id} - {self.client.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save signal tell whether the job changed client
+        if 'client_id' in field_names:
+            instance._loaded_client_id = instance.client_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+
+        with transaction.atomic():
+            if not adding and self.pk is not None:
+                # Locked, so two saves moving the job can't both move its
+                # transactions off the same client
+                stored = Job.objects.select_for_update().filter(pk=self.pk).values_list('client_id', flat=True)
+                self._loaded_client_id = stored.first()
+
+            # A Job loaded before its items changed would otherwise write stale
+            # totals back over the ones the items maintain
+            super().save(*args, **_save_kwargs_without(self, self.MAINTAINED_FIELDS, kwargs))
+
+            if not adding:
+                Job.objects.filter(pk=self.pk).update(revision=models.F('revision') + 1)
+                previous_client_id = getattr(self, '_loaded_client_id', self.client_id)
+                if previous_client_id is not None and previous_client_id != self.client_id:
+                    # The job's transactions show on the new client's ledger now
+                    ClientBalanceSnapshot.move_job(self.pk, previous_client_id, self.client_id)
+                    Client.touch(client_ids=[previous_client_id, self.client_id])
+        self._loaded_client_id = self.client_id
+
     def get_total_amount(self):
-        from decimal import Decimal
-        total = self.invoice_items.aggregate(
-            total=models.Sum('total')
-        )['total'] or Decimal('0.000')
-        return total
+        return self.grand_total
+
+    @classmethod
+    def adjust_totals(cls, job_id, subtotal, vat_total, grand_total):
+        """
+        Adds (or with negative figures, removes) item amounts on one job and
+        bumps its revision — called for every item write, even a zero delta.
+        """
+        cls.objects.filter(pk=job_id).update(
+            subtotal=models.F('subtotal') + subtotal,
+            vat_total=models.F('vat_total') + vat_total,
+            grand_total=models.F('grand_total') + grand_total,
+            revision=models.F('revision') + 1,
+        )
+
+    @classmethod
+    def item_totals(cls):
+        """Job queryset annotated with the totals recomputed from the items."""
+        zero = models.Value(Decimal('0.000'), output_field=models.DecimalField(max_digits=20, decimal_places=3))
+        return cls.objects.annotate(
+            items_subtotal=Coalesce(models.Sum('invoice_items__amount'), zero),
+            items_vat_total=Coalesce(models.Sum('invoice_items__vat'), zero),
+            items_grand_total=Coalesce(models.Sum('invoice_items__total'), zero),
+        )
 
 
 # 3. Containers
@@ -99,6 +201,12 @@ class Party(models.Model):
 
 # 6. Transactions
 class Transaction(models.Model):
+    # Money received from clients (credits) and money paid out (debits)
+    RECEIPT_TYPES = ['CR', 'BR']
+    PAYMENT_TYPES = ['CP', 'BP']
+    # Ledger debit side: invoices plus payments made on the client's behalf
+    LEDGER_DEBIT_TYPES = ['INVOICE', 'CP', 'BP']
+
     trans_type = models.CharField(max_length=10)
     amount = models.DecimalField(max_digits=10, decimal_places=3)
     description = models.CharField(max_length=255, blank=True)
@@ -116,50 +224,101 @@ class Transaction(models.Model):
         client_name = self.client.name if self.client else "No Client"
         return f"{self.trans_type} - {client_name} - {self.amount}"
 
-    def generate_voucher_no(self):
-        prefix_map = {
-            'CR': 'CR',
-            'CP': 'CP',
-            'BR': 'BR',
-            'BP': 'BP',
-            'INVOICE': 'INV'
-        }
-
-        prefix = prefix_map.get(self.trans_type, 'TXN')
-
-        last_transaction = Transaction.objects.filter(
-            trans_type=self.trans_type,
-            voucher_no__startswith=prefix
-        ).order_by('-id').first()
+    VOUCHER_PREFIXES = {
+        'CR': 'CR',
+        'CP': 'CP',
+        'BR': 'BR',
+        'BP': 'BP',
+        'INVOICE': 'INV'
+    }
 
-        if last_transaction and last_transaction.voucher_no:
-            try:
-                last_num = int(last_transaction.voucher_no.split('-')[1])
-                new_num = last_num + 1
-            except (IndexError, ValueError):
-                new_num = 1
-        else:
-            new_num = 1
-
-        return f"{prefix}-{new_num:03d}"
+    def generate_voucher_no(self):
+        prefix = self.VOUCHER_PREFIXES.get(self.trans_type, 'TXN')
+        return VoucherSequence.format(prefix, VoucherSequence.allocate(prefix))
+
+    LEDGER_FIELDS = ('trans_type', 'amount', 'date', 'client_id', 'job_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the figures this row was loaded with for the post_delete
+        # receiver, which can't re-read a row that is gone
+        if set(cls.LEDGER_FIELDS) <= set(field_names):
+            instance._loaded_ledger_fields = {name: getattr(instance, name) for name in cls.LEDGER_FIELDS}
+        return instance
+
+    @classmethod
+    def effects_of(cls, trans_type, amount, date, client_id, job_client_id):
+        """
+        [(client_id, month, debit, credit)] a row with these values adds to
+        client ledgers. A row shows on its own client's ledger and on its
+        job's client's (see _ledger_queryset in views.py), once when they
+        are the same client.
+        """
+        amount = Decimal(str(amount or 0))
+        debit = amount if trans_type in cls.LEDGER_DEBIT_TYPES else Decimal('0.000')
+        credit = amount if trans_type in cls.RECEIPT_TYPES else Decimal('0.000')
+        if not date or (not debit and not credit):
+            return []
+
+        month = ClientBalanceSnapshot.month_of(date)
+        owners = {client_id, job_client_id} - {None}
+        return [(owner, month, debit, credit) for owner in sorted(owners)]
+
+    def ledger_effects(self):
+        """effects_of() this row as it stands in memory."""
+        return self.effects_of(
+            self.trans_type, self.amount, self.date, self.client_id,
+            self.job.client_id if self.job_id else None,
+        )
 
     def save(self, *args, **kwargs):
-        if not self.voucher_no:
-            self.voucher_no = self.generate_voucher_no()
-
         if self.job and not self.client:
             self.client = self.job.client
 
         if self.client and not self.party_name:
             self.party_name = self.client.name
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.voucher_no:
+                self.voucher_no = self.generate_voucher_no()
+
+            # What the stored row contributes, read under a row lock so two
+            # concurrent saves can't both take the same old figures off. A
+            # copy (pk set to None) is an insert and contributes nothing yet.
+            stored = None
+            if not self._state.adding and self.pk is not None:
+                stored = (
+                    Transaction.objects.select_for_update(of=('self',)).filter(pk=self.pk)
+                    .values(*self.LEDGER_FIELDS, job_client_id=models.F('job__client_id')).first()
+                )
+            previous = []
+            if stored:
+                previous = self.effects_of(
+                    stored['trans_type'], stored['amount'], stored['date'], stored['client_id'], stored['job_client_id'],
+                )
+
+            super().save(*args, **kwargs)
+
+            current = self.ledger_effects()
+            ClientBalanceSnapshot.remove_effects(previous)
+            ClientBalanceSnapshot.add_effects(current)
+            self._loaded_ledger_fields = {name: getattr(self, name) for name in self.LEDGER_FIELDS}
+
+            # The row shows on its client's ledger and its job's client's
+            # ledger, before and after this save
+            Client.touch(
+                client_ids=[stored and stored['client_id'], self.client_id],
+                job_ids=[stored and stored['job_id'], self.job_id],
+            )
 
     class Meta:
         ordering = ['-date', '-id']
         indexes = [
             models.Index(fields=['client', 'date']),
             models.Index(fields=['party_name', 'date']),
+            # Keyset pagination of the transaction list walks (date, id)
+            models.Index(fields=['date', 'id']),
         ]
 
 
@@ -181,10 +340,80 @@ class InvoiceItem(models.Model):
     vat = models.DecimalField(max_digits=20, decimal_places=3, default=0.000)
     total = models.DecimalField(max_digits=20, decimal_places=3, default=0.000)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row added to the job's totals for the
+        # post_delete receiver, which can't re-read a row that is gone
+        if {'job_id', 'amount', 'vat', 'total'} <= set(field_names):
+            instance._loaded_totals_effect = instance.totals_effect()
+        return instance
+
+    def totals_effect(self):
+        """(job_id, amount, vat, total) this row adds to its job's totals."""
+        return (
+            self.job_id,
+            Decimal(str(self.amount or 0)),
+            Decimal(str(self.vat or 0)),
+            Decimal(str(self.total or 0)),
+        )
+
+    @staticmethod
+    @contextmanager
+    def totals_set_outright(job_id):
+        """
+        Inside the block, deleting items of `job_id` leaves the job's totals
+        and INVOICE transaction alone (see signals.py): the caller sets both
+        once for the whole edit instead of once per item.
+        """
+        jobs = InvoiceItem._outright_jobs()
+        jobs.add(job_id)
+        try:
+            yield
+        finally:
+            jobs.discard(job_id)
+
+    @staticmethod
+    def _outright_jobs():
+        if not hasattr(_outright, 'jobs'):
+            _outright.jobs = set()
+        return _outright.jobs
+
+    @classmethod
+    def totals_are_set_outright(cls, job_id):
+        return job_id in cls._outright_jobs()
+
     def save(self, *args, **kwargs):
-        from decimal import Decimal
         self.total = Decimal(str(self.amount)) + Decimal(str(self.vat))
-        super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            # Locked read of the stored row, as in Transaction.save; a copy
+            # (pk set to None) adds its full amounts
+            stored = None
+            if not self._state.adding and self.pk is not None:
+                stored = InvoiceItem.objects.select_for_update().filter(pk=self.pk).first()
+            previous = stored.totals_effect() if stored else None
+
+            super().save(*args, **kwargs)
+
+            current = self.totals_effect()
+            if previous and previous[0] != current[0]:
+                # Moved to another job: take it off the old one in full
+                Job.adjust_totals(previous[0], -previous[1], -previous[2], -previous[3])
+                previous = None
+            if previous:
+                Job.adjust_totals(
+                    self.job_id,
+                    current[1] - previous[1], current[2] - previous[2], current[3] - previous[3],
+                )
+            else:
+                Job.adjust_totals(self.job_id, *current[1:])
+            self._loaded_totals_effect = current
+
+
+# Jobs whose items are being replaced by a caller that sets the totals and
+# marks the invoice itself (see InvoiceItem.totals_set_outright)
+_outright = threading.local()
 
 
 # 9. Quotation
@@ -202,13 +431,26 @@ class Quotation(models.Model):
 
 # 10. Audit Logs
 class AuditLog(models.Model):
-    user_name = models.CharField(max_length=100)
+    user_name = models.CharField(max_length=100)  # the actor
     action = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event is recorded, not when api/audit.py gets it written
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    entity_type = models.CharField(max_length=50, blank=True)
+    entity_id = models.BigIntegerField(null=True, blank=True)
+    diff = models.JSONField(null=True, blank=True, help_text="Field values changed (or removed) by the action")
 
     def __str__(self):
         return f"{self.user_name}: {self.action}"
 
+    class Meta:
+        indexes = [
+            # Newest-first feed and keyset pagination walk (timestamp, id)
+            models.Index(fields=['timestamp', 'id']),
+            models.Index(fields=['user_name', 'timestamp']),
+            models.Index(fields=['entity_type', 'entity_id']),
+        ]
+
 
 # 11. AI Receipts
 class Receipt(models.Model):
@@ -220,3 +462,224 @@ class Receipt(models.Model):
 
     def __str__(self):
         return f"Receipt #{self.id} - {self.total_amount}"
+
+
+# 12. Voucher Number Sequences
+class VoucherSequence(models.Model):
+    """
+    One counter row per voucher prefix (CR, CP, BR, BP, INV, TXN).
+    Numbers are handed out by an atomic UPDATE ... SET last_number =
+    last_number + n, so allocation costs the same however big the
+    transactions table grows, and concurrent workers never share a number.
+    """
+    prefix = models.CharField(max_length=10, unique=True)
+    last_number = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix}: {self.last_number}"
+
+    @staticmethod
+    def format(prefix, number):
+        return f"{prefix}-{number:03d}"
+
+    @classmethod
+    def allocate(cls, prefix, count=1):
+        """
+        Reserves `count` consecutive numbers for `prefix` and returns the first.
+        The UPDATE takes the row lock (Postgres) or the write lock (SQLite)
+        before the value is read back, so the block is ours alone.
+        """
+        with transaction.atomic():
+            updated = cls.objects.filter(prefix=prefix).update(
+                last_number=models.F('last_number') + count
+            )
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(prefix=prefix, last_number=cls._highest_issued(prefix) + count)
+                except IntegrityError:
+                    # Another worker seeded the counter first
+                    cls.objects.filter(prefix=prefix).update(
+                        last_number=models.F('last_number') + count
+                    )
+
+            last_number = cls.objects.filter(prefix=prefix).values_list('last_number', flat=True).get()
+
+        return last_number - count + 1
+
+    @staticmethod
+    def _highest_issued(prefix):
+        """
+        Highest number already used for `prefix`. Only runs once per prefix,
+        when its counter row is first created.
+        """
+        highest = 0
+        issued = Transaction.objects.filter(
+            voucher_no__startswith=f"{prefix}-"
+        ).values_list('voucher_no', flat=True)
+
+        for voucher_no in issued.iterator(chunk_size=2000):
+            try:
+                highest = max(highest, int(voucher_no.split('-')[1]))
+            except (IndexError, ValueError):
+                continue
+        return highest
+
+
+# 13. Client Balance Snapshots
+class ClientBalanceSnapshot(models.Model):
+    """
+    Per-client, per-month ledger movement, kept up to date by Transaction
+    save/delete. Lets a date-bounded statement work out its opening balance
+    from a handful of monthly rows instead of the client's whole history.
+    """
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='balance_snapshots')
+    month = models.DateField(help_text="First day of the month")
+    debit = models.DecimalField(max_digits=20, decimal_places=3, default=0.000)
+    credit = models.DecimalField(max_digits=20, decimal_places=3, default=0.000)
+
+    class Meta:
+        unique_together = ('client', 'month')
+        ordering = ['client', 'month']
+
+    def __str__(self):
+        return f"{self.client_id} {self.month:%Y-%m}: Dr {self.debit} / Cr {self.credit}"
+
+    @staticmethod
+    def month_of(day):
+        return day.replace(day=1)
+
+    @classmethod
+    def apply_delta(cls, client_id, month, debit, credit):
+        """Adds (or with negative figures, removes) movement for one client-month."""
+        if not debit and not credit:
+            return
+
+        updated = cls.objects.filter(client_id=client_id, month=month).update(
+            debit=models.F('debit') + debit,
+            credit=models.F('credit') + credit,
+        )
+        if updated:
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(client_id=client_id, month=month, debit=debit, credit=credit)
+        except IntegrityError:
+            # Another writer created the row first — fall back to the update
+            cls.objects.filter(client_id=client_id, month=month).update(
+                debit=models.F('debit') + debit,
+                credit=models.F('credit') + credit,
+            )
+
+    @classmethod
+    def add_effects(cls, effects):
+        for client_id, month, debit, credit in effects:
+            cls.apply_delta(client_id, month, debit, credit)
+
+    @classmethod
+    def remove_effects(cls, effects):
+        for client_id, month, debit, credit in effects:
+            cls.apply_delta(client_id, month, -debit, -credit)
+
+    @staticmethod
+    def _monthly(transactions, owner):
+        """{(owner value, month): (debit, credit)} of `transactions` grouped on the `owner` field."""
+        rows = (
+            transactions
+            .annotate(month=TruncMonth('date'))
+            .values(owner, 'month')
+            .annotate(
+                debit=models.Sum('amount', filter=models.Q(trans_type__in=Transaction.LEDGER_DEBIT_TYPES)),
+                credit=models.Sum('amount', filter=models.Q(trans_type__in=Transaction.RECEIPT_TYPES)),
+            )
+            .order_by()
+        )
+        # SQLite sums decimals as floats
+        three_dp = Decimal('0.001')
+        return {
+            (row[owner], row['month']): (
+                Decimal(str(row['debit'] or 0)).quantize(three_dp),
+                Decimal(str(row['credit'] or 0)).quantize(three_dp),
+            )
+            for row in rows
+        }
+
+    @classmethod
+    def movement(cls, transactions):
+        """
+        {(client_id, month): (debit, credit)} that `transactions` put on
+        client ledgers, by the same rule as Transaction.effects_of(): each
+        row counts for its client and, when that's someone else, for its
+        job's client. Two grouped queries.
+        """
+        totals = dict(cls._monthly(transactions.filter(client__isnull=False), 'client_id'))
+        via_job = transactions.filter(job__client__isnull=False).exclude(client_id=models.F('job__client_id'))
+        for key, (debit, credit) in cls._monthly(via_job, 'job__client_id').items():
+            old_debit, old_credit = totals.get(key, (Decimal('0.000'), Decimal('0.000')))
+            totals[key] = (old_debit + debit, old_credit + credit)
+        return totals
+
+    @classmethod
+    def apply_difference(cls, before, after):
+        """Moves the snapshots from one movement() to another."""
+        zero = (Decimal('0.000'), Decimal('0.000'))
+        for key in before.keys() | after.keys():
+            client_id, month = key
+            old_debit, old_credit = before.get(key, zero)
+            new_debit, new_credit = after.get(key, zero)
+            cls.apply_delta(client_id, month, new_debit - old_debit, new_credit - old_credit)
+
+    @classmethod
+    def move_job(cls, job_id, old_client_id, new_client_id):
+        """
+        A job changed client: its transactions leave the old client's
+        ledger, except the ones that are that client's own, and join the
+        new client's, except the ones already on it as their own. A None
+        client is skipped (a deleted job has no new one).
+        """
+        rows = Transaction.objects.filter(job_id=job_id)
+        for client_id, sign in ((old_client_id, -1), (new_client_id, 1)):
+            if client_id is None:
+                continue
+            for (_, month), (debit, credit) in cls._monthly(rows.exclude(client_id=client_id), 'job_id').items():
+                cls.apply_delta(client_id, month, sign * debit, sign * credit)
+
+    @classmethod
+    def opening_balance(cls, client, day):
+        """Ledger balance (debit - credit) carried into `day` for `client`."""
+        month = cls.month_of(day)
+
+        totals = cls.objects.filter(client=client, month__lt=month).aggregate(
+            debit=models.Sum('debit'),
+            credit=models.Sum('credit'),
+        )
+        # Rows from the start of the month up to the day before `day`, picked
+        # the way the ledger picks them
+        partial = Transaction.objects.filter(
+            models.Q(client=client) | models.Q(job__client=client), date__gte=month, date__lt=day,
+        ).aggregate(
+            debit=models.Sum('amount', filter=models.Q(trans_type__in=Transaction.LEDGER_DEBIT_TYPES)),
+            credit=models.Sum('amount', filter=models.Q(trans_type__in=Transaction.RECEIPT_TYPES)),
+        )
+
+        return (
+            (totals['debit'] or Decimal('0.000')) - (totals['credit'] or Decimal('0.000'))
+            + (partial['debit'] or Decimal('0.000')) - (partial['credit'] or Decimal('0.000'))
+        )
+
+    @classmethod
+    def rebuild(cls):
+        """Recomputes every snapshot from the transactions table in two grouped passes."""
+        movement = cls.movement(Transaction.objects.all())
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [
+                    cls(client_id=client_id, month=month, debit=debit, credit=credit)
+                    for (client_id, month), (debit, credit) in movement.items()
+                    if debit or credit
+                ],
+                batch_size=1000,
+            )
@@ -0,0 +1,117 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F
+from django.db.models.fields.tuple_lookups import Tuple, TupleGreaterThan, TupleLessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+# Keyset (cursor) pagination for the large list endpoints.
+# Each page is a WHERE on the ordering columns rather than an OFFSET, so the
+# cost of fetching page N does not grow with N or with the table size.
+#
+# DRF's CursorPagination keys its cursor on the first ordering column only
+# and pages through ties on it with an OFFSET, which turns a busy date (or
+# the many jobs with a grand_total of 0) into an offset scan. Here the
+# cursor holds every ordering column and the next page is a row comparison,
+# (date, id) < (d, i), which Postgres answers straight from the (date, id)
+# index. The last column must be unique (id), so positions never tie and
+# no offset is needed.
+
+POSITION_SEPARATOR = '|'
+
+
+class BaseCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.cursor.position if self.cursor else None
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            queryset = queryset.filter(self._after(queryset.model, position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+
+        # Forward: more rows after this page mean a next one, and any cursor
+        # means there were rows before. Backward, the other way round.
+        self.has_next = position is not None if reverse else has_more
+        self.has_previous = has_more if reverse else position is not None
+        if self.page:
+            self.next_position = self._get_position_from_instance(self.page[-1], self.ordering)
+            self.previous_position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            self.next_position = self.previous_position = position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.previous_position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        return POSITION_SEPARATOR.join(
+            str(getattr(instance, name.lstrip('-'))) for name in ordering
+        )
+
+    def _after(self, model, position, reverse):
+        """The filter for the rows that follow `position` in the page direction."""
+        names = [name.lstrip('-') for name in self.ordering]
+        values = position.split(POSITION_SEPARATOR)
+        if len(values) != len(names):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [model._meta.get_field(name).to_python(value) for name, value in zip(names, values)]
+        except DjangoValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+        # Every ordering here runs all its columns the same way
+        descending = self.ordering[0].startswith('-')
+        lookup = TupleLessThan if descending != reverse else TupleGreaterThan
+        return lookup(Tuple(*(F(name) for name in names)), tuple(values))
+
+
+class IdCursorPagination(BaseCursorPagination):
+    ordering = ('-id',)
+
+
+class DateCursorPagination(BaseCursorPagination):
+    ordering = ('-date', '-id')
+
+
+class TimestampCursorPagination(BaseCursorPagination):
+    ordering = ('-timestamp', '-id')
+
+
+class JobCursorPagination(IdCursorPagination):
+    # ?ordering=grand_total / -grand_total sorts by the maintained invoice total
+    orderings = {
+        'grand_total': ('grand_total', 'id'),
+        '-grand_total': ('-grand_total', '-id'),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        ordering = self.orderings.get(request.query_params.get('ordering'))
+        return ordering or super().get_ordering(request, queryset, view)
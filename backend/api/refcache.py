@@ -0,0 +1,152 @@
+"""
+Read-through cache for the reference-data endpoints (charge types, parties,
+clients, clients-from-jobs), which nearly every page fetches but which
+rarely change.
+
+Each namespace has a version token kept in the Django cache. Responses are
+stored under (namespace, version, url) in an in-process LRU, backed by the
+Django cache so other workers can share them. Saving or deleting one of the
+models bumps its namespaces' versions on commit (see signals.py), which
+orphans every stored response at once — nothing is deleted key by key.
+
+The version token itself expires after REFERENCE_CACHE_TIMEOUT. With a
+per-process cache (LocMemCache, the default) a bump only reaches the worker
+that made the write; the others pick up a fresh token, and so fresh lists,
+when theirs expires. A shared cache makes the bump reach every worker at once.
+
+Responses carry an ETag; a matching If-None-Match gets an empty 304.
+"""
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+_MISSING = object()
+
+_lru_lock = threading.Lock()
+_lru = OrderedDict()
+
+
+def _cache():
+    return caches[getattr(settings, "REFERENCE_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "REFERENCE_CACHE_TIMEOUT", 300)
+
+
+def _version_key(namespace):
+    return f"refcache:{namespace}:version"
+
+
+def current_version(namespace):
+    cache = _cache()
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # First use, expired or evicted: any fresh token will do; add() so
+        # two workers sharing a cache settle on the same one
+        cache.add(_version_key(namespace), uuid.uuid4().hex, _timeout())
+        version = cache.get(_version_key(namespace))
+    return version
+
+
+def invalidate(*namespaces):
+    """Retire everything cached for `namespaces` once the current transaction commits."""
+    def bump():
+        for namespace in namespaces:
+            _cache().set(_version_key(namespace), uuid.uuid4().hex, _timeout())
+
+    # On commit, so a request racing the write can't cache the old rows
+    # under the new version
+    transaction.on_commit(bump)
+
+
+def _lru_get(key):
+    with _lru_lock:
+        entry = _lru.get(key, _MISSING)
+        if entry is not _MISSING:
+            _lru.move_to_end(key)
+        return entry
+
+
+def _lru_put(key, entry):
+    with _lru_lock:
+        _lru[key] = entry
+        _lru.move_to_end(key)
+        while len(_lru) > getattr(settings, "REFERENCE_CACHE_LRU_SIZE", 256):
+            _lru.popitem(last=False)
+
+
+def clear_local():
+    """Empties this process's LRU (the shared cache is left alone)."""
+    with _lru_lock:
+        _lru.clear()
+
+
+def _etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return '"%s"' % hashlib.sha1(body.encode()).hexdigest()
+
+
+def cached_response(request, namespace, build):
+    """
+    Serve `request` from the cache for `namespace`, calling `build()` for
+    the response data on a miss. Only the URL varies the entry, so callers
+    must not return per-user data.
+    """
+    key = f"refcache:{namespace}:{current_version(namespace)}:{request.build_absolute_uri()}"
+
+    entry = _lru_get(key)
+    if entry is _MISSING:
+        entry = _cache().get(key)
+        if entry is None:
+            data = build()
+            entry = (_etag(data), data)
+            _cache().set(key, entry, _timeout())
+        _lru_put(key, entry)
+
+    etag, data = entry
+    return conditional_response(request, etag, lambda: data)
+
+
+def etag_matches(request, etag):
+    """True when the request's If-None-Match already has `etag`."""
+    if_none_match = request.headers.get("If-None-Match", "")
+    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+
+def conditional_response(request, etag, build):
+    """
+    An empty 304 when the request's If-None-Match already has `etag`,
+    otherwise a Response of `build()` — which is not called on a match.
+    Both carry the ETag and ask clients to revalidate every time.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(build(), headers=headers)
+
+
+class CachedListMixin:
+    """
+    For reference-data viewsets: list() goes through cached_response() under
+    `cache_namespace`. Detail routes and writes are untouched.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            self.cache_namespace,
+            lambda: super(CachedListMixin, self).list(request, *args, **kwargs).data,
+        )
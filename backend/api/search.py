@@ -0,0 +1,145 @@
+"""
+Typeahead search over clients, parties and jobs (by document/invoice numbers
+and container numbers).
+
+Matching is a case-insensitive substring test (icontains). On Postgres that
+is served by the pg_trgm GIN indexes on UPPER(column) created in migration
+0025, and matches are ranked by exact > prefix > substring, then by trigram
+similarity. Other databases (SQLite in development) get the same matching
+and exact/prefix/substring ranking without the indexes or the similarity
+tiebreak.
+"""
+from django.db import connection
+from django.db.models import Case, FloatField, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Length
+
+from .models import Client, Container, Job, Party
+
+SEARCH_TYPES = ("clients", "parties", "jobs")
+
+# Job fields searched, with the label shown for a match on each
+JOB_FIELDS = {
+    "transport_document_no": "Transport document",
+    "invoice_no": "Invoice no",
+    "shipment_invoice_no": "Shipment invoice no",
+}
+
+
+class _Similarity(Func):
+    """pg_trgm similarity(); only used on Postgres."""
+    function = "SIMILARITY"
+    output_field = FloatField()
+
+
+def _rank(field, query):
+    """3 for an exact match, 2 for a prefix match, 1 for any other match."""
+    return Case(
+        When(**{f"{field}__iexact": query}, then=Value(3)),
+        When(**{f"{field}__istartswith": query}, then=Value(2)),
+        When(**{f"{field}__icontains": query}, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _ranked(queryset, fields, query, tiebreak=("pk",)):
+    """
+    `queryset` filtered to rows matching any of `fields`, best matches first
+    and `tiebreak` deciding between equally good ones.
+    """
+    matches = Q()
+    for field in fields:
+        matches |= Q(**{f"{field}__icontains": query})
+
+    ranks = [_rank(field, query) for field in fields]
+    queryset = queryset.filter(matches).annotate(
+        rank=Greatest(*ranks) if len(ranks) > 1 else ranks[0],
+    )
+    ordering = ["-rank"]
+
+    if connection.vendor == "postgresql":
+        similarities = [_Similarity(field, Value(query)) for field in fields]
+        queryset = queryset.annotate(
+            similarity=Greatest(*similarities) if len(similarities) > 1 else similarities[0],
+        )
+        ordering.append("-similarity")
+
+    return queryset.order_by(*ordering, *tiebreak)
+
+
+def _search_clients(query, limit):
+    rows = (
+        _ranked(Client.objects.all(), ["name"], query, tiebreak=(Length("name"), "name"))
+        .values("id", "name", "vat_number", "rank")[:limit]
+    )
+    return [
+        {"id": row["id"], "label": row["name"], "vat_number": row["vat_number"], "rank": row["rank"]}
+        for row in rows
+    ]
+
+
+def _search_parties(query, limit):
+    rows = (
+        _ranked(Party.objects.all(), ["name"], query, tiebreak=(Length("name"), "name"))
+        .values("id", "name", "rank")[:limit]
+    )
+    return [{"id": row["id"], "label": row["name"], "rank": row["rank"]} for row in rows]
+
+
+def _search_jobs(query, limit):
+    """
+    Jobs matching on their own number fields, plus jobs with a matching
+    container. Two queries rather than one OR across tables, so Postgres can
+    use each table's own trigram indexes.
+    """
+    fields = list(JOB_FIELDS)
+    jobs = (
+        _ranked(Job.objects.all(), fields, query)
+        .values("id", "client__name", "rank", *fields)[:limit]
+    )
+
+    results = {}
+    for row in jobs:
+        needle = query.lower()
+        matched = max(
+            (field for field in fields if row[field] and needle in row[field].lower()),
+            key=lambda field: (row[field].lower() == needle, row[field].lower().startswith(needle)),
+            default=fields[0],
+        )
+        results[row["id"]] = {
+            "id": row["id"],
+            "label": f"Job #{row['id']} - {row['client__name']}",
+            "matched_field": JOB_FIELDS[matched],
+            "matched_value": row[matched],
+            "rank": row["rank"],
+        }
+
+    containers = (
+        _ranked(Container.objects.all(), ["number"], query)
+        .values("job_id", "job__client__name", "number", "rank")[:limit]
+    )
+    for row in containers:
+        if row["job_id"] in results and results[row["job_id"]]["rank"] >= row["rank"]:
+            continue
+        results[row["job_id"]] = {
+            "id": row["job_id"],
+            "label": f"Job #{row['job_id']} - {row['job__client__name']}",
+            "matched_field": "Container",
+            "matched_value": row["number"],
+            "rank": row["rank"],
+        }
+
+    # Both lists came back best-first; keep that order across the merge
+    return sorted(results.values(), key=lambda result: -result["rank"])[:limit]
+
+
+SEARCHERS = {
+    "clients": _search_clients,
+    "parties": _search_parties,
+    "jobs": _search_jobs,
+}
+
+
+def search(query, types=SEARCH_TYPES, limit=10):
+    """{type: [result, ...]} for each of `types`, best matches first."""
+    return {kind: SEARCHERS[kind](query, limit) for kind in types}
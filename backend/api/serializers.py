@@ -1,14 +1,19 @@
+import logging
+
 from rest_framework import serializers
 from .models import (
     Client, Job, Transaction, ChargeType, InvoiceItem, 
     Quotation, AuditLog, Receipt, Container, Party
 )
 
+logger = logging.getLogger(__name__)
+
 # 1. Client Serializer
 class ClientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Client
-        fields = '__all__'
+        # revision moves with every ledger write; it only feeds ETags
+        exclude = ['revision']
 
 # 2. Job Serializer (FIXED: No longer destroys history)
 class JobSerializer(serializers.ModelSerializer):
@@ -36,8 +41,6 @@ class JobSerializer(serializers.ModelSerializer):
 
     # NEW: The SAFE Update Logic
     def update(self, instance, validated_data):
-        print("---------------- DEBUG START ----------------")
-        
         # 1. Extract client data (don't save it yet)
         client_data = validated_data.pop('client', None)
 
@@ -52,7 +55,7 @@ class JobSerializer(serializers.ModelSerializer):
 
             # SCENARIO A: User changed the Client Name (e.g., "Company A" -> "Company B")
             if new_name and new_name.strip().lower() != old_name.strip().lower():
-                print(f"SWITCHING CLIENT: {old_name} -> {new_name}")
+                logger.debug("Job %s switching client: %s -> %s", instance.pk, old_name, new_name)
                 # Find or Create the NEW client. Do not rename the old one!
                 client_obj, _ = Client.objects.get_or_create(
                     name=new_name,
@@ -62,14 +65,12 @@ class JobSerializer(serializers.ModelSerializer):
             
             # SCENARIO B: Name is the same, but they might have changed address/VAT
             else:
-                print("SAME CLIENT DETECTED - SKIPPING MASTER UPDATE TO PROTECT HISTORY")
+                logger.debug("Job %s keeps client %s; client record left unchanged", instance.pk, old_name)
                 # We do NOT call client_obj.save() here. 
                 # This prevents Invoice 205 from changing Invoice 204's client details.
                 # Note: VAT is already saved to the Job (instance.vat_number) in Step 2.
 
         instance.save()
-        print("4. JOB SAVED SAFELY")
-        print("---------------- DEBUG END ----------------")
         return instance
 
 # 3. Invoice Item Serializer
@@ -79,6 +80,29 @@ class InvoiceItemSerializer(serializers.ModelSerializer):
         model = InvoiceItem
         fields = '__all__'
 
+# 3b. Bulk Invoice Item Serializer (PUT /api/jobs/{id}/invoice-items/)
+class InvoiceItemBulkListSerializer(serializers.ListSerializer):
+    def validate(self, rows):
+        # One query for every charge type in the payload instead of one per row
+        wanted = {row['charge_type_id'] for row in rows}
+        found = set(ChargeType.objects.filter(id__in=wanted).values_list('id', flat=True))
+        if wanted - found:
+            raise serializers.ValidationError(
+                f"Unknown charge types: {sorted(wanted - found)}"
+            )
+        return rows
+
+
+class InvoiceItemBulkSerializer(serializers.ModelSerializer):
+    # Present for rows that already exist, omitted for new rows
+    id = serializers.IntegerField(required=False)
+    charge_type = serializers.IntegerField(source='charge_type_id')
+
+    class Meta:
+        model = InvoiceItem
+        fields = ['id', 'charge_type', 'description', 'amount', 'vat']
+        list_serializer_class = InvoiceItemBulkListSerializer
+
 # 4. Transaction Serializer
 class TransactionSerializer(serializers.ModelSerializer):
     date = serializers.DateField(
@@ -151,6 +175,41 @@ class TransactionSerializer(serializers.ModelSerializer):
         return data
 
 
+class TransactionImportSerializer(TransactionSerializer):
+    """
+    One row of a bulk import (api/importing.py). TransactionSerializer's
+    field rules, but job and client arrive as plain ids checked against the
+    maps the importer loads once per batch (context['jobs'] and
+    context['clients']) instead of one query per row.
+    """
+    job = serializers.IntegerField(source='job_id', required=False, allow_null=True)
+    client = serializers.IntegerField(source='client_id', required=False, allow_null=True)
+    # INVOICE rows belong to the invoicing sync, not to imports
+    trans_type = serializers.ChoiceField(choices=Transaction.RECEIPT_TYPES + Transaction.PAYMENT_TYPES)
+
+    class Meta(TransactionSerializer.Meta):
+        fields = [
+            'date', 'amount', 'trans_type', 'description', 'job', 'client',
+            'party_name', 'voucher_no', 'bank_name', 'cheque_no',
+        ]
+
+    def validate(self, data):
+        jobs = self.context['jobs']
+        clients = self.context['clients']
+        job_id = data.get('job_id')
+        client_id = data.get('client_id')
+
+        if job_id is not None and job_id not in jobs:
+            raise serializers.ValidationError({'job': f"Job {job_id} does not exist."})
+        if client_id is not None and client_id not in clients:
+            raise serializers.ValidationError({'client': f"Client {client_id} does not exist."})
+        if job_id and client_id and jobs[job_id].client_id != client_id:
+            raise serializers.ValidationError(
+                "Transaction client must match the job's client."
+            )
+        return data
+
+
 # 5. Charge Type Serializer
 class ChargeTypeSerializer(serializers.ModelSerializer):
     class Meta:
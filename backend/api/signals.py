@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from django.utils import timezone
-from .models import Job, Transaction, InvoiceItem
+from . import refcache
+from .invoicing import mark_invoice_dirty
+from .models import Job, Transaction, InvoiceItem, ClientBalanceSnapshot, ChargeType, Party, Client
 
 # ─────────────────────────────────────────────────────────────────────────────
 # WHY THE ORIGINAL SIGNALS WERE BROKEN
@@ -32,28 +33,8 @@ def create_invoice_transaction_on_job_invoiced(sender, instance, **kwargs):
     if not instance.is_invoiced:
         return  # Job not invoiced yet — nothing to do
 
-    total_amount = instance.get_total_amount()
-    if total_amount <= 0:
-        return  # No line items — skip
-
-    transaction, tx_created = Transaction.objects.get_or_create(
-        job=instance,
-        trans_type="INVOICE",
-        defaults={
-            "amount": total_amount,
-            "description": f"Job #{instance.id} - Invoiced Charges",
-            "date": timezone.now().date(),
-            "client": instance.client,
-            "party_name": instance.client.name if instance.client else "",
-        },
-    )
-
-    if not tx_created:
-        # Already invoiced before — keep in sync
-        transaction.amount = total_amount
-        transaction.client = instance.client
-        transaction.party_name = instance.client.name if instance.client else ""
-        transaction.save()
+    # Not a removal path: a job with no billable items keeps its debit
+    mark_invoice_dirty(instance.id, remove_when_empty=False)
 
 
 @receiver([post_save, post_delete], sender=InvoiceItem)
@@ -64,31 +45,88 @@ def update_invoice_transaction_on_item_change(sender, instance, **kwargs):
 
     BUG FIX: was getattr(job, 'invoice', None) — always None since Invoice
     table is empty — causing an early return every single time.
+
+    The is_invoiced check happens at flush time, once per job, so deleting
+    many items doesn't load the job once per item. Item writes through the
+    API also mark the job; both collapse into one recompute.
     """
-    job = instance.job
+    if InvoiceItem.totals_are_set_outright(instance.job_id):
+        return
+    mark_invoice_dirty(instance.job_id, only_if_invoiced=True)
 
-    # ✅ FIX: check the flag the UI actually sets, not the empty Invoice table
-    if not job.is_invoiced:
+
+@receiver(post_delete, sender=InvoiceItem)
+def remove_item_from_job_totals(sender, instance, **kwargs):
+    """
+    Take a deleted item's amounts back off its job's maintained totals.
+    A signal for the same reason as the snapshot one below: queryset deletes
+    and job cascades never call InvoiceItem.delete().
+    """
+    if InvoiceItem.totals_are_set_outright(instance.job_id):
         return
+    effect = getattr(instance, "_loaded_totals_effect", None) or instance.totals_effect()
+    job_id, amount, vat, total = effect
+    Job.adjust_totals(job_id, -amount, -vat, -total)
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_transaction_from_balance_snapshot(sender, instance, **kwargs):
+    """
+    Take a deleted transaction back out of its client's monthly snapshot and
+    bump the revision of the ledgers it showed on. Hooked as a signal (not
+    Transaction.delete) so queryset deletes, such as the INVOICE wipe in
+    sync_invoice_transaction, are covered too.
+    """
+    loaded = getattr(instance, "_loaded_ledger_fields", None) or {
+        name: getattr(instance, name) for name in Transaction.LEDGER_FIELDS
+    }
+    job_client_id = None
+    if loaded["job_id"]:
+        job_client_id = Job.objects.filter(pk=loaded["job_id"]).values_list("client_id", flat=True).first()
+    ClientBalanceSnapshot.remove_effects(Transaction.effects_of(
+        loaded["trans_type"], loaded["amount"], loaded["date"], loaded["client_id"], job_client_id,
+    ))
+    Client.touch(client_ids=[instance.client_id], job_ids=[instance.job_id])
+
+
+@receiver(pre_delete, sender=Job)
+def remove_job_transactions_from_balance_snapshot(sender, instance, **kwargs):
+    """
+    A deleted job's transactions are kept with job set to NULL, so they
+    drop off the job's client's ledger unless they are that client's own.
+    Runs before the delete, while the rows still point at the job.
+    """
+    ClientBalanceSnapshot.move_job(instance.pk, instance.client_id, None)
+    Client.touch(client_ids=[instance.client_id])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# REFERENCE DATA CACHE
+# Bump the api/refcache.py versions for whatever list a write can change.
+# ─────────────────────────────────────────────────────────────────────────────
+
+@receiver([post_save, post_delete], sender=ChargeType)
+def invalidate_charge_types(sender, **kwargs):
+    refcache.invalidate("chargetypes")
+
+
+@receiver([post_save, post_delete], sender=Party)
+def invalidate_parties(sender, **kwargs):
+    refcache.invalidate("parties")
+
+
+@receiver([post_save, post_delete], sender=Client)
+def invalidate_clients(sender, **kwargs):
+    refcache.invalidate("clients", "clients_from_jobs")
+
+
+@receiver(post_save, sender=Job)
+def invalidate_clients_from_jobs_on_save(sender, instance, created, **kwargs):
+    """Only a new job or a change of client can move a client in or out of the list."""
+    if created or getattr(instance, "_loaded_client_id", instance.client_id) != instance.client_id:
+        refcache.invalidate("clients_from_jobs")
+
 
-    total_amount = job.get_total_amount()
-
-    transaction = Transaction.objects.filter(
-        job=job,
-        trans_type="INVOICE",
-    ).first()
-
-    if transaction:
-        transaction.amount = total_amount
-        transaction.save()
-    elif total_amount > 0:
-        # Transaction went missing — recreate it
-        Transaction.objects.create(
-            job=job,
-            trans_type="INVOICE",
-            amount=total_amount,
-            description=f"Job #{job.id} - Invoiced Charges",
-            date=timezone.now().date(),
-            client=job.client,
-            party_name=job.client.name if job.client else "",
-        )
+@receiver(post_delete, sender=Job)
+def invalidate_clients_from_jobs_on_delete(sender, **kwargs):
+    refcache.invalidate("clients_from_jobs")
@@ -0,0 +1,1458 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import audit, refcache
+from .invoicing import invoice_sync_stats, mark_invoice_dirty
+from .models import (
+    AuditLog, ChargeType, Client, ClientBalanceSnapshot, Container, InvoiceItem, Job, Party, Transaction,
+    VoucherSequence,
+)
+
+
+# Audit entries are written on commit instead of from the background thread,
+# which would otherwise race the test database teardown
+@override_settings(AUDIT_LOG_ASYNC=False)
+class ApiTestCase(TestCase):
+    def setUp(self):
+        # The reference lists outlive a test's rolled-back rows otherwise
+        cache.clear()
+        refcache.clear_local()
+        self.user = User.objects.create(username='tester')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def make_client(self, name):
+        return Client.objects.create(name=name, address='Muscat')
+
+    def make_job(self, client):
+        return Job.objects.create(client=client, port_loading='Sohar', port_discharge='Jebel Ali')
+
+
+class DashboardStatsTests(ApiTestCase):
+    def add_rows(self, count):
+        client = self.make_client(f'Client {Client.objects.count() + 1}')
+        for n in range(count):
+            job = self.make_job(client)
+            Transaction.objects.create(
+                trans_type='CR', amount=Decimal('1.000'), date=date(2023, 1 + n % 12, 1), client=client, job=job,
+            )
+
+    def stats(self):
+        response = self.api.get('/api/dashboard/stats/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_figures(self):
+        acme, beta = self.make_client('Acme'), self.make_client('Beta')
+        sea = self.make_job(acme)
+        air = Job.objects.create(client=beta, transport_mode='AIR', port_loading='Muscat', port_discharge='Doha')
+        Job.objects.create(client=acme, is_finished=True, port_loading='Sohar', port_discharge='Dammam')
+        for trans_type, amount, day in (('CR', '100.000', date(2024, 1, 5)), ('BP', '40.000', date(2024, 1, 9)),
+                                        ('BR', '10.000', date(2024, 2, 1)), ('INVOICE', '500.000', date(2024, 2, 3))):
+            Transaction.objects.create(trans_type=trans_type, amount=Decimal(amount), date=day, client=acme, job=sea)
+
+        stats = self.stats()
+        self.assertEqual((stats['total_jobs'], stats['active_jobs'], stats['finished_jobs']), (3, 2, 1))
+        self.assertEqual(stats['total_clients'], 2)
+        # INVOICE debits are neither money received nor paid out
+        self.assertEqual(stats['total_received'], Decimal('110.000'))
+        self.assertEqual(stats['total_paid'], Decimal('40.000'))
+        self.assertEqual(stats['net_balance'], Decimal('70.000'))
+        self.assertEqual(
+            [(row['month'], row['credits'], row['debits']) for row in stats['monthly']],
+            [('2024-01', Decimal('100.000'), Decimal('40.000')), ('2024-02', Decimal('10.000'), Decimal('0.000'))],
+        )
+        self.assertEqual(stats['transport_modes'], [{'name': 'AIR', 'value': 1}, {'name': 'SEA', 'value': 2}])
+        self.assertEqual([row['id'] for row in stats['recent_jobs']][1], air.id)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_rows(2)
+        with CaptureQueriesContext(connection) as captured:
+            self.stats()
+
+        self.add_rows(24)
+        with self.assertNumQueries(len(captured)):
+            stats = self.stats()
+        self.assertEqual(stats['total_jobs'], 26)
+        self.assertEqual(len(stats['monthly']), 12)
+
+
+class LedgerRunningBalanceTests(ApiTestCase):
+    def ledger(self, client, **params):
+        response = self.api.get('/api/reports/ledger/', {'client_id': client.pk, **params})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_running_balance_in_statement_order(self):
+        acme = self.make_client('Acme')
+        job = self.make_job(acme)
+        # created out of date order; the statement orders by (date, id)
+        for trans_type, amount, day in (('CR', '250.000', date(2024, 3, 1)), ('INVOICE', '100.000', date(2024, 1, 5)),
+                                        ('BP', '40.500', date(2024, 1, 5)), ('JV', '999.000', date(2024, 2, 1))):
+            Transaction.objects.create(trans_type=trans_type, amount=Decimal(amount), date=day, job=job)
+
+        ledger = self.ledger(acme)
+        self.assertEqual(
+            [(row['date'], row['debit'], row['credit'], row['running_balance'], row['balance_type'])
+             for row in ledger['entries']],
+            [('2024-01-05', '100.000', '0.000', '100.000', 'Dr'),
+             ('2024-01-05', '40.500', '0.000', '140.500', 'Dr'),
+             ('2024-02-01', '0.000', '0.000', '140.500', 'Dr'),
+             ('2024-03-01', '0.000', '250.000', '109.500', 'Cr')],
+        )
+        self.assertEqual((ledger['total_debit'], ledger['total_credit']), ('140.500', '250.000'))
+        self.assertEqual((ledger['final_balance'], ledger['final_balance_type']), ('109.500', 'Cr'))
+
+    def test_date_range(self):
+        acme = self.make_client('Acme')
+        for day in (date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)):
+            Transaction.objects.create(trans_type='CP', amount=Decimal('10.000'), date=day, client=acme)
+
+        ledger = self.ledger(acme, start_date='2024-02-01', end_date='2024-02-29')
+        self.assertEqual([row['date'] for row in ledger['entries']], ['2024-02-01'])
+
+    def test_unknown_or_missing_client(self):
+        self.assertEqual(self.api.get('/api/reports/ledger/').status_code, 400)
+        self.assertEqual(self.api.get('/api/reports/ledger/', {'client_id': 999}).status_code, 404)
+
+
+class BalanceSnapshotTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = self.make_client('Acme')
+        self.job = self.make_job(self.acme)
+
+    def add(self, trans_type, amount, day, **fields):
+        return Transaction.objects.create(
+            trans_type=trans_type, amount=Decimal(amount), date=day, **({'job': self.job} | fields),
+        )
+
+    def ledger(self, **params):
+        response = self.api.get('/api/reports/ledger/', {'client_id': self.acme.pk, **params})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def snapshots(self):
+        # months whose rows all moved away may keep an empty row
+        rows = ClientBalanceSnapshot.objects.exclude(debit=0, credit=0)
+        return sorted(rows.values_list('client_id', 'month', 'debit', 'credit'))
+
+    def test_opening_balance_carries_earlier_months_forward(self):
+        self.add('INVOICE', '500.000', date(2023, 11, 30))
+        self.add('CR', '120.000', date(2024, 1, 2))
+        self.add('BP', '15.000', date(2024, 1, 14))
+        self.add('CR', '50.000', date(2024, 1, 15))
+
+        ledger = self.ledger(start_date='2024-01-15')
+        # earlier months from the snapshots plus 2 and 14 January from the rows
+        self.assertEqual((ledger['opening_balance'], ledger['opening_balance_type']), ('395.000', 'Dr'))
+        self.assertEqual([row['running_balance'] for row in ledger['entries']], ['345.000'])
+        self.assertEqual(ledger['final_balance'], self.ledger()['final_balance'])
+
+    def test_writes_keep_the_snapshots_in_step_with_a_rebuild(self):
+        receipt = self.add('CR', '100.000', date(2024, 1, 10))
+        payment = self.add('CP', '30.000', date(2024, 2, 5))
+        receipt.amount = Decimal('80.000')
+        receipt.date = date(2024, 3, 1)
+        receipt.save()
+        payment.delete()
+        self.add('BP', '7.250', date(2024, 3, 9), client=self.acme, job=None)
+
+        maintained = self.snapshots()
+        call_command('rebuild_balance_snapshots', stdout=StringIO())
+        self.assertEqual(maintained, self.snapshots())
+        self.assertEqual(
+            maintained,
+            [(self.acme.pk, date(2024, 3, 1), Decimal('7.250'), Decimal('80.000'))],
+        )
+
+    def test_bad_start_date(self):
+        response = self.api.get('/api/reports/ledger/', {'client_id': self.acme.pk, 'start_date': '2024-13-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class LedgerOpeningBalanceTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = self.make_client('Acme')
+        self.beta = self.make_client('Beta')
+        self.job = self.make_job(self.acme)
+        # Acme's by its client, and shown to whoever the job's client is
+        Transaction.objects.create(trans_type='CR', amount=Decimal('100.000'), date=date(2024, 1, 10), job=self.job)
+        Transaction.objects.create(trans_type='CP', amount=Decimal('30.000'), date=date(2024, 1, 20), client=self.beta)
+
+    def ledger(self, client, **params):
+        response = self.api.get('/api/reports/ledger/', {'client_id': client.pk, **params})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def assertOpeningMatchesFullLedger(self, client, expected):
+        full = self.ledger(client)
+        bounded = self.ledger(client, start_date='2024-02-01')
+        self.assertEqual((full['final_balance'], full['final_balance_type']), expected)
+        self.assertEqual((bounded['opening_balance'], bounded['opening_balance_type']), expected)
+
+    def snapshots(self):
+        return sorted(ClientBalanceSnapshot.objects.values_list('client_id', 'month', 'debit', 'credit'))
+
+    def assertSnapshotsMatchRebuild(self):
+        maintained = self.snapshots()
+        ClientBalanceSnapshot.rebuild()
+        self.assertEqual(maintained, self.snapshots())
+
+    def test_job_moved_to_another_client(self):
+        response = self.api.patch(
+            f'/api/jobs/{self.job.pk}/', {'client': {'name': 'Beta', 'address': 'Sur'}}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertOpeningMatchesFullLedger(self.beta, ('70.000', 'Cr'))
+        self.assertOpeningMatchesFullLedger(self.acme, ('100.000', 'Cr'))
+        self.assertSnapshotsMatchRebuild()
+
+    def test_job_moved_then_deleted(self):
+        self.api.patch(f'/api/jobs/{self.job.pk}/', {'client': {'name': 'Beta', 'address': 'Sur'}}, format='json')
+        self.api.delete(f'/api/jobs/{self.job.pk}/')
+
+        self.assertOpeningMatchesFullLedger(self.beta, ('30.000', 'Dr'))
+        self.assertOpeningMatchesFullLedger(self.acme, ('100.000', 'Cr'))
+        self.assertSnapshotsMatchRebuild()
+
+
+class VoucherSequenceTests(ApiTestCase):
+    def add(self, trans_type, **fields):
+        return Transaction.objects.create(trans_type=trans_type, amount=Decimal('1.000'), date=date(2024, 1, 1), **fields)
+
+    def test_numbering_continues_from_existing_vouchers(self):
+        self.add('CR', voucher_no='CR-041')
+        self.add('CR', voucher_no='CR-007')
+        self.add('CP', voucher_no='CP-002')
+
+        self.assertEqual(self.add('CR').voucher_no, 'CR-042')
+        self.assertEqual(self.add('CR').voucher_no, 'CR-043')
+        self.assertEqual(self.add('CP').voucher_no, 'CP-003')
+        self.assertEqual(self.add('INVOICE').voucher_no, 'INV-001')
+
+    def test_allocate_reserves_a_block(self):
+        self.assertEqual(VoucherSequence.allocate('BR', 50), 1)
+        self.assertEqual(self.add('BR').voucher_no, 'BR-051')
+
+    def test_failed_save_does_not_use_a_number(self):
+        self.add('CR')
+        with self.assertRaises(IntegrityError):
+            Transaction.objects.create(trans_type='CR', amount=None, date=date(2024, 1, 1))
+        self.assertEqual(self.add('CR').voucher_no, 'CR-002')
+
+    def test_allocation_cost_does_not_grow_with_the_table(self):
+        self.add('CR')
+        with CaptureQueriesContext(connection) as captured:
+            self.add('CR')
+
+        VoucherSequence.allocate('CR', 200)
+        with self.assertNumQueries(len(captured)):
+            self.add('CR')
+
+
+class TransactionListQueryTests(ApiTestCase):
+    def add_transactions(self, count):
+        # A client and a job of their own per row, so any per-row lookup of
+        # client, job or job.client shows up as extra queries
+        for n in range(count):
+            client = self.make_client(f'Client {Client.objects.count() + 1}')
+            job = self.make_job(self.make_client(f'Job client {Job.objects.count() + 1}'))
+            Transaction.objects.create(
+                trans_type='CR' if n % 2 else 'INVOICE',
+                amount=Decimal('10.000'),
+                date=date(2024, 1, 1 + n % 28),
+                client=client if n % 3 else None,
+                job=job,
+            )
+
+    def list_transactions(self, expected_rows):
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/transactions/', {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), expected_rows)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_transactions(3)
+        self.list_transactions(3)
+
+        self.add_transactions(30)
+        self.list_transactions(33)
+
+
+class ListFilterTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = self.make_client('Acme')
+        self.beta = self.make_client('Beta')
+        self.job = self.make_job(self.acme)
+        for trans_type, amount, day, client in (('CR', '10.000', date(2024, 1, 5), self.acme),
+                                                ('BR', '20.000', date(2024, 2, 5), self.acme),
+                                                ('CP', '30.000', date(2024, 3, 5), self.beta)):
+            Transaction.objects.create(trans_type=trans_type, amount=Decimal(amount), date=day, client=client)
+
+    def results(self, url, params):
+        response = self.api.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def amounts(self, **params):
+        return [row['amount'] for row in self.results('/api/transactions/', params)]
+
+    def test_transactions(self):
+        self.assertEqual(self.amounts(client=self.acme.pk), ['20.000', '10.000'])
+        self.assertEqual(self.amounts(trans_type='cr, cp'), ['30.000', '10.000'])
+        self.assertEqual(self.amounts(date_from='2024-02-01', date_to='2024-02-29'), ['20.000'])
+        self.assertEqual(self.amounts(party_name='beta '), ['30.000'])
+
+    def test_jobs_and_clients(self):
+        self.make_job(self.beta)
+        self.assertEqual([row['id'] for row in self.results('/api/jobs/', {'client': self.acme.pk})], [self.job.pk])
+        self.assertEqual([row['name'] for row in self.results('/api/clients/', {'name': 'ET'})], ['Beta'])
+
+    def test_page_size(self):
+        page = self.api.get('/api/transactions/', {'page_size': 2}).data
+        self.assertEqual(len(page['results']), 2)
+        self.assertIsNotNone(page['next'])
+
+    def test_malformed_filters(self):
+        self.assertEqual(self.api.get('/api/transactions/', {'client': 'acme'}).status_code, 400)
+        self.assertEqual(self.api.get('/api/jobs/', {'date_from': '05/01/2024'}).status_code, 400)
+
+
+class KeysetPaginationTests(ApiTestCase):
+    def walk(self, url, params, link='next'):
+        """Ids of every row, page by page, and the SQL each page ran."""
+        ids, sql = [], []
+        response = None
+        while url:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.api.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            page = [row['id'] for row in response.data['results']]
+            # Pages keep the list order whichever way the walk goes
+            ids = ids + page if link == 'next' else page + ids
+            sql += [query['sql'] for query in captured]
+            url, params = response.data[link], None
+        return ids, sql, response
+
+    def test_transactions_page_through_one_busy_day(self):
+        client = self.make_client('Acme')
+        for day in (1, 2, 2, 2, 2, 2, 2, 2, 3):
+            Transaction.objects.create(trans_type='CR', amount=Decimal('1.000'), date=date(2024, 1, day), client=client)
+        expected = list(Transaction.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+        ids, sql, last_page = self.walk('/api/transactions/', {'page_size': 2})
+        self.assertEqual(ids, expected)
+        self.assertFalse([query for query in sql if 'OFFSET' in query.upper()])
+
+        # And back again from the last page
+        back, _, _ = self.walk(last_page.data['previous'], None, link='previous')
+        self.assertEqual(back, expected[:-len(last_page.data['results'])])
+
+    def test_jobs_page_through_equal_totals(self):
+        client = self.make_client('Acme')
+        for _ in range(7):
+            self.make_job(client)
+        expected = list(Job.objects.order_by('grand_total', 'id').values_list('id', flat=True))
+
+        ids, sql, _ = self.walk('/api/jobs/', {'page_size': 3, 'ordering': 'grand_total'})
+        self.assertEqual(ids, expected)
+        self.assertFalse([query for query in sql if 'OFFSET' in query.upper()])
+
+    def test_tampered_cursor_is_not_found(self):
+        response = self.api.get('/api/transactions/', {'cursor': 'cD1ub3QtYS1kYXRl'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CsvExportTests(ApiTestCase):
+    def rows(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_ledger(self):
+        acme = self.make_client('Acme')
+        job = self.make_job(acme)
+        Transaction.objects.create(trans_type='INVOICE', amount=Decimal('100.000'), date=date(2024, 1, 5), job=job,
+                                   voucher_no='INV-001', description='Freight')
+        Transaction.objects.create(trans_type='CR', amount=Decimal('60.000'), date=date(2024, 2, 5), job=job,
+                                   voucher_no='CR-001', description='Cash')
+        Transaction.objects.create(trans_type='CR', amount=Decimal('70.000'), date=date(2024, 3, 5), job=job,
+                                   voucher_no='CR-002', description='Cash')
+
+        rows = self.rows(self.api.get(
+            '/api/reports/ledger/', {'client_id': acme.pk, 'start_date': '2024-02-01', 'export': 'csv'},
+        ))
+        self.assertEqual(rows[0], ['Account', 'Acme'])
+        self.assertEqual(rows[2], ['', '', 'Balance B/d', '', '', '100.000', 'Dr'])
+        self.assertEqual(rows[3:5], [
+            ['2024-02-05', 'CR-001', 'Cash', '0.000', '60.000', '40.000', 'Dr'],
+            ['2024-03-05', 'CR-002', 'Cash', '0.000', '70.000', '30.000', 'Cr'],
+        ])
+        self.assertEqual(rows[-1], ['', '', 'CLOSING BALANCE', '', '', '30.000', 'Cr'])
+
+    def test_bad_dates_fail_before_streaming(self):
+        acme = self.make_client('Acme')
+        response = self.api.get('/api/reports/ledger/', {'client_id': acme.pk, 'end_date': 'soon', 'export': 'csv'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_transactions_follow_the_list_filters(self):
+        acme, beta = self.make_client('Acme'), self.make_client('Beta')
+        Transaction.objects.create(trans_type='CP', amount=Decimal('5.000'), date=date(2024, 1, 1), client=acme,
+                                   voucher_no='CP-001')
+        Transaction.objects.create(trans_type='CP', amount=Decimal('9.000'), date=date(2024, 1, 2), client=beta,
+                                   voucher_no='CP-002', party_name='')
+
+        rows = self.rows(self.api.get('/api/transactions/export/', {'client': beta.pk}))
+        self.assertEqual(rows, [
+            ['Date', 'Voucher No', 'Type', 'Party', 'Job', 'Description', 'Amount', 'Bank', 'Cheque No'],
+            ['2024-01-02', 'CP-002', 'CP', 'Beta', '', '', '9.000', '', ''],
+        ])
+
+
+class InvoiceItemsEndpointTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.freight = ChargeType.objects.create(name='Freight')
+        self.customs = ChargeType.objects.create(name='Customs')
+        self.job = self.make_job(self.make_client('Acme'))
+        self.kept, self.edited, self.dropped = (
+            InvoiceItem.objects.create(job=self.job, charge_type=self.freight, amount=Decimal(amount))
+            for amount in ('10.000', '20.000', '30.000')
+        )
+        self.job.is_invoiced = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.job.save()
+
+    def put(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.put(f'/api/jobs/{self.job.id}/invoice-items/', payload, format='json')
+
+    def test_diffs_against_the_saved_items(self):
+        response = self.put([
+            {'id': self.kept.id, 'charge_type': self.freight.id, 'amount': '10.000'},
+            {'id': self.edited.id, 'charge_type': self.customs.id, 'amount': '25.000', 'vat': '1.250'},
+            {'charge_type': self.customs.id, 'amount': '5.000', 'description': 'Inspection'},
+        ])
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            [(row['charge_type'], row['amount'], row['total']) for row in response.data],
+            [(self.freight.id, '10.000', '10.000'), (self.customs.id, '25.000', '26.250'),
+             (self.customs.id, '5.000', '5.000')],
+        )
+        self.assertEqual(response.data[1]['id'], self.edited.id)
+        self.assertFalse(InvoiceItem.objects.filter(pk=self.dropped.pk).exists())
+        self.assertEqual(Transaction.objects.get(job=self.job, trans_type='INVOICE').amount, Decimal('41.250'))
+
+    def test_items_of_another_job_are_rejected(self):
+        other = InvoiceItem.objects.create(job=self.make_job(self.job.client), charge_type=self.freight,
+                                           amount=Decimal('1.000'))
+        response = self.put([{'id': other.id, 'charge_type': self.freight.id, 'amount': '1.000'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.job.invoice_items.count(), 3)
+
+    def test_unknown_charge_type_is_rejected(self):
+        response = self.put([{'charge_type': 999, 'amount': '1.000'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.job.invoice_items.count(), 3)
+
+
+class BulkInvoiceItemsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.charge_type = ChargeType.objects.create(name='Freight')
+
+    def invoiced_job(self, item_count):
+        job = self.make_job(self.make_client(f'Client {Client.objects.count() + 1}'))
+        for _ in range(item_count):
+            InvoiceItem.objects.create(
+                job=job, charge_type=self.charge_type, amount=Decimal('10.000'), vat=Decimal('0.500'),
+            )
+        job.is_invoiced = True
+        with self.captureOnCommitCallbacks(execute=True):
+            job.save()
+        return job
+
+    def keep_first_item(self, job):
+        first = job.invoice_items.order_by('id').first()
+        payload = [{'id': first.id, 'charge_type': self.charge_type.id, 'amount': '10.000', 'vat': '0.500'}]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.put(f'/api/jobs/{job.id}/invoice-items/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_count_does_not_grow_with_deleted_items(self):
+        small = self.invoiced_job(3)
+        with CaptureQueriesContext(connection) as captured:
+            self.keep_first_item(small)
+
+        large = self.invoiced_job(34)
+        with self.assertNumQueries(len(captured)):
+            self.keep_first_item(large)
+
+        for job in (small, large):
+            job.refresh_from_db()
+            self.assertEqual(job.grand_total, Decimal('10.500'))
+            self.assertEqual(job.invoice_items.count(), 1)
+            self.assertEqual(
+                Transaction.objects.get(job=job, trans_type='INVOICE').amount, Decimal('10.500'),
+            )
+
+    def test_item_writes_after_a_bulk_edit_still_move_the_totals(self):
+        job = self.invoiced_job(3)
+        self.keep_first_item(job)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post('/api/invoice-items/', {
+                'job': job.id, 'charge_type': self.charge_type.id, 'amount': '20.000', 'vat': '1.000',
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.api.delete(f'/api/invoice-items/{job.invoice_items.order_by("id").first().id}/')
+
+        job.refresh_from_db()
+        self.assertEqual(job.grand_total, Decimal('21.000'))
+        self.assertEqual(Transaction.objects.get(job=job, trans_type='INVOICE').amount, Decimal('21.000'))
+
+
+class InvoiceCoalescingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.charge_type = ChargeType.objects.create(name='Freight')
+
+    def add_items(self, job, count):
+        stats = invoice_sync_stats()
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            for _ in range(count):
+                InvoiceItem.objects.create(job=job, charge_type=self.charge_type, amount=Decimal('10.000'))
+        after = invoice_sync_stats()
+        return {key: after[key] - stats[key] for key in after}
+
+    def test_item_writes_in_one_transaction_recompute_once(self):
+        job = self.make_job(self.make_client('Acme'))
+        job.is_invoiced = True
+        job.save()
+
+        moved = self.add_items(job, 5)
+        self.assertEqual((moved['requested'], moved['recomputed'], moved['collapsed']), (5, 1, 4))
+        self.assertEqual(Transaction.objects.get(job=job, trans_type='INVOICE').amount, Decimal('50.000'))
+
+    def test_jobs_not_invoiced_are_skipped(self):
+        job = self.make_job(self.make_client('Acme'))
+
+        moved = self.add_items(job, 3)
+        self.assertEqual((moved['recomputed'], moved['skipped']), (0, 1))
+        self.assertFalse(Transaction.objects.filter(job=job, trans_type='INVOICE').exists())
+
+    def test_api_item_write_recomputes_once(self):
+        job = self.make_job(self.make_client('Acme'))
+        stats = invoice_sync_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post('/api/invoice-items/', {
+                'job': job.id, 'charge_type': self.charge_type.id, 'amount': '12.000',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(invoice_sync_stats()['recomputed'] - stats['recomputed'], 1)
+        # API writes sync whether or not the job is invoiced yet
+        self.assertEqual(Transaction.objects.get(job=job, trans_type='INVOICE').amount, Decimal('12.000'))
+
+
+class InvoiceSyncTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.charge_type = ChargeType.objects.create(name='Freight')
+        self.job = self.make_job(self.make_client('Acme'))
+
+    def add_invoice(self, amount):
+        return Transaction.objects.create(
+            trans_type='INVOICE', amount=Decimal(amount), date=date(2024, 1, 1), job=self.job,
+        )
+
+    def post_item(self):
+        return self.api.post('/api/invoice-items/', {
+            'job': self.job.id, 'charge_type': self.charge_type.id, 'amount': '10.000', 'vat': '0.500',
+        }, format='json')
+
+    def test_failed_recompute_rolls_the_item_write_back(self):
+        # Two INVOICE rows for one job, e.g. one moved over from another job
+        self.add_invoice('1.000')
+        self.add_invoice('2.000')
+
+        with self.assertRaises(Transaction.MultipleObjectsReturned):
+            self.post_item()
+
+        self.assertFalse(self.job.invoice_items.exists())
+        self.assertEqual(Job.objects.get(pk=self.job.pk).grand_total, Decimal('0.000'))
+
+    def test_failed_recompute_after_commit_is_logged(self):
+        self.job.is_invoiced = True
+        self.job.save()
+        self.add_invoice('1.000')
+        self.add_invoice('2.000')
+
+        with self.assertLogs('api.invoicing', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            InvoiceItem.objects.create(job=self.job, charge_type=self.charge_type, amount=Decimal('10.000'))
+
+        self.assertEqual(self.job.invoice_items.count(), 1)
+
+    def test_rolled_back_mark_does_not_leak(self):
+        # An unconditional mark for a job that isn't invoiced, rolled back
+        try:
+            with transaction.atomic():
+                mark_invoice_dirty(self.job.id)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        # The item signal's own mark only recomputes invoiced jobs
+        with self.captureOnCommitCallbacks(execute=True):
+            InvoiceItem.objects.create(job=self.job, charge_type=self.charge_type, amount=Decimal('10.000'))
+
+        self.assertFalse(Transaction.objects.filter(job=self.job, trans_type='INVOICE').exists())
+
+    def test_job_save_without_items_keeps_the_invoice(self):
+        self.job.is_invoiced = True
+        self.job.save()
+        invoice = self.add_invoice('50.000')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.patch(f'/api/jobs/{self.job.pk}/', {'port_loading': 'Duqm'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertTrue(Transaction.objects.filter(pk=invoice.pk).exists())
+
+    def test_removing_the_last_item_removes_the_invoice(self):
+        self.job.is_invoiced = True
+        self.job.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            item_id = self.post_item().data['id']
+        self.assertTrue(Transaction.objects.filter(job=self.job, trans_type='INVOICE').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.delete(f'/api/invoice-items/{item_id}/')
+
+        self.assertFalse(Transaction.objects.filter(job=self.job, trans_type='INVOICE').exists())
+
+
+class JobTotalsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.charge_type = ChargeType.objects.create(name='Freight')
+        self.acme = self.make_client('Acme')
+        self.job = self.make_job(self.acme)
+
+    def add_item(self, job, amount, vat='0.000'):
+        return InvoiceItem.objects.create(job=job, charge_type=self.charge_type, amount=Decimal(amount),
+                                          vat=Decimal(vat))
+
+    def totals(self, job):
+        return Job.objects.values_list(*Job.TOTAL_FIELDS).get(pk=job.pk)
+
+    def test_item_writes_move_the_totals(self):
+        stale = Job.objects.get(pk=self.job.pk)
+        first = self.add_item(self.job, '100.000', '5.000')
+        second = self.add_item(self.job, '50.000')
+        second.amount = Decimal('40.000')
+        second.save()
+        other = self.make_job(self.acme)
+        first.job = other
+        first.save()
+
+        self.assertEqual(self.totals(self.job), (Decimal('40.000'), Decimal('0.000'), Decimal('40.000')))
+        self.assertEqual(self.totals(other), (Decimal('100.000'), Decimal('5.000'), Decimal('105.000')))
+
+        # A job loaded before the items changed does not write its totals back
+        stale.is_finished = True
+        stale.save()
+        self.assertEqual(self.totals(self.job)[2], Decimal('40.000'))
+
+        InvoiceItem.objects.filter(job=other).delete()
+        self.assertEqual(self.totals(other), (Decimal('0.000'), Decimal('0.000'), Decimal('0.000')))
+
+    def test_job_list_filters_and_sorts_by_total(self):
+        self.add_item(self.job, '100.000')
+        small = self.make_job(self.acme)
+        self.add_item(small, '10.000')
+        self.make_job(self.acme)
+
+        response = self.api.get('/api/jobs/', {'min_total': '5', 'ordering': 'grand_total'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [small.pk, self.job.pk])
+        self.assertEqual(self.api.get('/api/jobs/', {'max_total': 'lots'}).status_code, 400)
+
+    def test_verify_job_totals_repairs_drift(self):
+        self.add_item(self.job, '100.000', '5.000')
+        Job.objects.filter(pk=self.job.pk).update(grand_total=Decimal('1.000'))
+
+        out = StringIO()
+        call_command('verify_job_totals', stdout=out)
+        self.assertIn(f'Job #{self.job.pk}', out.getvalue())
+        self.assertEqual(self.totals(self.job)[2], Decimal('1.000'))
+
+        call_command('verify_job_totals', '--fix', stdout=StringIO())
+        self.assertEqual(self.totals(self.job), (Decimal('100.000'), Decimal('5.000'), Decimal('105.000')))
+
+
+class MaintainedTotalsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_obj = self.make_client('Acme')
+        self.job = self.make_job(self.client_obj)
+        self.charge_type = ChargeType.objects.create(name='Freight')
+
+    def grand_total(self):
+        return Job.objects.values_list('grand_total', flat=True).get(pk=self.job.pk)
+
+    def snapshot(self):
+        return ClientBalanceSnapshot.objects.values_list('debit', 'credit').get(client=self.client_obj)
+
+    def test_copied_item_adds_to_job_totals(self):
+        item = InvoiceItem.objects.create(
+            job=self.job, charge_type=self.charge_type, amount=Decimal('100.000'), vat=Decimal('5.000'),
+        )
+        item = InvoiceItem.objects.get(pk=item.pk)
+        item.pk = None
+        item.save()
+
+        self.assertEqual(self.grand_total(), Decimal('210.000'))
+
+    def test_stale_item_instances_update_from_stored_row(self):
+        item = InvoiceItem.objects.create(
+            job=self.job, charge_type=self.charge_type, amount=Decimal('100.000'), vat=Decimal('5.000'),
+        )
+        first = InvoiceItem.objects.get(pk=item.pk)
+        second = InvoiceItem.objects.get(pk=item.pk)
+        first.amount = Decimal('200.000')
+        first.save()
+        second.amount = Decimal('300.000')
+        second.save()
+
+        self.assertEqual(self.grand_total(), Decimal('305.000'))
+
+    def test_copied_transaction_adds_to_snapshot(self):
+        txn = Transaction.objects.create(
+            trans_type='CR', amount=Decimal('40.000'), date=date(2024, 3, 5), client=self.client_obj,
+        )
+        txn = Transaction.objects.get(pk=txn.pk)
+        txn.pk = None
+        txn.voucher_no = None
+        txn.save()
+
+        self.assertEqual(self.snapshot(), (Decimal('0.000'), Decimal('80.000')))
+
+
+class JobSummaryTests(ApiTestCase):
+    def summary(self, job):
+        response = self.api.get(f'/api/jobs/{job.pk}/summary/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_money_position(self):
+        job = self.make_job(self.make_client('Acme'))
+        InvoiceItem.objects.create(job=job, charge_type=ChargeType.objects.create(name='Freight'),
+                                   amount=Decimal('200.000'), vat=Decimal('10.000'))
+        for trans_type, amount in (('INVOICE', '210.000'), ('CR', '50.000'), ('BR', '25.000'), ('CP', '15.000')):
+            Transaction.objects.create(trans_type=trans_type, amount=Decimal(amount), date=date(2024, 1, 1), job=job)
+
+        summary = self.summary(job)
+        self.assertEqual(
+            {key: summary[key] for key in ('grand_total', 'invoiced', 'received', 'paid', 'outstanding', 'balance_due')},
+            {'grand_total': Decimal('210.000'), 'invoiced': Decimal('210.000'), 'received': Decimal('75.000'),
+             'paid': Decimal('15.000'), 'outstanding': Decimal('150.000'), 'balance_due': Decimal('135.000')},
+        )
+
+    def test_query_count_does_not_grow_with_transactions(self):
+        job = self.make_job(self.make_client('Acme'))
+        Transaction.objects.create(trans_type='CR', amount=Decimal('1.000'), date=date(2024, 1, 1), job=job)
+        with CaptureQueriesContext(connection) as captured:
+            self.summary(job)
+
+        for _ in range(20):
+            Transaction.objects.create(trans_type='CR', amount=Decimal('1.000'), date=date(2024, 1, 1), job=job)
+        with self.assertNumQueries(len(captured)):
+            self.assertEqual(self.summary(job)['received'], Decimal('21.000'))
+
+
+class AgingBucketTests(ApiTestCase):
+    def aging(self, **params):
+        response = self.api.get('/api/reports/aging/', {'as_of': '2024-06-30', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def add(self, client, trans_type, amount, day):
+        Transaction.objects.create(trans_type=trans_type, amount=Decimal(amount), date=day, client=client)
+
+    def test_receipts_clear_the_oldest_invoices_first(self):
+        acme, beta = self.make_client('Acme'), self.make_client('Beta')
+        self.add(acme, 'INVOICE', '100.000', date(2024, 2, 1))   # 150 days
+        self.add(acme, 'INVOICE', '80.000', date(2024, 4, 20))   # 71 days
+        self.add(acme, 'INVOICE', '60.000', date(2024, 6, 15))   # 15 days
+        self.add(acme, 'CR', '120.000', date(2024, 6, 20))
+        self.add(acme, 'INVOICE', '999.000', date(2024, 7, 1))   # after as_of
+        self.add(beta, 'INVOICE', '10.000', date(2024, 5, 15))   # 46 days
+        self.add(beta, 'BR', '25.000', date(2024, 5, 20))
+
+        aging = self.aging()
+        self.assertEqual([row['client_name'] for row in aging['clients']], ['Acme', 'Beta'])
+        acme_row, beta_row = aging['clients']
+        self.assertEqual(
+            [acme_row[key] for key in ('0_30', '31_60', '61_90', '90_plus', 'total', 'unapplied_credit')],
+            ['60.000', '0.000', '60.000', '0.000', '120.000', '0.000'],
+        )
+        self.assertEqual((beta_row['total'], beta_row['unapplied_credit']), ('0.000', '15.000'))
+        self.assertEqual((aging['totals']['total'], aging['totals']['unapplied_credit']), ('120.000', '15.000'))
+
+        self.assertEqual([row['client_name'] for row in self.aging(client_id=beta.pk)['clients']], ['Beta'])
+
+    def test_query_count_does_not_grow_with_clients(self):
+        for n in range(2):
+            self.add(self.make_client(f'Client {n}'), 'INVOICE', '10.000', date(2024, 1, 1))
+        with CaptureQueriesContext(connection) as captured:
+            self.aging()
+
+        for n in range(2, 20):
+            self.add(self.make_client(f'Client {n}'), 'INVOICE', '10.000', date(2024, 1, 1))
+        with self.assertNumQueries(len(captured)):
+            self.assertEqual(len(self.aging()['clients']), 20)
+
+
+class ReceivablesAgingTests(ApiTestCase):
+    def test_aging_nets_to_the_ledger_balance(self):
+        acme = self.make_client('Acme')
+        beta = self.make_client('Beta')
+        job = self.make_job(acme)
+        # Acme's through the job only; a payment made for Acme; and a receipt
+        # from Beta against Acme's job, which shows on both ledgers
+        Transaction.objects.create(trans_type='INVOICE', amount=Decimal('100.000'), date=date(2024, 1, 5), job=job)
+        Transaction.objects.create(trans_type='CP', amount=Decimal('20.000'), date=date(2024, 6, 10), client=acme)
+        Transaction.objects.create(
+            trans_type='CR', amount=Decimal('30.000'), date=date(2024, 3, 5), client=beta, job=job,
+        )
+
+        response = self.api.get('/api/reports/aging/', {'as_of': '2024-06-30'})
+        self.assertEqual(response.status_code, 200)
+        aging = {row['client_id']: row for row in response.data['clients']}
+
+        for client, expected in ((acme, Decimal('90.000')), (beta, Decimal('-30.000'))):
+            ledger = self.api.get('/api/reports/ledger/', {'client_id': client.pk, 'end_date': '2024-06-30'})
+            ledger = json.loads(b''.join(ledger.streaming_content))
+            closing = Decimal(ledger['final_balance'])
+            if ledger['final_balance_type'] == 'Cr':
+                closing = -closing
+
+            row = aging[client.pk]
+            self.assertEqual(closing, expected)
+            self.assertEqual(Decimal(row['total']) - Decimal(row['unapplied_credit']), closing)
+
+        # FIFO: the receipt goes against Acme's oldest debit first
+        self.assertEqual(aging[acme.pk]['90_plus'], '70.000')
+        self.assertEqual(aging[acme.pk]['0_30'], '20.000')
+
+
+class AccountStatementTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = self.make_client('Acme')
+        beta = self.make_client('Beta')
+        for trans_type, amount, day, client in (('CR', '100.000', date(2024, 1, 5), self.acme),
+                                                ('BP', '30.000', date(2024, 1, 20), self.acme),
+                                                ('INVOICE', '70.000', date(2024, 2, 2), self.acme),
+                                                ('BR', '25.500', date(2024, 3, 9), self.acme),
+                                                ('CP', '8.000', date(2024, 3, 9), beta)):
+            Transaction.objects.create(trans_type=trans_type, amount=Decimal(amount), date=day, client=client)
+
+    def statement(self, **params):
+        response = self.api.get('/api/reports/statement/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_totals(self):
+        statement = self.statement()
+        self.assertEqual(
+            (statement['total_received'], statement['total_paid'], statement['total_invoiced'],
+             statement['net_balance']),
+            (Decimal('125.500'), Decimal('38.000'), Decimal('70.000'), Decimal('87.500')),
+        )
+        self.assertEqual(self.statement(client=self.acme.pk, date_from='2024-02-01')['net_balance'],
+                         Decimal('25.500'))
+
+    def test_grouped_by_month(self):
+        periods = self.statement(group_by='month', party_name='acme')['periods']
+        self.assertEqual(
+            [(row['period'], row['received'], row['paid'], row['invoiced'], row['net']) for row in periods],
+            [('2024-01-01', Decimal('100.000'), Decimal('30.000'), Decimal('0.000'), Decimal('70.000')),
+             ('2024-02-01', Decimal('0.000'), Decimal('0.000'), Decimal('70.000'), Decimal('0.000')),
+             ('2024-03-01', Decimal('25.500'), Decimal('0.000'), Decimal('0.000'), Decimal('25.500'))],
+        )
+
+    def test_unknown_grouping(self):
+        self.assertEqual(self.api.get('/api/reports/statement/', {'group_by': 'hour'}).status_code, 400)
+
+
+class ReferenceListCacheTests(ApiTestCase):
+    def get(self, url, etag=None):
+        response = self.api.get(url, headers={'If-None-Match': etag} if etag else None)
+        self.assertIn(response.status_code, (200, 304))
+        return response
+
+    def test_warm_list_runs_no_queries(self):
+        ChargeType.objects.create(name='Freight')
+        self.get('/api/chargetypes/')
+        with self.assertNumQueries(0):
+            response = self.get('/api/chargetypes/')
+        self.assertEqual([row['name'] for row in response.data], ['Freight'])
+
+    def test_writes_show_once_committed(self):
+        self.get('/api/chargetypes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post('/api/chargetypes/', {'name': 'Customs'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row['name'] for row in self.get('/api/chargetypes/').data], ['Customs'])
+
+    def test_clients_from_jobs_follows_new_jobs(self):
+        acme, beta = self.make_client('Acme'), self.make_client('Beta')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_job(acme)
+        self.assertEqual([row['name'] for row in self.get('/api/clients-from-jobs/').data], ['Acme'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_job(beta)
+        self.assertEqual([row['name'] for row in self.get('/api/clients-from-jobs/').data], ['Acme', 'Beta'])
+
+    def test_matching_etag_gets_not_modified(self):
+        etag = self.get('/api/chargetypes/')['ETag']
+        response = self.get('/api/chargetypes/', etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get('/api/chargetypes/', '"stale"').status_code, 200)
+
+
+class ReferenceCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.charge_type = ChargeType.objects.create(name='Freight')
+
+    def names(self):
+        response = self.api.get('/api/chargetypes/')
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data]
+
+    @override_settings(REFERENCE_CACHE_TIMEOUT=300)
+    def test_write_missed_by_this_worker_shows_after_timeout(self):
+        self.assertEqual(self.names(), ['Freight'])
+
+        # A queryset update fires no signal — as if another worker, with
+        # its own per-process cache, had made the change
+        ChargeType.objects.filter(pk=self.charge_type.pk).update(name='Customs')
+        self.assertEqual(self.names(), ['Freight'])
+
+        later = time.time() + 301
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(self.names(), ['Customs'])
+
+
+class ConditionalGetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = self.make_client('Acme')
+        self.job = self.make_job(self.acme)
+        self.charge_type = ChargeType.objects.create(name='Freight')
+
+    def etag(self, url, params=None):
+        return self.api.get(url, params)['ETag']
+
+    def revalidate(self, url, etag, params=None):
+        return self.api.get(url, params, headers={'If-None-Match': etag}).status_code
+
+    def test_job_detail(self):
+        url = f'/api/jobs/{self.job.pk}/'
+        etag = self.etag(url)
+        self.assertEqual(self.revalidate(url, etag), 304)
+
+        InvoiceItem.objects.create(job=self.job, charge_type=self.charge_type, amount=Decimal('1.000'))
+        self.assertEqual(self.revalidate(url, etag), 200)
+
+    def test_item_list(self):
+        item = InvoiceItem.objects.create(job=self.job, charge_type=self.charge_type, amount=Decimal('1.000'))
+        params = {'job': self.job.pk}
+        etag = self.etag('/api/invoice-items/', params)
+        self.assertEqual(self.revalidate('/api/invoice-items/', etag, params), 304)
+
+        # A description-only edit leaves the totals alone but still counts
+        item.description = 'Sea freight'
+        item.save()
+        self.assertEqual(self.revalidate('/api/invoice-items/', etag, params), 200)
+
+    def test_ledger(self):
+        params = {'client_id': self.acme.pk, 'start_date': '2024-01-01'}
+        etag = self.etag('/api/reports/ledger/', params)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate('/api/reports/ledger/', etag, params), 304)
+
+        # On the ledger through the job only
+        Transaction.objects.create(trans_type='CR', amount=Decimal('5.000'), date=date(2024, 2, 1), job=self.job)
+        self.assertEqual(self.revalidate('/api/reports/ledger/', etag, params), 200)
+
+    def test_ledger_etag_depends_on_the_query(self):
+        etag = self.etag('/api/reports/ledger/', {'client_id': self.acme.pk})
+        status_code = self.revalidate('/api/reports/ledger/', etag, {'client_id': self.acme.pk, 'export': 'csv'})
+        self.assertEqual(status_code, 200)
+
+
+class ClientLookupTests(ApiTestCase):
+    def lookup(self, **params):
+        response = self.api.get('/api/clients-from-jobs/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_all_clients_until_there_are_jobs(self):
+        acme, _ = self.make_client('Acme'), self.make_client('Beta')
+        self.assertEqual([row['name'] for row in self.lookup()], ['Acme', 'Beta'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_job(acme)
+        with self.assertNumQueries(1):
+            clients = self.lookup()
+        self.assertEqual(clients, [{'id': acme.pk, 'name': 'Acme', 'vat_number': None}])
+
+    def test_typeahead(self):
+        for name in ('Al Noor', 'Alpha', 'Beta Alpine', 'alto'):
+            self.make_job(self.make_client(name))
+
+        self.assertEqual([row['name'] for row in self.lookup(q='al')], ['Al Noor', 'Alpha', 'alto'])
+        self.assertEqual([row['name'] for row in self.lookup(q='al', limit=2)], ['Al Noor', 'Alpha'])
+        self.assertEqual(self.api.get('/api/clients-from-jobs/', {'limit': '0'}).status_code, 400)
+
+
+class SearchTests(ApiTestCase):
+    def search(self, **params):
+        response = self.api.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_exact_then_prefix_then_substring(self):
+        for name in ('Gulf Star Trading', 'Star', 'Starline', 'North Star'):
+            self.make_client(name)
+        Party.objects.create(name='star shipping')
+
+        results = self.search(q='star', types='clients,parties')
+        self.assertEqual([row['label'] for row in results['clients']],
+                         ['Star', 'Starline', 'North Star', 'Gulf Star Trading'])
+        self.assertEqual([row['label'] for row in results['parties']], ['star shipping'])
+        self.assertNotIn('jobs', results)
+
+    def test_jobs_by_number_or_container(self):
+        acme = self.make_client('Acme')
+        by_invoice = self.make_job(acme)
+        by_invoice.invoice_no = 'MSK-1001'
+        by_invoice.save()
+        by_container = self.make_job(acme)
+        Container.objects.create(job=by_container, number='MSKU1001', seal='S1', size='40')
+
+        jobs = self.search(q='msk', types='jobs')['jobs']
+        self.assertEqual(
+            [(row['id'], row['matched_field'], row['matched_value']) for row in jobs],
+            [(by_invoice.pk, 'Invoice no', 'MSK-1001'), (by_container.pk, 'Container', 'MSKU1001')],
+        )
+
+    def test_limit_and_bad_parameters(self):
+        for n in range(5):
+            self.make_client(f'Acme {n}')
+        self.assertEqual(len(self.search(q='acme', limit=3)['clients']), 3)
+        self.assertEqual(self.api.get('/api/search/', {'q': ' '}).status_code, 400)
+        self.assertEqual(self.api.get('/api/search/', {'q': 'a', 'types': 'vessels'}).status_code, 400)
+
+
+class AuditLogTests(ApiTestCase):
+    def create_job(self):
+        client = self.make_client('Acme')
+        return self.api.post('/api/jobs/', {
+            'client': {'name': client.name, 'address': client.address},
+            'job_date': '2024-01-01', 'port_loading': 'Sohar', 'port_discharge': 'Jebel Ali',
+        }, format='json')
+
+    def test_entry_is_written_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create_job()
+        self.assertEqual(response.status_code, 201)
+
+        entry = AuditLog.objects.get()
+        self.assertEqual((entry.user_name, entry.entity_type, entry.entity_id), ('tester', 'job', response.data['id']))
+        self.assertEqual(entry.diff['port_loading'], 'Sohar')
+
+    def test_rolled_back_write_leaves_no_entry(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                audit.record('tester', 'Created something')
+                Transaction.objects.create(trans_type='CR', amount=None, date=date(2024, 1, 1))
+        self.assertEqual(callbacks, [])
+
+    @override_settings(AUDIT_LOG_ASYNC=True)
+    def test_queued_entries_are_written_in_one_batch(self):
+        with mock.patch('api.audit._ensure_worker'), self.captureOnCommitCallbacks(execute=True):
+            for n in range(5):
+                audit.record('tester', f'Action {n}')
+        self.assertFalse(AuditLog.objects.exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(audit.flush(), 5)
+        self.assertEqual(AuditLog.objects.count(), 5)
+
+    def test_failed_batch_is_spooled_and_replayed(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'audit_spool.jsonl')
+
+        with override_settings(AUDIT_LOG_SPOOL_PATH=path), \
+                mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('api.audit', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            audit.record('tester', 'Spooled action')
+        self.assertFalse(AuditLog.objects.exists())
+
+        call_command('replay_audit_spool', path=path, stdout=StringIO())
+        self.assertEqual(list(AuditLog.objects.values_list('action', flat=True)), ['Spooled action'])
+        self.assertFalse(os.path.exists(path))
+
+
+class ReplayAuditSpoolTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'audit_spool.jsonl')
+
+    def write(self, path, *actions):
+        with open(path, 'a', encoding='utf-8') as spool:
+            for action in actions:
+                spool.write(json.dumps({
+                    'user_name': 'tester', 'action': action, 'timestamp': '2024-01-01T10:00:00+00:00',
+                    'entity_type': '', 'entity_id': None, 'diff': None,
+                }) + '\n')
+
+    def replay(self):
+        call_command('replay_audit_spool', path=self.path, stdout=StringIO())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(f'{self.path}.replaying'))
+        return sorted(AuditLog.objects.values_list('action', flat=True))
+
+    def test_interrupted_replay_is_not_overwritten_by_new_spool(self):
+        self.write(f'{self.path}.replaying', 'left over 1', 'left over 2')
+        self.write(self.path, 'new')
+
+        self.assertEqual(self.replay(), ['left over 1', 'left over 2', 'new'])
+
+    def test_interrupted_replay_without_new_spool(self):
+        self.write(f'{self.path}.replaying', 'left over')
+
+        self.assertEqual(self.replay(), ['left over'])
+
+
+class AuditLogHistoryTests(ApiTestCase):
+    def log(self, action, when, **fields):
+        return AuditLog.objects.create(user_name='tester', action=action, timestamp=when, **fields)
+
+    def test_recent_and_filters(self):
+        now = timezone.now()
+        for n in range(5):
+            self.log(f'Action {n}', now - timedelta(minutes=n), entity_type='job', entity_id=n % 2 + 1)
+        self.log('Late on the 9th', timezone.make_aware(datetime(2024, 3, 9, 23, 59)))
+
+        response = self.api.get('/api/audit-logs/recent/', {'limit': 2})
+        self.assertEqual([row['action'] for row in response.data], ['Action 0', 'Action 1'])
+
+        response = self.api.get('/api/audit-logs/', {'entity_type': 'job', 'entity_id': 2})
+        self.assertEqual([row['action'] for row in response.data['results']], ['Action 1', 'Action 3'])
+
+        response = self.api.get('/api/audit-logs/', {'date_from': '2024-03-09', 'date_to': '2024-03-09'})
+        self.assertEqual([row['action'] for row in response.data['results']], ['Late on the 9th'])
+
+    def test_archive_moves_old_entries_to_monthly_files(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log('Kept', timezone.now())
+        for day in (3, 17):
+            self.log(f'January {day}', timezone.make_aware(datetime(2023, 1, day, 12)))
+
+        call_command('archive_audit_logs', days=30, dir=directory.name, dry_run=True, stdout=StringIO())
+        self.assertEqual(AuditLog.objects.count(), 3)
+
+        call_command('archive_audit_logs', days=30, dir=directory.name, batch_size=1, stdout=StringIO())
+        self.assertEqual(list(AuditLog.objects.values_list('action', flat=True)), ['Kept'])
+        with gzip.open(os.path.join(directory.name, 'audit-2023-01.jsonl.gz'), 'rt') as archive:
+            self.assertEqual([json.loads(line)['action'] for line in archive], ['January 3', 'January 17'])
+
+
+class TransactionImportTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = self.make_client('Acme')
+        Transaction.objects.create(trans_type='BR', amount=Decimal('1.000'), date=date(2024, 1, 1), voucher_no='BR-009')
+
+    def upload(self, text, **flags):
+        upload = SimpleUploadedFile('statement.csv', text.encode(), content_type='text/csv')
+        return self.api.post('/api/transactions/import/', {'file': upload, **flags}, format='multipart')
+
+    def test_bank_statement_layout(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(
+                'Date,Description,Debit,Credit,Client ID\n'
+                f'2024-02-01,Transfer in,,"1,200.500",{self.acme.pk}\n'
+                f'2024-02-03,Charges,15.000,,{self.acme.pk}\n'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['rows'], response.data['imported']), (2, 2))
+
+        imported = Transaction.objects.filter(date__month=2).order_by('date')
+        self.assertEqual(
+            [(txn.trans_type, txn.amount, txn.voucher_no, txn.party_name) for txn in imported],
+            [('BR', Decimal('1200.500'), 'BR-010', 'Acme'), ('BP', Decimal('15.000'), 'BP-001', 'Acme')],
+        )
+        self.assertEqual(
+            list(ClientBalanceSnapshot.objects.filter(client=self.acme).values_list('month', 'debit', 'credit')),
+            [(date(2024, 2, 1), Decimal('15.000'), Decimal('1200.500'))],
+        )
+        self.assertEqual(AuditLog.objects.filter(action__startswith='Imported 2 transactions').count(), 1)
+
+    def test_invalid_rows(self):
+        text = 'date,amount,type\n2024-02-01,10.000,CR\n2024-02-02,5.000,INVOICE\n2024-02-31,5.000,CP\n'
+
+        response = self.upload(text)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4])
+        self.assertFalse(Transaction.objects.filter(date__month=2).exists())
+
+        self.assertEqual(self.upload(text, dry_run='true', skip_invalid='true').data['valid'], 1)
+        self.assertFalse(Transaction.objects.filter(date__month=2).exists())
+
+        self.assertEqual(self.upload(text, skip_invalid='true').data['imported'], 1)
+        self.assertEqual(Transaction.objects.filter(date__month=2).count(), 1)
+
+    def test_missing_columns(self):
+        self.assertEqual(self.upload('amount,type\n10,CR\n').status_code, 400)
+
+    def test_command(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'statement.csv')
+        with open(path, 'w', encoding='utf-8') as statement:
+            statement.write(f'date,amount,type,client\n2024-03-01,40.000,CP,{self.acme.pk}\n')
+
+        call_command('import_transactions', path, stdout=StringIO())
+        self.assertEqual(Transaction.objects.get(date=date(2024, 3, 1)).voucher_no, 'CP-001')
+
+
+class FixTransactionsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = self.make_client('Acme')
+        job = self.make_job(self.acme)
+        for n, party_name in enumerate(('', '', 'Walk-in', '', '')):
+            Transaction.objects.create(trans_type='CR', amount=Decimal('10.000'), date=date(2024, 1, 1 + n),
+                                       job=job, party_name=party_name)
+        # Rows saved before Transaction.save() filled these in
+        Transaction.objects.update(client=None)
+        Transaction.objects.filter(party_name='Acme').update(party_name='')
+        ClientBalanceSnapshot.rebuild()
+
+    def snapshots(self):
+        rows = ClientBalanceSnapshot.objects.exclude(debit=0, credit=0)
+        return sorted(rows.values_list('client_id', 'month', 'debit', 'credit'))
+
+    def test_links_job_clients_in_batches(self):
+        call_command('fix_transactions', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('client_id', 'party_name')),
+            [(self.acme.pk, 'Acme')] * 4 + [(self.acme.pk, 'Walk-in')],
+        )
+        maintained = self.snapshots()
+        ClientBalanceSnapshot.rebuild()
+        self.assertEqual(maintained, self.snapshots())
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command('fix_transactions', dry_run=True, stdout=out)
+        self.assertIn('5 transactions with job but no client', out.getvalue())
+        self.assertFalse(Transaction.objects.filter(client__isnull=False).exists())
+
+
+class ReconcileInvoiceLedgerTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.charge_type = ChargeType.objects.create(name='Freight')
+        self.acme = self.make_client('Acme')
+
+    def job_with_items(self, *amounts):
+        job = self.make_job(self.acme)
+        for amount in amounts:
+            InvoiceItem.objects.create(job=job, charge_type=self.charge_type, amount=Decimal(amount))
+        # Flagged without the save signal, as rows written before the sync existed
+        Job.objects.filter(pk=job.pk).update(is_invoiced=True)
+        return job
+
+    def invoice(self, job, amount):
+        return Transaction.objects.create(trans_type='INVOICE', amount=Decimal(amount), date=date(2024, 1, 1), job=job)
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_invoice_ledger', *args, stdout=out)
+        return out.getvalue()
+
+    def snapshots(self):
+        rows = ClientBalanceSnapshot.objects.exclude(debit=0, credit=0)
+        return sorted(rows.values_list('client_id', 'month', 'debit', 'credit'))
+
+    def test_reports_and_repairs_every_kind_of_drift(self):
+        correct = self.job_with_items('10.000')
+        self.invoice(correct, '10.000')
+        drifted = self.job_with_items('20.000')
+        self.invoice(drifted, '25.000')
+        duplicated = self.job_with_items('30.000')
+        self.invoice(duplicated, '30.000')
+        self.invoice(duplicated, '30.000')
+        stale = self.make_job(self.acme)
+        self.invoice(stale, '40.000')
+        missing = self.job_with_items('50.000')
+
+        report = self.reconcile()
+        for job, problem in ((drifted, 'drift'), (duplicated, 'duplicate'), (stale, 'stale'), (missing, 'missing')):
+            self.assertIn(f'Job #{job.pk}: {problem}', report)
+        self.assertNotIn(f'Job #{correct.pk}:', report)
+
+        self.reconcile('--fix')
+        self.assertIn('matches its invoice items', self.reconcile())
+        self.assertEqual(
+            dict(Transaction.objects.filter(trans_type='INVOICE').values_list('job_id', 'amount')),
+            {correct.pk: Decimal('10.000'), drifted.pk: Decimal('20.000'), duplicated.pk: Decimal('30.000'),
+             missing.pk: Decimal('50.000')},
+        )
+        maintained = self.snapshots()
+        ClientBalanceSnapshot.rebuild()
+        self.assertEqual(maintained, self.snapshots())
+
+    def test_orphans_are_only_deleted_when_asked(self):
+        self.invoice(self.job_with_items('10.000'), '10.000').job.delete()
+        self.assertIn('1 INVOICE transaction(s) belong to deleted jobs', self.reconcile())
+
+        self.reconcile('--fix')
+        self.assertEqual(Transaction.objects.filter(job__isnull=True).count(), 1)
+        self.reconcile('--fix', '--delete-orphans')
+        self.assertFalse(Transaction.objects.filter(trans_type='INVOICE').exists())
+
+
+@override_settings(DEBUG=True)
+class GenerateLoadDataTests(ApiTestCase):
+    def generate(self, seed=1):
+        call_command(
+            'generate_load_data', transactions=200, clients=5, jobs=30, years=1, seed=seed, batch_size=50,
+            stdout=StringIO(),
+        )
+        return list(Transaction.objects.order_by('voucher_no').values_list('voucher_no', 'trans_type', 'amount'))
+
+    def test_dataset_is_consistent_and_reproducible(self):
+        with transaction.atomic():
+            first = self.generate()
+            transaction.set_rollback(True)
+        self.assertEqual(self.generate(), first)
+
+        self.assertEqual(Job.objects.count(), 30)
+        self.assertEqual(Transaction.objects.count(), 200)
+        for command, clean in (('verify_job_totals', 'All job totals match'),
+                               ('reconcile_invoice_ledger', 'matches its invoice items')):
+            out = StringIO()
+            call_command(command, stdout=out)
+            self.assertIn(clean, out.getvalue())
+
+    @override_settings(DEBUG=False)
+    def test_refuses_without_debug(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_load_data', transactions=1, clients=1, jobs=1, stdout=StringIO())
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(DEBUG=True)
+class BenchmarkApiTests(ApiTestCase):
+    def benchmark(self, *args):
+        call_command('benchmark_api', '--iterations', '2', '--warmup', '0', *args, stdout=StringIO())
+
+    def test_results_and_data_left_unchanged(self):
+        call_command('generate_load_data', transactions=100, clients=4, jobs=10, years=1, stdout=StringIO())
+        items = sorted(InvoiceItem.objects.values_list('id', 'amount', 'vat'))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'benchmark.json')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.benchmark('--output', path)
+        with open(path, encoding='utf-8') as results:
+            report = json.load(results)
+        self.assertIn('transactions_list', report['results'])
+        self.assertTrue(all(row['queries'] > 0 for row in report['results'].values()))
+
+        self.assertEqual(sorted(InvoiceItem.objects.values_list('id', 'amount', 'vat')), items)
+        for command, clean in (('verify_job_totals', 'All job totals match'),
+                               ('reconcile_invoice_ledger', 'matches its invoice items')):
+            out = StringIO()
+            call_command(command, stdout=out)
+            self.assertIn(clean, out.getvalue())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.benchmark('--only', 'dashboard_stats', '--compare', path)
+
+    def test_needs_data(self):
+        with self.assertRaises(CommandError):
+            self.benchmark()
+
+
+class RequestMetricsTests(ApiTestCase):
+    def test_server_timing_header(self):
+        self.make_job(self.make_client('Acme'))
+        response = self.api.get('/api/jobs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries, \d+ repeated"$')
+
+    def test_metrics_endpoint(self):
+        self.api.get('/api/jobs/')
+        response = self.api.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE logistics_http_requests_total counter', body)
+        self.assertIn('logistics_http_requests_total{view="job-list",method="GET",status="200"}', body)
+        self.assertIn('logistics_http_request_duration_seconds_bucket{view="job-list",method="GET",le="+Inf"}', body)
+        self.assertIn('logistics_invoice_sync_total{outcome="recomputed"}', body)
+
+        self.api.force_authenticate(user=None)
+        self.assertIn(self.api.get('/api/metrics/').status_code, (401, 403))
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0, REQUEST_METRICS_DUPLICATE_THRESHOLD=1)
+    def test_repeated_statements_logged_as_warning(self):
+        with self.assertLogs('api.metrics', level='WARNING') as logs:
+            self.api.get('/api/jobs/')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['view'], 'job-list')
+        self.assertIn('repeated_sql', entry)
+        self.assertNotIn('slow', entry)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_not_logged(self):
+        with self.assertNoLogs('api.metrics', level='INFO'):
+            self.api.get('/api/jobs/')
@@ -1,52 +1,479 @@
+import csv
+import hashlib
+import heapq
+import io
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.db.models import (
+    Case, Count, DateField, DecimalField, Exists, F, OuterRef, Q, Sum, Value, When, Window,
+)
+from django.db.models.functions import Coalesce, Trunc, TruncMonth
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
-from .models import Client, Job, Transaction, InvoiceItem, ChargeType, AuditLog, Quotation, Receipt, Party
+from .models import (
+    Client, Job, Transaction, InvoiceItem, ChargeType, AuditLog, Quotation, Receipt, Party,
+    ClientBalanceSnapshot,
+)
+from .pagination import (
+    DateCursorPagination, IdCursorPagination, JobCursorPagination, TimestampCursorPagination,
+)
 from .serializers import (
     ClientSerializer, JobSerializer, TransactionSerializer, 
     InvoiceItemSerializer, ChargeTypeSerializer, AuditLogSerializer,
-    QuotationSerializer, ReceiptSerializer, PartySerializer
+    QuotationSerializer, ReceiptSerializer, PartySerializer, InvoiceItemBulkSerializer,
 )
+from . import audit
+from .importing import ImportFormatError, import_transactions, read_csv
+from .invoicing import mark_invoice_dirty, syncing_invoices
+from .metrics import render_prometheus
+from .search import SEARCH_TYPES, search
+from .refcache import (
+    CachedListMixin, cached_response, conditional_response, current_version, etag_matches,
+)
+
+# Typed zero for Coalesce() around Sum() of the 3dp money columns
+ZERO = Value(Decimal('0.000'), output_field=DecimalField(max_digits=20, decimal_places=3))
+THREE_DP = Decimal('0.001')
+
+
+def _date_param(request, name):
+    """Parses an optional YYYY-MM-DD query param, 400 on anything else."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if not parsed:
+        raise ValidationError({name: "Must be a date in YYYY-MM-DD format."})
+    return parsed
+
+
+def _int_param(request, name):
+    """Parses an optional integer (id) query param, 400 on anything else."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Must be an integer id."})
+
+
+def _decimal_param(request, name):
+    """Parses an optional decimal amount query param, 400 on anything else."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = Decimal(value)
+    except InvalidOperation:
+        parsed = None
+    if parsed is None or not parsed.is_finite():
+        raise ValidationError({name: "Must be a number."})
+    return parsed
+
+
+def _start_of_day(day):
+    """Aware datetime for midnight at the start of `day` in the current timezone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _stream_transactions_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([
+        "Date", "Voucher No", "Type", "Party", "Job", "Description",
+        "Amount", "Bank", "Cheque No",
+    ])
+    for (txn_date, voucher_no, trans_type, party_name, client_name, job_client_name,
+         job_id, description, amount, bank_name, cheque_no) in rows:
+        yield writer.writerow([
+            txn_date.isoformat() if txn_date else "",
+            voucher_no or "",
+            trans_type,
+            # Same fallback order as TransactionSerializer.get_display_party_name
+            party_name or client_name or job_client_name or "General Transaction",
+            job_id or "",
+            description,
+            amount,
+            bank_name or "",
+            cheque_no or "",
+        ])
+
 
 # --- 1. AUDIT LOG (Read Only) ---
+AUDIT_RECENT_DEFAULT_LIMIT = 15
+AUDIT_RECENT_MAX_LIMIT = 100
+
+
 class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = AuditLog.objects.all().order_by('-timestamp')
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        """
+        Optional filters: ?user_name=, ?entity_type=, ?entity_id=,
+        ?date_from=, ?date_to= (YYYY-MM-DD)
+        """
+        qs = super().get_queryset()
+        params = self.request.query_params
+
+        if params.get("user_name"):
+            qs = qs.filter(user_name=params["user_name"])
+
+        if params.get("entity_type"):
+            qs = qs.filter(entity_type=params["entity_type"])
+
+        entity_id = _int_param(self.request, "entity_id")
+        if entity_id:
+            qs = qs.filter(entity_id=entity_id)
+
+        # Plain ranges on timestamp (not timestamp__date) so the index is used
+        date_from = _date_param(self.request, "date_from")
+        if date_from:
+            qs = qs.filter(timestamp__gte=_start_of_day(date_from))
+
+        date_to = _date_param(self.request, "date_to")
+        if date_to:
+            qs = qs.filter(timestamp__lt=_start_of_day(date_to + timedelta(days=1)))
+
+        return qs
+
+    @action(detail=False)
+    def recent(self, request):
+        """
+        GET /api/audit-logs/recent/?limit=15 — the newest entries for the
+        activity feed, straight off the (timestamp, id) index.
+        """
+        limit = request.query_params.get("limit")
+        if limit:
+            if not limit.isdigit() or int(limit) < 1:
+                raise ValidationError({"limit": "Must be a positive integer."})
+            limit = min(int(limit), AUDIT_RECENT_MAX_LIMIT)
+        else:
+            limit = AUDIT_RECENT_DEFAULT_LIMIT
+
+        entries = AuditLog.objects.order_by('-timestamp', '-id')[:limit]
+        return Response(self.get_serializer(entries, many=True).data)
 
 # --- 2. CLIENTS (Restored) ---
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cache_namespace = "clients"
     queryset = Client.objects.all().order_by('-id')
     serializer_class = ClientSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        """
+        Optional filters: ?name= (case-insensitive contains)
+        """
+        qs = super().get_queryset()
+        name = self.request.query_params.get("name")
+        if name:
+            qs = qs.filter(name__icontains=name)
+        return qs
 
 # --- 3. JOBS (With User Tracking) ---
+# Field values kept in the audit entry's diff on create/delete
+JOB_AUDIT_FIELDS = ("client_id", "job_date", "transport_mode", "port_loading", "port_discharge", "invoice_no")
+TRANSACTION_AUDIT_FIELDS = ("trans_type", "amount", "date", "voucher_no", "client_id", "job_id", "description")
+
 class JobViewSet(viewsets.ModelViewSet):
-    queryset = Job.objects.all().order_by('-id')
+    queryset = Job.objects.select_related('client').order_by('-id')
     serializer_class = JobSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = JobCursorPagination
+
+    def get_queryset(self):
+        """
+        Optional filters: ?client=, ?transport_mode=, ?is_invoiced=, ?is_finished=,
+        ?date_from=, ?date_to= (on job_date), ?min_total=, ?max_total= (on
+        grand_total). ?ordering=grand_total / -grand_total sorts by total.
+        """
+        qs = super().get_queryset()
+        params = self.request.query_params
+
+        client_id = _int_param(self.request, "client")
+        if client_id:
+            qs = qs.filter(client_id=client_id)
+
+        if params.get("transport_mode"):
+            qs = qs.filter(transport_mode=params["transport_mode"].upper())
+
+        for flag in ("is_invoiced", "is_finished"):
+            if params.get(flag) in ("true", "false"):
+                qs = qs.filter(**{flag: params[flag] == "true"})
+
+        date_from = _date_param(self.request, "date_from")
+        if date_from:
+            qs = qs.filter(job_date__gte=date_from)
+
+        date_to = _date_param(self.request, "date_to")
+        if date_to:
+            qs = qs.filter(job_date__lte=date_to)
+
+        min_total = _decimal_param(self.request, "min_total")
+        if min_total is not None:
+            qs = qs.filter(grand_total__gte=min_total)
+
+        max_total = _decimal_param(self.request, "max_total")
+        if max_total is not None:
+            qs = qs.filter(grand_total__lte=max_total)
+
+        return qs
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Conditional GET: the ETag comes from the job's and its client's
+        revision counters, so an unchanged job is a 304 without serializing.
+        """
+        job = self.get_object()
+        etag = f'"job-{job.id}-{job.revision}-{job.client.revision}"'
+        return conditional_response(request, etag, lambda: self.get_serializer(job).data)
+
+    @action(detail=True, methods=['put'], url_path='invoice-items')
+    def invoice_items(self, request, pk=None):
+        """
+        PUT /api/jobs/{id}/invoice-items/ — replace the job's line items in one
+        request. Rows with an id are updated (only if changed), rows without
+        are created, and existing rows missing from the payload are deleted.
+        The INVOICE transaction is resynced once, inside the same transaction.
+        """
+        job = self.get_object()
+
+        serializer = InvoiceItemBulkSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        with syncing_invoices(), InvoiceItem.totals_set_outright(job.id):
+            # Lock the job first: a single-item write for it waits on this
+            # row in Job.adjust_totals, so it can't land between reading the
+            # items here and setting the totals below
+            job = Job.objects.select_for_update().get(pk=job.id)
+            existing = {item.id: item for item in job.invoice_items.select_for_update()}
+
+            unknown = {row["id"] for row in serializer.validated_data if "id" in row} - existing.keys()
+            if unknown:
+                raise ValidationError({"id": f"Items {sorted(unknown)} do not belong to job #{job.id}."})
+
+            to_create, to_update, keep = [], [], set()
+            for row in serializer.validated_data:
+                amount = row.get("amount", Decimal("0.000"))
+                vat = row.get("vat", Decimal("0.000"))
+                values = {
+                    "charge_type_id": row["charge_type_id"],
+                    "description": row.get("description", ""),
+                    "amount": amount,
+                    "vat": vat,
+                    "total": amount + vat,
+                }
+
+                if "id" not in row:
+                    to_create.append(InvoiceItem(job=job, **values))
+                    continue
+
+                item = existing[row["id"]]
+                keep.add(item.id)
+                if any(getattr(item, field) != value for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(item, field, value)
+                    to_update.append(item)
+
+            removed = existing.keys() - keep
+            if removed:
+                # totals_set_outright() keeps the post_delete receivers from
+                # moving the totals and marking the invoice once per item;
+                # both happen once for the whole edit below
+                InvoiceItem.objects.filter(id__in=removed).delete()
+            if to_update:
+                InvoiceItem.objects.bulk_update(to_update, ["charge_type_id", "description", "amount", "vat", "total"])
+            if to_create:
+                InvoiceItem.objects.bulk_create(to_create)
+
+            # bulk_update/bulk_create skip InvoiceItem.save(), so set the
+            # job's totals outright — the job and its items are locked, so
+            # this is exact
+            final = [existing[item_id] for item_id in keep] + to_create
+            Job.objects.filter(pk=job.id).update(
+                subtotal=sum((item.amount for item in final), Decimal("0.000")),
+                vat_total=sum((item.vat for item in final), Decimal("0.000")),
+                grand_total=sum((item.total for item in final), Decimal("0.000")),
+                revision=F("revision") + 1,
+            )
+
+            mark_invoice_dirty(job.id)
+
+        items = job.invoice_items.select_related('charge_type').order_by('id')
+        return Response(InvoiceItemSerializer(items, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def summary(self, request, pk=None):
+        """
+        GET /api/jobs/{id}/summary/ — the job's money position: item totals,
+        what has been invoiced to the ledger, receipts and payments against
+        the job, and the outstanding balance (invoiced + paid - received).
+        One aggregate over the job's transactions (Transaction.job is indexed).
+        """
+        job = self.get_object()
+
+        money = Transaction.objects.filter(job_id=job.id).aggregate(
+            invoiced=Coalesce(Sum('amount', filter=Q(trans_type='INVOICE')), ZERO),
+            received=Coalesce(Sum('amount', filter=Q(trans_type__in=Transaction.RECEIPT_TYPES)), ZERO),
+            paid=Coalesce(Sum('amount', filter=Q(trans_type__in=Transaction.PAYMENT_TYPES)), ZERO),
+        )
+        money = {key: value.quantize(THREE_DP) for key, value in money.items()}
+
+        return Response({
+            "job": job.id,
+            "is_invoiced": job.is_invoiced,
+            "subtotal": job.subtotal,
+            "vat_total": job.vat_total,
+            "grand_total": job.grand_total,
+            "invoiced": money["invoiced"],
+            "received": money["received"],
+            "paid": money["paid"],
+            "outstanding": money["invoiced"] + money["paid"] - money["received"],
+            # What the invoice page shows as due: billed items less receipts
+            "balance_due": job.grand_total - money["received"],
+        })
 
     def perform_create(self, serializer):
-        instance = serializer.save()
+        with syncing_invoices():
+            instance = serializer.save()
         user = self.request.user.username if self.request.user else "Unknown"
-        AuditLog.objects.create(
-            user_name=user,
-            action=f"Created Job #{instance.id} for {instance.client.name}"
+        audit.record(
+            user,
+            f"Created Job #{instance.id} for {instance.client.name}",
+            entity=instance,
+            diff=audit.snapshot(instance, JOB_AUDIT_FIELDS),
         )
 
+    def perform_update(self, serializer):
+        with syncing_invoices():
+            serializer.save()
+
     def perform_destroy(self, instance):
         user = self.request.user.username if self.request.user else "Unknown"
-        AuditLog.objects.create(
-            user_name=user,
-            action=f"Deleted Job #{instance.id}"
+        audit.record(
+            user,
+            f"Deleted Job #{instance.id}",
+            entity=instance,
+            diff=audit.snapshot(instance, JOB_AUDIT_FIELDS),
         )
         instance.delete()
 
 # --- 4. TRANSACTIONS (With User Tracking) ---
 class TransactionViewSet(viewsets.ModelViewSet):
-    queryset = Transaction.objects.all().order_by('-date', '-id')
+    # client / job.client are read per row by TransactionSerializer — join them
+    queryset = Transaction.objects.select_related('client', 'job__client').order_by('-date', '-id')
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DateCursorPagination
+
+    def get_queryset(self):
+        """
+        Optional filters: ?client=, ?job=, ?party_name= (case-insensitive),
+        ?trans_type= (comma-separated, e.g. CR,BR), ?date_from=, ?date_to=
+        """
+        qs = super().get_queryset()
+        params = self.request.query_params
+
+        client_id = _int_param(self.request, "client")
+        if client_id:
+            qs = qs.filter(client_id=client_id)
+
+        job_id = _int_param(self.request, "job")
+        if job_id:
+            qs = qs.filter(job_id=job_id)
+
+        if params.get("party_name"):
+            qs = qs.filter(party_name__iexact=params["party_name"].strip())
+
+        if params.get("trans_type"):
+            qs = qs.filter(trans_type__in=[t.strip().upper() for t in params["trans_type"].split(",")])
+
+        date_from = _date_param(self.request, "date_from")
+        if date_from:
+            qs = qs.filter(date__gte=date_from)
+
+        date_to = _date_param(self.request, "date_to")
+        if date_to:
+            qs = qs.filter(date__lte=date_to)
+
+        return qs
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        GET /api/transactions/export/ — CSV of every transaction matching the
+        list filters, streamed in chunks so memory stays flat for any size.
+        """
+        rows = (
+            self.get_queryset()
+            .values_list(
+                'date', 'voucher_no', 'trans_type', 'party_name', 'client__name',
+                'job__client__name', 'job_id', 'description', 'amount',
+                'bank_name', 'cheque_no',
+            )
+            .iterator(chunk_size=2000)
+        )
+        response = StreamingHttpResponse(_stream_transactions_csv(rows), content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="transactions.csv"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_csv(self, request):
+        """
+        POST /api/transactions/import/ — multipart `file` (CSV, see
+        api/importing.py for the columns), plus optional `dry_run` and
+        `skip_invalid` flags. 200 with the import report, or 400 with it
+        when any row failed and nothing was written.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Upload a CSV file."})
+
+        flags = {
+            name: str(request.data.get(name, "")).lower() in ("1", "true", "yes", "on")
+            for name in ("dry_run", "skip_invalid")
+        }
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        try:
+            report = import_transactions(
+                read_csv(stream),
+                actor=request.user.username if request.user else "Unknown",
+                source=upload.name,
+                **flags,
+            )
+        except ImportFormatError as exc:
+            raise ValidationError({"file": str(exc)})
+        except (UnicodeDecodeError, csv.Error):
+            raise ValidationError({"file": "Could not read the file as UTF-8 CSV."})
+        finally:
+            stream.detach()
+
+        failed = report["error_count"] and not flags["skip_invalid"]
+        return Response(report, status=status.HTTP_400_BAD_REQUEST if failed else status.HTTP_200_OK)
 
     def perform_create(self, serializer):
         job = serializer.validated_data.get("job")
@@ -61,15 +488,19 @@ class TransactionViewSet(viewsets.ModelViewSet):
             client=client
         )
 
-        AuditLog.objects.create(
-            user_name=self.request.user.username if self.request.user else "Unknown",
-            action=f"Recorded {instance.trans_type} of {instance.amount} OMR"
+        audit.record(
+            self.request.user.username if self.request.user else "Unknown",
+            f"Recorded {instance.trans_type} of {instance.amount} OMR",
+            entity=instance,
+            diff=audit.snapshot(instance, TRANSACTION_AUDIT_FIELDS),
         )
 
     def perform_destroy(self, instance):
-        AuditLog.objects.create(
-            user_name=self.request.user.username if self.request.user else "Unknown",
-            action=f"Deleted transaction #{instance.id}"
+        audit.record(
+            self.request.user.username if self.request.user else "Unknown",
+            f"Deleted transaction #{instance.id}",
+            entity=instance,
+            diff=audit.snapshot(instance, TRANSACTION_AUDIT_FIELDS),
         )
         instance.delete()
 
@@ -83,47 +514,20 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
 # --- 6. STANDARD LISTS ---
-class ChargeTypeViewSet(viewsets.ModelViewSet):
+class ChargeTypeViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cache_namespace = "chargetypes"
     queryset = ChargeType.objects.all()
     serializer_class = ChargeTypeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 # ─────────────────────────────────────────────────────────────────────────────
 # INVOICE TRANSACTION SYNC
-# Called directly from InvoiceItemViewSet so an INVOICE debit is
-# created/updated the moment the frontend saves line items.
-# This bypasses the broken signal chain entirely.
+# InvoiceItemViewSet marks the job dirty (api/invoicing.py) so an INVOICE
+# debit is created/updated the moment the frontend saves line items. The
+# recompute runs once at the end of the write, however many item signals
+# fire alongside, and rolls the write back if it fails.
 # ─────────────────────────────────────────────────────────────────────────────
 
-def _sync_invoice_transaction(job):
-    from django.utils import timezone
-
-    total_amount = job.get_total_amount()
-
-    if total_amount <= 0:
-        # All items removed — wipe the debit from the ledger
-        Transaction.objects.filter(job=job, trans_type="INVOICE").delete()
-        return
-
-    transaction, created = Transaction.objects.get_or_create(
-        job=job,
-        trans_type="INVOICE",
-        defaults={
-            "amount": total_amount,
-            "description": f"Job #{job.id} - Invoiced Charges",
-            "date": timezone.now().date(),
-            "client": job.client,
-            "party_name": job.client.name if job.client else "",
-        },
-    )
-
-    if not created:
-        transaction.amount = total_amount
-        transaction.client = job.client
-        transaction.party_name = job.client.name if job.client else ""
-        transaction.save()
-
-
 # --- 6. STANDARD LISTS ---
 
 class InvoiceItemViewSet(viewsets.ModelViewSet):
@@ -154,20 +558,37 @@ class InvoiceItemViewSet(viewsets.ModelViewSet):
         if not job_id:
             return qs.none()
 
-        return qs.filter(job_id=job_id)
+        return qs.filter(job_id=job_id).select_related('charge_type')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Conditional GET for ?job=: the ETag comes from the job's revision
+        (bumped by every item write) and the charge type names' cache version.
+        """
+        job_id = request.query_params.get("job") or request.query_params.get("job_id")
+        revision = None
+        if job_id and job_id.isdigit():
+            revision = Job.objects.filter(pk=job_id).values_list("revision", flat=True).first()
+        if revision is None:
+            return super().list(request, *args, **kwargs)
+
+        etag = f'"job-items-{job_id}-{revision}-{current_version("chargetypes")}"'
+        return conditional_response(request, etag, lambda: super(InvoiceItemViewSet, self).list(request, *args, **kwargs).data)
 
     def perform_create(self, serializer):
-        instance = serializer.save()
-        _sync_invoice_transaction(instance.job)   # ✅ new item → create/update debit
+        with syncing_invoices():
+            instance = serializer.save()
+            mark_invoice_dirty(instance.job_id)   # ✅ new item → create/update debit
 
     def perform_update(self, serializer):
-        instance = serializer.save()
-        _sync_invoice_transaction(instance.job)   # ✅ edited item → update debit amount
+        with syncing_invoices():
+            instance = serializer.save()
+            mark_invoice_dirty(instance.job_id)   # ✅ edited item → update debit amount
 
     def perform_destroy(self, instance):
-        job = instance.job
-        instance.delete()
-        _sync_invoice_transaction(job)            # ✅ deleted item → recalculate debit
+        with syncing_invoices():
+            instance.delete()
+            mark_invoice_dirty(instance.job_id)   # ✅ deleted item → recalculate debit
 
 
 
@@ -182,36 +603,159 @@ class ReceiptViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
 # --- 8. PARTY VIEWSET (NEW) ---
-class PartyViewSet(viewsets.ModelViewSet):
+class PartyViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cache_namespace = "parties"
     queryset = Party.objects.all().order_by('name')
     serializer_class = PartySerializer
     permission_classes = [permissions.IsAuthenticated]
 
 # --- 7. CUSTOM FUNCTIONS (Restored) ---
 
+STATEMENT_GROUPINGS = ("day", "week", "month", "year")
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def account_statement(request):
     """
-    Returns total money in vs money out
+    Returns total money in vs money out, aggregated in the database.
+
+    Optional filters: ?client=, ?party_name= (case-insensitive), ?date_from=,
+    ?date_to=. With ?group_by=day|week|month|year the same figures are also
+    broken down per period (oldest first) under "periods".
     """
+    params = request.query_params
+    group_by = params.get("group_by")
+    if group_by and group_by not in STATEMENT_GROUPINGS:
+        raise ValidationError({"group_by": f"Must be one of: {', '.join(STATEMENT_GROUPINGS)}."})
+
     transactions = Transaction.objects.all()
-    total_in = sum(t.amount for t in transactions if t.trans_type in ['CR', 'BR'])
-    total_out = sum(t.amount for t in transactions if t.trans_type in ['CP', 'BP'])
-    return Response({
+
+    client_id = _int_param(request, "client")
+    if client_id:
+        transactions = transactions.filter(client_id=client_id)
+
+    if params.get("party_name"):
+        transactions = transactions.filter(party_name__iexact=params["party_name"])
+
+    date_from = _date_param(request, "date_from")
+    if date_from:
+        transactions = transactions.filter(date__gte=date_from)
+
+    date_to = _date_param(request, "date_to")
+    if date_to:
+        transactions = transactions.filter(date__lte=date_to)
+
+    figures = dict(
+        received=Coalesce(Sum('amount', filter=Q(trans_type__in=Transaction.RECEIPT_TYPES)), ZERO),
+        paid=Coalesce(Sum('amount', filter=Q(trans_type__in=Transaction.PAYMENT_TYPES)), ZERO),
+        invoiced=Coalesce(Sum('amount', filter=Q(trans_type='INVOICE')), ZERO),
+    )
+
+    totals = transactions.aggregate(**figures)
+    total_in = totals["received"].quantize(THREE_DP)
+    total_out = totals["paid"].quantize(THREE_DP)
+
+    data = {
         "total_received": total_in,
         "total_paid": total_out,
-        "net_balance": total_in - total_out
-    })
+        "total_invoiced": totals["invoiced"].quantize(THREE_DP),
+        "net_balance": total_in - total_out,
+    }
+
+    if group_by:
+        periods = (
+            transactions
+            .annotate(period=Trunc('date', group_by, output_field=DateField()))
+            .values('period')
+            .annotate(**figures)
+            .order_by('period')
+        )
+        data["group_by"] = group_by
+        data["periods"] = [
+            {
+                "period": row["period"].isoformat(),
+                "received": row["received"].quantize(THREE_DP),
+                "paid": row["paid"].quantize(THREE_DP),
+                "invoiced": row["invoiced"].quantize(THREE_DP),
+                "net": (row["received"] - row["paid"]).quantize(THREE_DP),
+            }
+            for row in periods
+        ]
+
+    return Response(data)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_stats(request):
-    job_count = Job.objects.count()
-    active_jobs = Job.objects.filter(is_finished=False).count()
+    """
+    Returns every KPI the dashboard shows, aggregated in the database so the
+    payload stays the same size no matter how many jobs/transactions exist.
+    """
+    receipts = Q(trans_type__in=Transaction.RECEIPT_TYPES)
+    payments = Q(trans_type__in=Transaction.PAYMENT_TYPES)
+
+    job_totals = Job.objects.aggregate(
+        total_jobs=Count('id'),
+        active_jobs=Count('id', filter=Q(is_finished=False)),
+        total_clients=Count('client', distinct=True),
+    )
+
+    money = Transaction.objects.aggregate(
+        total_received=Coalesce(Sum('amount', filter=receipts), ZERO),
+        total_paid=Coalesce(Sum('amount', filter=payments), ZERO),
+    )
+
+    # Last 12 months that have receipts or payments, oldest first
+    monthly = (
+        Transaction.objects
+        .filter(receipts | payments)
+        .annotate(month=TruncMonth('date'))
+        .values('month')
+        .annotate(
+            credits=Coalesce(Sum('amount', filter=receipts), ZERO),
+            debits=Coalesce(Sum('amount', filter=payments), ZERO),
+        )
+        .order_by('-month')[:12]
+    )
+
+    transport_modes = (
+        Job.objects
+        .values('transport_mode')
+        .annotate(count=Count('id'))
+        .order_by('transport_mode')
+    )
+
+    recent_jobs = (
+        Job.objects
+        .order_by('-id')
+        .values(
+            'id', 'job_date', 'transport_mode', 'port_loading',
+            'port_discharge', 'is_finished', client_name=F('client__name'),
+        )[:10]
+    )
+
     return Response({
-        "total_jobs": job_count,
-        "active_jobs": active_jobs
+        "total_jobs": job_totals["total_jobs"],
+        "active_jobs": job_totals["active_jobs"],
+        "finished_jobs": job_totals["total_jobs"] - job_totals["active_jobs"],
+        "total_clients": job_totals["total_clients"],
+        "total_received": money["total_received"],
+        "total_paid": money["total_paid"],
+        "net_balance": money["total_received"] - money["total_paid"],
+        "monthly": [
+            {
+                "month": row["month"].strftime("%Y-%m"),
+                "credits": row["credits"],
+                "debits": row["debits"],
+            }
+            for row in reversed(list(monthly))
+        ],
+        "transport_modes": [
+            {"name": row["transport_mode"], "value": row["count"]}
+            for row in transport_modes
+        ],
+        "recent_jobs": list(recent_jobs),
     })
 
 @api_view(['POST'])
@@ -219,37 +763,181 @@ def dashboard_stats(request):
 def scan_receipt(request):
     return Response({"message": "AI Scanner functionality placeholder"}, status=200)
 
+
+CLIENT_LOOKUP_DEFAULT_LIMIT = 20
+CLIENT_LOOKUP_MAX_LIMIT = 100
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_clients_from_jobs(request):
     """
-    Returns all unique clients from jobs for transaction dropdown
-    If no clients have jobs, returns all clients as fallback
+    Compact {id, name, vat_number} list of clients that have jobs, for the
+    transaction dropdown. If no clients have jobs, returns all clients as
+    fallback.
+
+    Optional typeahead: ?q= (case-insensitive name prefix) and ?limit=
+    (default 20 with ?q=, at most CLIENT_LOOKUP_MAX_LIMIT).
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    # Try to get clients with jobs first
-    clients_with_jobs = Client.objects.filter(jobs__isnull=False).distinct().order_by('name')
-    
-    # Fallback: if no clients have jobs, return all clients
-    if clients_with_jobs.count() == 0:
-        logger.warning("⚠️ No clients with jobs found, returning all clients as fallback")
-        clients = Client.objects.all().order_by('name')
+    query = request.query_params.get("q", "").strip()
+
+    limit = request.query_params.get("limit")
+    if limit:
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValidationError({"limit": "Must be a positive integer."})
+        limit = int(limit)
     else:
-        clients = clients_with_jobs
-    
-    serializer = ClientSerializer(clients, many=True)
-    logger.info(f"✅ Returning {len(serializer.data)} clients for transaction dropdown")
-    return Response(serializer.data)
+        limit = CLIENT_LOOKUP_DEFAULT_LIMIT if query else None
+
+    def build():
+        # One query for both cases: a client qualifies when it has a job
+        # (EXISTS on the indexed Job.client_id), or when no job exists at all
+        has_jobs = Exists(Job.objects.filter(client_id=OuterRef("pk")))
+        clients = Client.objects.filter(has_jobs | ~Exists(Job.objects.all()))
+
+        if query:
+            clients = clients.filter(name__istartswith=query)
+
+        clients = clients.order_by("name").values("id", "name", "vat_number")
+        if limit:
+            clients = clients[:min(limit, CLIENT_LOOKUP_MAX_LIMIT)]
+        return list(clients)
+
+    return cached_response(request, "clients_from_jobs", build)
+
+def _ledger_queryset(client, start_date=None, end_date=None):
+    """
+    Client ledger rows in statement order with debit/credit split and the
+    running balance computed by the database (SUM() OVER (ORDER BY date, id)).
+    """
+    money = DecimalField(max_digits=20, decimal_places=3)
+
+    transactions = Transaction.objects.filter(
+        Q(client=client) | Q(job__client=client)
+    )
+
+    if start_date:
+        transactions = transactions.filter(date__gte=start_date)
+
+    if end_date:
+        transactions = transactions.filter(date__lte=end_date)
+
+    return (
+        transactions
+        .annotate(
+            debit=Case(
+                When(trans_type__in=Transaction.LEDGER_DEBIT_TYPES, then=F('amount')),
+                default=ZERO,
+                output_field=money,
+            ),
+            credit=Case(
+                When(trans_type__in=Transaction.RECEIPT_TYPES, then=F('amount')),
+                default=ZERO,
+                output_field=money,
+            ),
+        )
+        .annotate(
+            balance=Window(
+                Sum(F('debit') - F('credit'), output_field=money),
+                order_by=[F('date').asc(), F('id').asc()],
+            ),
+        )
+        .order_by('date', 'id')
+        .values_list('id', 'date', 'voucher_no', 'description', 'debit', 'credit', 'balance')
+    )
+
+
+def _iter_ledger(rows, opening_balance, totals):
+    """
+    Yields (id, date, voucher_no, particulars, debit, credit, balance) with
+    the opening balance applied, filling `totals` in as it goes.
+    """
+    totals.update(debit=Decimal("0.000"), credit=Decimal("0.000"), balance=opening_balance)
+
+    for txn_id, txn_date, voucher_no, description, debit, credit, balance in rows:
+        # SQLite hands computed decimals back unscaled; keep the 3dp format
+        debit = debit.quantize(THREE_DP)
+        credit = credit.quantize(THREE_DP)
+        balance = (opening_balance + balance).quantize(THREE_DP)
+        totals["debit"] += debit
+        totals["credit"] += credit
+        totals["balance"] = balance
+        yield txn_id, txn_date, voucher_no, description, debit, credit, balance
+
+
+def _stream_ledger_json(client, rows, opening_balance):
+    """
+    Writes the ledger response body entry by entry so large statements are
+    never held in memory as a list. Totals are accumulated on the way through.
+    """
+    totals = {}
+
+    yield '{"client": %s, "opening_balance": "%s", "opening_balance_type": "%s", "entries": [' % (
+        json.dumps(ClientSerializer(client).data, cls=DjangoJSONEncoder),
+        abs(opening_balance),
+        "Dr" if opening_balance >= 0 else "Cr",
+    )
+
+    for i, (txn_id, txn_date, voucher_no, description, debit, credit, balance) in enumerate(
+        _iter_ledger(rows, opening_balance, totals)
+    ):
+        entry = json.dumps({
+            "id": txn_id,
+            "date": txn_date.isoformat() if txn_date else None,  # ✅ YYYY-MM-DD — JS new Date() safe
+            "voucher_no": voucher_no,
+            "particulars": description,
+            "debit": str(debit),
+            "credit": str(credit),
+            "running_balance": str(abs(balance)),
+            "balance_type": "Dr" if balance >= 0 else "Cr",
+        })
+        yield entry if i == 0 else "," + entry
+
+    yield '], %s}' % json.dumps({
+        "total_debit": str(totals["debit"]),
+        "total_credit": str(totals["credit"]),
+        "net_balance": str(totals["debit"] - totals["credit"]),
+        "final_balance": str(abs(totals["balance"])),
+        "final_balance_type": "Dr" if totals["balance"] >= 0 else "Cr",
+    })[1:-1]
+
+
+def _stream_ledger_csv(client, rows, opening_balance):
+    writer = csv.writer(_Echo())
+    totals = {}
+
+    yield writer.writerow(["Account", client.name])
+    yield writer.writerow(["Date", "Voucher No", "Particulars", "Debit", "Credit", "Balance", "Dr/Cr"])
+    yield writer.writerow([
+        "", "", "Balance B/d", "", "",
+        abs(opening_balance), "Dr" if opening_balance >= 0 else "Cr",
+    ])
+
+    for txn_id, txn_date, voucher_no, description, debit, credit, balance in _iter_ledger(rows, opening_balance, totals):
+        yield writer.writerow([
+            txn_date.isoformat() if txn_date else "",
+            voucher_no or "",
+            description,
+            debit,
+            credit,
+            abs(balance),
+            "Dr" if balance >= 0 else "Cr",
+        ])
+
+    yield writer.writerow(["", "", "TOTALS", totals["debit"], totals["credit"], "", ""])
+    yield writer.writerow([
+        "", "", "CLOSING BALANCE", "", "",
+        abs(totals["balance"]), "Dr" if totals["balance"] >= 0 else "Cr",
+    ])
+
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def ledger_statement(request):
-    from decimal import Decimal
-    from django.db.models import Q
-    from datetime import datetime
-
+    """
+    Client ledger with running balance. Streams JSON by default, or a CSV
+    download with ?export=csv.
+    """
     client_id = request.query_params.get("client_id")
     start_date = request.query_params.get("start_date")
     end_date = request.query_params.get("end_date")
@@ -262,70 +950,221 @@ def ledger_statement(request):
     except Client.DoesNotExist:
         return Response({"error": "Client not found"}, status=404)
 
-    transactions = Transaction.objects.filter(
-        Q(client=client) | Q(job__client=client)
-    ).order_by("date", "id")
+    # Validate up front — an error half way through a streamed body can't be reported
+    for name, value in (("start_date", start_date), ("end_date", end_date)):
+        try:
+            valid = not value or parse_date(value)
+        except ValueError:
+            valid = False
+        if not valid:
+            return Response({"error": f"{name} must be YYYY-MM-DD"}, status=400)
+
+    # The client's revision moves with every write to its ledger, so an
+    # unchanged statement is a 304 before any ledger rows are read
+    params = sorted(request.query_params.lists())
+    etag = '"ledger-%s-%s-%s"' % (
+        client.id, client.revision, hashlib.sha1(repr(params).encode()).hexdigest()[:16],
+    )
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
 
+    opening_balance = Decimal("0.000")
     if start_date:
-        transactions = transactions.filter(date__gte=start_date)
+        # Carried-forward balance from the monthly snapshots, not a history scan
+        opening_balance = ClientBalanceSnapshot.opening_balance(client, parse_date(start_date)).quantize(THREE_DP)
 
-    if end_date:
-        transactions = transactions.filter(date__lte=end_date)
+    rows = _ledger_queryset(client, start_date, end_date).iterator(chunk_size=2000)
 
-    running_balance = Decimal("0.000")
-    ledger_entries = []
+    if request.query_params.get("export") == "csv":
+        response = StreamingHttpResponse(
+            _stream_ledger_csv(client, rows, opening_balance),
+            content_type="text/csv",
+        )
+        response["Content-Disposition"] = f'attachment; filename="ledger-{client.id}.csv"'
+    else:
+        response = StreamingHttpResponse(
+            _stream_ledger_json(client, rows, opening_balance),
+            content_type="application/json",
+        )
 
-    for txn in transactions:
-        debit = Decimal("0.000")
-        credit = Decimal("0.000")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
-        if txn.trans_type == "INVOICE":
-            debit = txn.amount
-            running_balance += txn.amount
 
-        elif txn.trans_type in ["CR", "BR"]:
-            credit = txn.amount
-            running_balance -= txn.amount
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
 
-        elif txn.trans_type in ["CP", "BP"]:
-            debit = txn.amount
-            running_balance += txn.amount
 
-        ledger_entries.append({
-            "id": txn.id,
-            "date": txn.date.isoformat() if txn.date else None,  # ✅ YYYY-MM-DD — JS new Date() safe
-            "voucher_no": txn.voucher_no,
-            "particulars": txn.description,
-            "debit": str(debit),
-            "credit": str(credit),
-            "running_balance": str(abs(running_balance)),
-            "balance_type": "Dr" if running_balance >= 0 else "Cr",
-        })
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def search_view(request):
+    """
+    Typeahead search: GET /api/search/?q=...[&types=clients,parties,jobs][&limit=10]
+    Clients and parties match on name; jobs on transport document, invoice
+    and shipment invoice numbers and on container numbers. Each type's
+    results come back best match first (see api/search.py).
+    """
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        raise ValidationError({"q": "A search term is required."})
+
+    types = [t for t in request.query_params.get("types", "").split(",") if t] or list(SEARCH_TYPES)
+    unknown = set(types) - set(SEARCH_TYPES)
+    if unknown:
+        raise ValidationError({"types": f"Unknown types {sorted(unknown)}; use {', '.join(SEARCH_TYPES)}."})
+
+    limit = request.query_params.get("limit")
+    if limit:
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValidationError({"limit": "Must be a positive integer."})
+        limit = min(int(limit), SEARCH_MAX_LIMIT)
+    else:
+        limit = SEARCH_DEFAULT_LIMIT
+
+    return Response({"query": query, **search(query, types, limit)})
+
+
+# ==========================================
+#      RECEIVABLES AGING
+# ==========================================
+# (key, upper bound in days) — ages are counted from the invoice date
+AGING_BUCKETS = (("0_30", 30), ("31_60", 60), ("61_90", 90), ("90_plus", None))
 
-    ledger_entries.sort(key=lambda x: x["date"] or "")
 
-    running_balance = Decimal("0.000")
-    for entry in ledger_entries:
-        debit = Decimal(entry["debit"])
-        credit = Decimal(entry["credit"])
-        running_balance += debit - credit
-        entry["running_balance"] = str(abs(running_balance))
-        entry["balance_type"] = "Dr" if running_balance >= 0 else "Cr"
+def _aging_bucket(age_days):
+    for key, limit in AGING_BUCKETS:
+        if limit is None or age_days <= limit:
+            return key
 
-    total_debit = sum(Decimal(e["debit"]) for e in ledger_entries)
-    total_credit = sum(Decimal(e["credit"]) for e in ledger_entries)
+
+def _ledger_accounts(transactions):
+    """
+    `transactions` once for each client ledger they show on, annotated with
+    that client as `account`: under their own client and, when that's
+    someone else, under their job's client — the rule of _ledger_queryset
+    and Transaction.effects_of().
+    """
+    return (
+        transactions.filter(client__isnull=False).annotate(account=F("client_id")),
+        transactions
+        .filter(job__client__isnull=False)
+        .exclude(client_id=F("job__client_id"))
+        .annotate(account=F("job__client_id")),
+    )
+
+
+def _receivables_aging(as_of, client_id=None):
+    """
+    Outstanding ledger debits (invoices and payments made for the client)
+    per client, bucketed by age, with each client's CR/BR receipts applied
+    to their oldest debits first (FIFO). Rows count for the same clients as
+    on the ledger, so a client's aging nets to their ledger balance.
+
+    FIFO is worked out from totals rather than by matching receipts one by
+    one: a debit is unpaid by whatever part of the client's cumulative
+    debits (up to and including it) exceeds their total receipts. That
+    needs the receipt totals (grouped queries) and one pass over the debits
+    in (client, date, id) order, merged from the two ownership paths.
+    """
+    accounts = _ledger_accounts(Transaction.objects.filter(date__lte=as_of))
+    if client_id:
+        accounts = [transactions.filter(account=client_id) for transactions in accounts]
+
+    zero = Decimal("0.000")
+    credits = {}
+    for transactions in accounts:
+        for row in (
+            transactions
+            .filter(trans_type__in=Transaction.RECEIPT_TYPES)
+            .values("account")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        ):
+            credits[row["account"]] = credits.get(row["account"], zero) + row["total"]
+
+    debits = heapq.merge(*(
+        transactions
+        .filter(trans_type__in=Transaction.LEDGER_DEBIT_TYPES)
+        .order_by("account", "date", "id")
+        .values_list("account", "date", "id", "amount")
+        .iterator(chunk_size=2000)
+        for transactions in accounts
+    ))
+
+    clients = {}
+    for account_id, txn_date, _, amount in debits:
+        row = clients.setdefault(account_id, {key: zero for key, _ in AGING_BUCKETS})
+        invoiced_to_date = row.get("invoiced", zero) + amount
+        received = credits.get(account_id, zero)
+        unpaid = min(amount, invoiced_to_date - received)
+        row["invoiced"] = invoiced_to_date  # ends on the client's total
+        if unpaid > 0:
+            bucket = _aging_bucket((as_of - txn_date).days)
+            row[bucket] += unpaid
+
+    for account_id, received in credits.items():
+        row = clients.setdefault(account_id, {key: zero for key, _ in AGING_BUCKETS})
+        # Receipts beyond every debit sit on account as a credit
+        row["unapplied_credit"] = max(received - row.get("invoiced", zero), zero)
+
+    names = dict(Client.objects.filter(id__in=clients.keys()).values_list("id", "name"))
+
+    results = []
+    for account_id, row in clients.items():
+        row.pop("invoiced", None)
+        row.setdefault("unapplied_credit", zero)
+        row = {key: value.quantize(THREE_DP) for key, value in row.items()}
+        row["total"] = sum((row[key] for key, _ in AGING_BUCKETS), zero)
+        if row["total"] or row["unapplied_credit"]:
+            results.append({"client_id": account_id, "client_name": names.get(account_id, ""), **row})
+
+    results.sort(key=lambda row: row["client_name"].lower())
+    return results
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def receivables_aging(request):
+    """
+    Accounts-receivable aging for every client (or ?client_id=) as of
+    ?as_of=YYYY-MM-DD (default today): outstanding ledger debits in
+    0-30 / 31-60 / 61-90 / 90+ day buckets after FIFO receipt allocation.
+    """
+    as_of = _date_param(request, "as_of") or timezone.localdate()
+    client_id = _int_param(request, "client_id")
+
+    clients = _receivables_aging(as_of, client_id)
+
+    totals = {key: Decimal("0.000") for key, _ in AGING_BUCKETS}
+    totals.update(total=Decimal("0.000"), unapplied_credit=Decimal("0.000"))
+    for row in clients:
+        for key in totals:
+            totals[key] += row[key]
 
     return Response({
-        "client": ClientSerializer(client).data,
-        "entries": ledger_entries,
-        "total_debit": str(total_debit),
-        "total_credit": str(total_credit),
-        "net_balance": str(total_debit - total_credit),
-        "final_balance": str(abs(running_balance)),
-        "final_balance_type": "Dr" if running_balance >= 0 else "Cr",
+        "as_of": as_of.isoformat(),
+        "buckets": [key for key, _ in AGING_BUCKETS],
+        "clients": [
+            {key: str(value) if isinstance(value, Decimal) else value for key, value in row.items()}
+            for row in clients
+        ],
+        "totals": {key: str(value) for key, value in totals.items()},
     })
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def metrics_view(request):
+    """
+    This worker's request, query and invoice sync counters in the
+    Prometheus text format (see api/metrics.py).
+    """
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # Health check endpoint (no authentication required)
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
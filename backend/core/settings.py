@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # CORS for frontend
+    'api.metrics.RequestMetricsMiddleware',  # Server-Timing, query counts, /api/metrics/
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Serve static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -182,6 +183,52 @@ REST_FRAMEWORK = {
     ],
 }
 
+# ==========================================
+#           REFERENCE DATA CACHE
+# ==========================================
+
+# api/refcache.py caches the charge type / party / client lists. With no
+# CACHES configured Django's per-process LocMemCache is used: an edit
+# refreshes the lists at once in the worker that made it, and in the other
+# workers when their version token expires, REFERENCE_CACHE_TIMEOUT later.
+# Point this alias at a shared backend (e.g. Redis) for immediate refreshes
+# everywhere.
+REFERENCE_CACHE_ALIAS = 'default'
+REFERENCE_CACHE_LRU_SIZE = 256     # responses held in-process
+REFERENCE_CACHE_TIMEOUT = 300      # seconds; also the staleness bound across workers
+
+# ==========================================
+#           AUDIT LOG WRITER
+# ==========================================
+
+# api/audit.py queues audit entries and writes them from a background thread
+# in batches, off the request path. Batches that fail to insert go to the
+# spool file; `manage.py replay_audit_spool` loads them back.
+AUDIT_LOG_ASYNC = True
+AUDIT_LOG_FLUSH_INTERVAL = 2.0     # seconds between background flushes
+AUDIT_LOG_BATCH_SIZE = 100         # flush early once this many are queued
+AUDIT_LOG_SPOOL_PATH = os.path.join(BASE_DIR, 'audit_spool.jsonl')
+
+# `manage.py archive_audit_logs` moves older entries into monthly
+# audit-YYYY-MM.jsonl.gz files here
+AUDIT_LOG_RETENTION_DAYS = 365
+AUDIT_LOG_ARCHIVE_DIR = os.path.join(BASE_DIR, 'audit_archive')
+
+# ==========================================
+#           REQUEST METRICS
+# ==========================================
+
+# api/metrics.py times each request and its queries, sets a Server-Timing
+# header and keeps the per-view totals served at /api/metrics/. A
+# REQUEST_METRICS_SAMPLE_RATE fraction of requests are logged as JSON on
+# the "api.metrics" logger; slow requests and ones that repeat a statement
+# DUPLICATE_THRESHOLD times (an N+1) are always logged, as warnings.
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'True') == 'True'
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '0.1'))
+REQUEST_METRICS_DUPLICATE_THRESHOLD = 10
+REQUEST_METRICS_SLOW_MS = 1000
+REQUEST_METRICS_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
 # ==========================================
 #           DEFAULT PRIMARY KEY
 # ==========================================
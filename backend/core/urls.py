@@ -10,7 +10,8 @@ from api.views import (
     QuotationViewSet, AuditLogViewSet, ReceiptViewSet,
     PartyViewSet,
     account_statement, dashboard_stats, scan_receipt, health_check,
-    get_clients_from_jobs, ledger_statement  # ✅ Added ledger_statement
+    get_clients_from_jobs, ledger_statement,  # ✅ Added ledger_statement
+    receivables_aging, search_view, metrics_view,
 )
 
 
@@ -45,11 +46,16 @@ urlpatterns = [
     
     # Health Check
     path('api/health/', health_check),
+
+    # Request metrics (Prometheus text format)
+    path('api/metrics/', metrics_view),
     
     # Custom Function Routes
     path('api/reports/statement/', account_statement),
     path('api/reports/ledger/', ledger_statement),  # ✅ Added ledger endpoint
+    path('api/reports/aging/', receivables_aging),
     path('api/dashboard/stats/', dashboard_stats),
+    path('api/search/', search_view),
     path('api/ai/scan/', scan_receipt),
     
     # ✅ CRITICAL: Get clients from jobs for transaction dropdown
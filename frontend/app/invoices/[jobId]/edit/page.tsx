@@ -13,6 +13,7 @@ interface ChargeType {
   name: string;
 }
 interface InvoiceRow {
+  id?: number;
   charge_type: string;
   description: string;
   amount: number | "";
@@ -50,7 +51,6 @@ export default function EditInvoicePage() {
   const [rows, setRows] = useState<InvoiceRow[]>([EMPTY_ROW]);
   const [billNo, setBillNo] = useState("");
   const [vatNo, setVatNo] = useState("");
-  const [originalItemIds, setOriginalItemIds] = useState<number[]>([]);
   const [loading, setLoading] = useState(true);
   const [isSaving, setIsSaving] = useState(false);
 
@@ -85,16 +85,15 @@ export default function EditInvoicePage() {
         const jobItems = itemRes.data;
         if (jobItems && jobItems.length > 0) {
           setRows(jobItems.map((i: any) => ({
+            id: i.id,
             charge_type: String(i.charge_type),
             description: i.description || "",
             amount: Number(i.amount),
             vat: Number(i.vat),
             total: Number(i.total),
           })));
-          setOriginalItemIds(jobItems.map((i: any) => i.id));
         } else {
           setRows([EMPTY_ROW]);
-          setOriginalItemIds([]);
         }
       } catch (err) {
         console.error("Load error:", err);
@@ -162,26 +161,16 @@ export default function EditInvoicePage() {
       // 1. Update Job Details
       await axios.patch(`${API_BASE}/jobs/${jobId}/`, { transport_document_no: billNo, vat_number: vatNo }, authConfig);
       
-      // 2. Safe Delete (Only items belonging to THIS job)
-      const currentItemsRes = await axios.get(`${API_BASE}/invoice-items/?job=${jobId}`, authConfig);
-      const currentIds = currentItemsRes.data.map((x: any) => x.id);
-      if (currentIds.length > 0) {
-        await Promise.all(currentIds.map((id: number) => axios.delete(`${API_BASE}/invoice-items/${id}/`, authConfig)));
-      }
-
-      // 3. Create New Items
+      // 2. Save all line items in one request — rows with an id are updated,
+      //    new rows created, and rows removed here are deleted on the server
       const validRows = rows.filter((r) => r.charge_type && Number(r.amount) > 0);
-      await Promise.all(validRows.map((r) =>
-          axios.post(`${API_BASE}/invoice-items/`, {
-            job: Number(jobId),
-            charge_type: Number(r.charge_type),
-            description: r.description || "Charge",
-            amount: r.amount,
-            vat: r.vat,
-            total: r.total,
-          }, authConfig)
-        )
-      );
+      await axios.put(`${API_BASE}/jobs/${jobId}/invoice-items/`, validRows.map((r) => ({
+        ...(r.id && { id: r.id }),
+        charge_type: Number(r.charge_type),
+        description: r.description || "Charge",
+        amount: r.amount,
+        vat: r.vat,
+      })), authConfig);
       router.push(`/invoices/${jobId}/view`);
     } catch (err) {
       console.error("Save error:", err);
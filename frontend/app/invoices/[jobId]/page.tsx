@@ -12,6 +12,7 @@ const IconTrash = () => <svg className="w-5 h-5" fill="none" stroke="currentColo
 
 // --- TYPES ---
 interface InvoiceRow { 
+  id?: number;
   charge_type: string; 
   description: string; 
   amount: number | ""; 
@@ -42,7 +43,6 @@ export default function InvoiceEditor() {
 
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
-  const [originalItemIds, setOriginalItemIds] = useState<number[]>([]);
 
   // --- NEW STATE: CUSTOM HEADER POPUP ---
   const [isAddingType, setIsAddingType] = useState(false);
@@ -58,21 +58,18 @@ export default function InvoiceEditor() {
       
       try {
         const config = { headers: { Authorization: `Token ${token}` } };
-        const [jobRes, chargeRes, itemRes, transRes] = await Promise.all([
+        const [jobRes, chargeRes, itemRes, summaryRes] = await Promise.all([
           axios.get(`${API_URL}/api/jobs/${jobId}/`, config),
           axios.get(`${API_URL}/api/chargetypes/`, config),
           axios.get(`${API_URL}/api/invoice-items/?job=${jobId}`, config),
-          axios.get(`${API_URL}/api/transactions/`, config)
+          axios.get(`${API_URL}/api/jobs/${jobId}/summary/`, config)
         ]);
 
         const jobData = jobRes.data;
         setJob(jobData);
         setChargeTypes(chargeRes.data);
 
-        const paid = transRes.data
-            .filter((t:any) => t.job === Number(jobId) && ['CR','BR'].includes(t.trans_type))
-            .reduce((sum:number, t:any) => sum + Number(t.amount), 0);
-        setCredits(paid);
+        setCredits(Number(summaryRes.data.received));
 
         setCustomInvoiceNo(jobData.invoice_no || `INV-${new Date().getFullYear()}-${String(jobId).padStart(3, '0')}`);
         setBlNo(jobData.transport_document_no || "");
@@ -105,6 +102,7 @@ export default function InvoiceEditor() {
 
         if (itemRes.data && itemRes.data.length > 0) {
             setRows(itemRes.data.map((i: any) => ({
+                id: i.id,
                 charge_type: String(i.charge_type),
                 description: i.description,
                 amount: Number(i.amount),
@@ -112,7 +110,6 @@ export default function InvoiceEditor() {
                 vat: Number(i.vat),
                 total: Number(i.total),
             })));
-            setOriginalItemIds(itemRes.data.map((i: any) => i.id));
         }
 
         setLoading(false);
@@ -192,21 +189,17 @@ export default function InvoiceEditor() {
             vat_number: job.vat_number
         }, config);
 
-        // STEP 2: Delete old invoice items
-        await Promise.allSettled(originalItemIds.map(id => axios.delete(`${API_URL}/api/invoice-items/${id}/`, config)));
-        
-        // STEP 3: Create new invoice items
+        // STEP 2: Save all invoice items in one request (update / create / delete by diff)
         const validRows = rows.filter(r => r.charge_type && Number(r.amount) > 0);
-        await Promise.all(validRows.map(r => axios.post(`${API_URL}/api/invoice-items/`, {
-            job: Number(jobId),
+        await axios.put(`${API_URL}/api/jobs/${jobId}/invoice-items/`, validRows.map(r => ({
+            ...(r.id && { id: r.id }),
             charge_type: Number(r.charge_type),
             description: r.description,
             amount: Number(r.amount),
             vat: Number(r.vat.toFixed(3)),
-            total: Number(r.total.toFixed(3))
-        }, config)));
+        })), config);
 
-        // STEP 4: Mark job as invoiced (triggers signal to create shadow transaction)
+        // STEP 3: Mark job as invoiced (triggers signal to create shadow transaction)
         await axios.patch(`${API_URL}/api/jobs/${jobId}/`, {
             is_invoiced: true
         }, config);
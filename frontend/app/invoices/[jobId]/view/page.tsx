@@ -41,10 +41,10 @@ export default function InvoiceView() {
       try {
         const config = { headers: { Authorization: `Token ${token}` } };
         
-        const [jobRes, itemsRes, transRes, chargeRes] = await Promise.all([
+        const [jobRes, itemsRes, summaryRes, chargeRes] = await Promise.all([
           axios.get(`${API_URL}/api/jobs/${jobId}/`, config),
           axios.get(`${API_URL}/api/invoice-items/?job=${jobId}`, config),
-          axios.get(`${API_URL}/api/transactions/`, config),
+          axios.get(`${API_URL}/api/jobs/${jobId}/summary/`, config),
           axios.get(`${API_URL}/api/chargetypes/`, config) 
         ]);
 
@@ -52,11 +52,7 @@ export default function InvoiceView() {
         setItems(itemsRes.data);
         setChargeTypes(chargeRes.data);
 
-        const jobTransactions = transRes.data.filter((t: any) => 
-            t.job === Number(jobId) && ['CR', 'BR'].includes(t.trans_type)
-        );
-        const totalPaid = jobTransactions.reduce((sum: number, t: any) => sum + Number(t.amount), 0);
-        setCredits(totalPaid);
+        setCredits(Number(summaryRes.data.received));
 
         setLoading(false);
       } catch (err) { setLoading(false); }
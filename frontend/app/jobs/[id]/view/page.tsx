@@ -22,10 +22,10 @@ export default function ViewJob() {
       const config = { headers: { Authorization: `Token ${token}` } };
 
       try {
-        const res = await axios.get(`${API_URL}/api/jobs/${jobId}/?t=${Date.now()}`, config);
+        const res = await axios.get(`${API_URL}/api/jobs/${jobId}/`, config);
         setJob(res.data);
 
-        const invRes = await axios.get(`${API_URL}/api/invoice-items/?job=${jobId}&t=${Date.now()}`, config);
+        const invRes = await axios.get(`${API_URL}/api/invoice-items/?job=${jobId}`, config);
         if (invRes.data.length > 0) setHasInvoice(true);
 
         setLoading(false);
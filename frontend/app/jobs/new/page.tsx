@@ -3,6 +3,7 @@ import { useState, useEffect } from 'react';
 import axios from 'axios';
 import { useRouter } from 'next/navigation';
 import { API_URL } from '../../config'; 
+import { fetchAllPages } from '@/lib/api';
 
 export default function NewJob() {
   const router = useRouter();
@@ -50,10 +51,10 @@ export default function NewJob() {
     
     const fetchClients = async () => {
         try {
-            const res = await axios.get(`${API_URL}/api/clients/`, {
+            const data = await fetchAllPages(`${API_URL}/api/clients/`, {
                 headers: { Authorization: `Token ${token}` }
             });
-            setSavedClients(res.data);
+            setSavedClients(data);
         } catch (err) {
             console.error("Error fetching clients", err);
         }
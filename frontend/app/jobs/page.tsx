@@ -5,11 +5,12 @@ import axios from "axios";
 import Link from "next/link";
 import { useRouter } from "next/navigation";
 import { API_URL } from "../config";
+import { fetchPage } from "@/lib/api";
 import { DataTable } from "@/components/ui/data-table";
 import { StatusBadge } from "@/components/ui/status-badge";
 import { PageHeader } from "@/components/ui/page-header";
 import { PageSkeleton } from "@/components/ui/loading-skeleton";
-import { Plus, Eye, FileText, Trash2 } from "lucide-react";
+import { Plus, Eye, FileText, Trash2, ChevronLeft, ChevronRight } from "lucide-react";
 
 interface Job {
   id: number;
@@ -21,23 +22,60 @@ interface Job {
   port_discharge: string;
   is_finished?: boolean;
   is_invoiced?: boolean;
+  grand_total?: string;
 }
 
+const JOBS_PAGE_SIZE = 12;
+
+// Status filter → the API's is_invoiced / is_finished params
+const statusParams: Record<string, Record<string, string>> = {
+  ALL: {},
+  PENDING: { is_invoiced: "false", is_finished: "false" },
+  INVOICED: { is_invoiced: "true", is_finished: "false" },
+  COMPLETED: { is_finished: "true" },
+};
+
 export default function JobsList() {
   const router = useRouter();
   const [jobs, setJobs] = useState<Job[]>([]);
   const [loading, setLoading] = useState(true);
 
+  // Filters and ordering are applied by the API; pages are cursor links
+  const [ordering, setOrdering] = useState("");
+  const [status, setStatus] = useState("ALL");
+  const [mode, setMode] = useState("");
+  const [pageUrl, setPageUrl] = useState<string | null>(null);
+  const [next, setNext] = useState<string | null>(null);
+  const [previous, setPrevious] = useState<string | null>(null);
+
   useEffect(() => {
     const token = localStorage.getItem("token");
     if (!token) { window.location.href = "/login"; return; }
-    axios.get(`${API_URL}/api/jobs/`, { headers: { Authorization: `Token ${token}` } })
-      .then(res => { setJobs(res.data); setLoading(false); })
+    const config = { headers: { Authorization: `Token ${token}` } };
+    const request = pageUrl
+      ? fetchPage<Job>(pageUrl, config)
+      : fetchPage<Job>(`${API_URL}/api/jobs/`, {
+          ...config,
+          params: {
+            page_size: JOBS_PAGE_SIZE,
+            ...(ordering && { ordering }),
+            ...(mode && { transport_mode: mode }),
+            ...statusParams[status],
+          },
+        });
+    request
+      .then(page => { setJobs(page.results); setNext(page.next); setPrevious(page.previous); setLoading(false); })
       .catch((err: any) => {
         if (err.response?.status === 401) { localStorage.clear(); window.location.href = "/login"; }
         setLoading(false);
       });
-  }, []);
+  }, [pageUrl, ordering, status, mode]);
+
+  // A filter change starts again from the first page
+  const changeFilter = (setter: (value: string) => void) => (e: React.ChangeEvent<HTMLSelectElement>) => {
+    setter(e.target.value);
+    setPageUrl(null);
+  };
 
   const handleDelete = async (id: number) => {
     if (!confirm("Delete this job and its invoice?")) return;
@@ -52,11 +90,11 @@ export default function JobsList() {
 
   const columns = [
     {
-      key: "id", label: "Job #", sortable: true,
+      key: "id", label: "Job #",
       render: (row: Job) => <span className="font-mono text-xs font-semibold text-indigo-600">#{row.id}</span>,
     },
     {
-      key: "client_name", label: "Client", sortable: true,
+      key: "client_name", label: "Client",
       render: (row: Job) => <span className="font-medium">{row.client?.name || row.client_details?.name || "—"}</span>,
     },
     {
@@ -64,7 +102,7 @@ export default function JobsList() {
       render: (row: Job) => <span className="text-xs">{row.port_loading} → {row.port_discharge}</span>,
     },
     {
-      key: "transport_mode", label: "Mode", sortable: true,
+      key: "transport_mode", label: "Mode",
       render: (row: Job) => (
         <StatusBadge variant={row.transport_mode === "SEA" ? "sea" : row.transport_mode === "AIR" ? "air" : "land"}>
           {row.transport_mode}
@@ -72,9 +110,13 @@ export default function JobsList() {
       ),
     },
     {
-      key: "job_date", label: "Date", sortable: true,
+      key: "job_date", label: "Date",
       render: (row: Job) => <span className="text-xs text-muted-foreground">{row.job_date}</span>,
     },
+    {
+      key: "grand_total", label: "Total (OMR)",
+      render: (row: Job) => <span className="font-mono text-xs">{Number(row.grand_total || 0).toFixed(3)}</span>,
+    },
     {
       key: "status", label: "Status",
       render: (row: Job) => (
@@ -87,7 +129,7 @@ export default function JobsList() {
 
   return (
     <div className="space-y-6">
-      <PageHeader title="Jobs" description={`${jobs.length} total jobs`}>
+      <PageHeader title="Jobs" description="Shipments and their invoices">
         <Link href="/jobs/new">
           <button className="px-4 py-2.5 bg-indigo-600 hover:bg-indigo-700 text-white text-sm font-semibold rounded-lg shadow-sm transition flex items-center gap-2">
             <Plus className="w-4 h-4" /> New Job
@@ -95,13 +137,33 @@ export default function JobsList() {
         </Link>
       </PageHeader>
 
+      <div className="flex flex-col md:flex-row gap-4 p-4 bg-white border rounded-xl shadow-sm">
+        <select value={status} onChange={changeFilter(setStatus)}
+          className="px-3 py-2 border rounded-lg text-sm font-medium bg-slate-50 focus:outline-none focus:ring-2 focus:ring-indigo-500/20">
+          <option value="ALL">All statuses</option>
+          <option value="PENDING">Pending</option>
+          <option value="INVOICED">Invoiced</option>
+          <option value="COMPLETED">Completed</option>
+        </select>
+        <select value={mode} onChange={changeFilter(setMode)}
+          className="px-3 py-2 border rounded-lg text-sm font-medium bg-slate-50 focus:outline-none focus:ring-2 focus:ring-indigo-500/20">
+          <option value="">All modes</option>
+          <option value="SEA">Sea</option>
+          <option value="AIR">Air</option>
+          <option value="LAND">Land</option>
+        </select>
+        <select value={ordering} onChange={changeFilter(setOrdering)}
+          className="px-3 py-2 border rounded-lg text-sm font-medium bg-slate-50 focus:outline-none focus:ring-2 focus:ring-indigo-500/20">
+          <option value="">Newest first</option>
+          <option value="-grand_total">Total: high to low</option>
+          <option value="grand_total">Total: low to high</option>
+        </select>
+      </div>
+
       <DataTable
         columns={columns}
         data={jobs}
-        searchable
-        searchPlaceholder="Search jobs..."
-        searchKeys={["id", "port_loading", "port_discharge"]}
-        pageSize={12}
+        pageSize={JOBS_PAGE_SIZE}
         onRowClick={row => router.push(`/jobs/${row.id}/view`)}
         actions={row => (
           <div className="flex items-center gap-1">
@@ -117,6 +179,19 @@ export default function JobsList() {
           </div>
         )}
       />
+
+      {(previous || next) && (
+        <div className="flex items-center justify-end gap-2">
+          <button onClick={() => setPageUrl(previous)} disabled={!previous}
+            className="p-1.5 border rounded-lg bg-white disabled:opacity-30 hover:bg-slate-50 transition">
+            <ChevronLeft className="w-4 h-4" />
+          </button>
+          <button onClick={() => setPageUrl(next)} disabled={!next}
+            className="p-1.5 border rounded-lg bg-white disabled:opacity-30 hover:bg-slate-50 transition">
+            <ChevronRight className="w-4 h-4" />
+          </button>
+        </div>
+      )}
     </div>
   );
 }
@@ -17,22 +17,27 @@ import {
   PieChart, Pie, Cell, BarChart, Bar, Legend,
 } from "recharts";
 
-interface Job {
+interface RecentJob {
   id: number;
   job_date: string;
-  client?: { name: string; phone: string };
-  client_details?: { name: string; phone: string };
+  client_name: string | null;
   transport_mode: string;
   port_loading: string;
   port_discharge: string;
-  is_finished?: boolean;
+  is_finished: boolean;
 }
 
-interface Transaction {
-  id: number;
-  trans_type: string;
-  amount: number;
-  date: string;
+interface DashboardStats {
+  total_jobs: number;
+  active_jobs: number;
+  finished_jobs: number;
+  total_clients: number;
+  total_received: number;
+  total_paid: number;
+  net_balance: number;
+  monthly: { month: string; credits: number; debits: number }[];
+  transport_modes: { name: string; value: number }[];
+  recent_jobs: RecentJob[];
 }
 
 interface AuditLog {
@@ -45,8 +50,7 @@ interface AuditLog {
 const COLORS = ["#4F46E5", "#10B981", "#F59E0B", "#F43F5E"];
 
 export default function Dashboard() {
-  const [jobs, setJobs] = useState<Job[]>([]);
-  const [transactions, setTransactions] = useState<Transaction[]>([]);
+  const [stats, setStats] = useState<DashboardStats | null>(null);
   const [auditLogs, setAuditLogs] = useState<AuditLog[]>([]);
   const [loading, setLoading] = useState(true);
   const [activeMenu, setActiveMenu] = useState<number | null>(null);
@@ -57,12 +61,10 @@ export default function Dashboard() {
     const config = { headers: { Authorization: `Token ${token}` } };
 
     Promise.all([
-      axios.get(`${API_URL}/api/jobs/`, config),
-      axios.get(`${API_URL}/api/transactions/`, config),
-      axios.get(`${API_URL}/api/audit-logs/`, config),
-    ]).then(([jobsRes, transRes, auditRes]) => {
-      setJobs(jobsRes.data);
-      setTransactions(transRes.data);
+      axios.get(`${API_URL}/api/dashboard/stats/`, config),
+      axios.get(`${API_URL}/api/audit-logs/recent/`, { ...config, params: { limit: 15 } }),
+    ]).then(([statsRes, auditRes]) => {
+      setStats(statsRes.data);
       setAuditLogs(auditRes.data);
       setLoading(false);
     }).catch((err: any) => {
@@ -74,63 +76,37 @@ export default function Dashboard() {
     return () => window.removeEventListener("click", handleClick);
   }, []);
 
-  const totalReceived = useMemo(() =>
-    transactions.filter(t => ["CR", "BR"].includes(t.trans_type)).reduce((s, t) => s + Number(t.amount), 0),
-  [transactions]);
-
-  const totalPaid = useMemo(() =>
-    transactions.filter(t => ["CP", "BP"].includes(t.trans_type)).reduce((s, t) => s + Number(t.amount), 0),
-  [transactions]);
+  const jobs = stats?.recent_jobs ?? [];
+  const totalReceived = Number(stats?.total_received ?? 0);
+  const totalPaid = Number(stats?.total_paid ?? 0);
+  const netBalance = Number(stats?.net_balance ?? 0);
+  const transportModes = stats?.transport_modes ?? [];
 
-  const netBalance = totalReceived - totalPaid;
+  const monthlyRevenue = useMemo(() =>
+    (stats?.monthly ?? []).filter(m => Number(m.credits) > 0).map(m => ({
+      month: new Date(m.month + "-01").toLocaleDateString("en", { month: "short", year: "2-digit" }),
+      amount: Math.round(Number(m.credits)),
+    })),
+  [stats]);
 
-  const clientCount = useMemo(() => {
-    const names = new Set(jobs.map(j => j.client?.name || j.client_details?.name).filter(Boolean));
-    return names.size;
-  }, [jobs]);
-
-  const monthlyRevenue = useMemo(() => {
-    const months: Record<string, number> = {};
-    transactions.forEach(t => {
-      if (["CR", "BR"].includes(t.trans_type)) {
-        const month = t.date?.substring(0, 7);
-        if (month) months[month] = (months[month] || 0) + Number(t.amount);
-      }
-    });
-    return Object.entries(months).sort().slice(-12).map(([month, amount]) => ({
-      month: new Date(month + "-01").toLocaleDateString("en", { month: "short", year: "2-digit" }),
-      amount: Math.round(amount),
-    }));
-  }, [transactions]);
-
-  const transportModes = useMemo(() => {
-    const counts: Record<string, number> = {};
-    jobs.forEach(j => { counts[j.transport_mode] = (counts[j.transport_mode] || 0) + 1; });
-    return Object.entries(counts).map(([name, value]) => ({ name, value }));
-  }, [jobs]);
-
-  const monthlyTxns = useMemo(() => {
-    const months: Record<string, { credits: number; debits: number }> = {};
-    transactions.forEach(t => {
-      const month = t.date?.substring(0, 7);
-      if (!month) return;
-      if (!months[month]) months[month] = { credits: 0, debits: 0 };
-      if (["CR", "BR"].includes(t.trans_type)) months[month].credits += Number(t.amount);
-      else if (["CP", "BP"].includes(t.trans_type)) months[month].debits += Number(t.amount);
-    });
-    return Object.entries(months).sort().slice(-6).map(([month, data]) => ({
-      month: new Date(month + "-01").toLocaleDateString("en", { month: "short" }),
-      credits: Math.round(data.credits),
-      debits: Math.round(data.debits),
-    }));
-  }, [transactions]);
+  const monthlyTxns = useMemo(() =>
+    (stats?.monthly ?? []).slice(-6).map(m => ({
+      month: new Date(m.month + "-01").toLocaleDateString("en", { month: "short" }),
+      credits: Math.round(Number(m.credits)),
+      debits: Math.round(Number(m.debits)),
+    })),
+  [stats]);
 
   const handleDeleteJob = async (id: number) => {
     if (!confirm("Delete this job and its invoice?")) return;
     try {
       const token = localStorage.getItem("token");
       await axios.delete(`${API_URL}/api/jobs/${id}/`, { headers: { Authorization: `Token ${token}` } });
-      setJobs(jobs.filter(j => j.id !== id));
+      setStats(prev => prev && {
+        ...prev,
+        total_jobs: prev.total_jobs - 1,
+        recent_jobs: prev.recent_jobs.filter(j => j.id !== id),
+      });
     } catch { alert("Delete failed."); }
   };
 
@@ -151,9 +127,9 @@ export default function Dashboard() {
           subtitle={`${totalPaid.toLocaleString()} OMR paid out`} />
         <StatCard title="Outstanding" value={`${netBalance.toLocaleString()} OMR`} icon={AlertCircle}
           variant={netBalance < 0 ? "danger" : "default"} />
-        <StatCard title="Active Jobs" value={jobs.length} icon={Briefcase} variant="info"
-          subtitle={`${jobs.filter(j => j.is_finished).length} completed`} />
-        <StatCard title="Total Clients" value={clientCount} icon={Users} />
+        <StatCard title="Active Jobs" value={stats?.total_jobs ?? 0} icon={Briefcase} variant="info"
+          subtitle={`${stats?.finished_jobs ?? 0} completed`} />
+        <StatCard title="Total Clients" value={stats?.total_clients ?? 0} icon={Users} />
       </div>
 
       <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
@@ -233,13 +209,13 @@ export default function Dashboard() {
                 </tr>
               </thead>
               <tbody className="divide-y divide-slate-100">
-                {jobs.slice(0, 10).map(job => (
+                {jobs.map(job => (
                   <tr key={job.id} className="hover:bg-slate-50/80 transition-colors">
                     <td className="px-6 py-3">
                       <span className="font-mono text-xs font-semibold text-indigo-600">#{job.id}</span>
                       <p className="text-[10px] text-muted-foreground mt-0.5">{job.job_date}</p>
                     </td>
-                    <td className="px-6 py-3 font-medium">{job.client?.name || job.client_details?.name || "—"}</td>
+                    <td className="px-6 py-3 font-medium">{job.client_name || "—"}</td>
                     <td className="px-6 py-3">
                       <span className="text-xs">{job.port_loading} → {job.port_discharge}</span>
                     </td>
@@ -285,7 +261,7 @@ export default function Dashboard() {
             <h3 className="text-sm font-semibold">Recent Activity</h3>
           </div>
           <div className="p-4 space-y-4 max-h-[500px] overflow-y-auto custom-scrollbar">
-            {auditLogs.slice(0, 15).map(log => (
+            {auditLogs.map(log => (
               <div key={log.id} className="relative pl-5 border-l-2 border-slate-100 py-1 group">
                 <div className="absolute -left-[5px] top-2 w-2 h-2 rounded-full bg-slate-200 group-hover:bg-indigo-500 transition" />
                 <div className="flex justify-between items-start">
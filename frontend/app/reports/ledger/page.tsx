@@ -4,6 +4,7 @@ import { useState, useEffect, Suspense } from "react";
 import axios from "axios";
 import { useRouter, useSearchParams } from "next/navigation";
 import { API_URL } from "../../config";
+import { fetchAllPages } from "@/lib/api";
 
 interface Client {
   id: number;
@@ -25,6 +26,8 @@ interface LedgerEntry {
 
 interface LedgerData {
   client: Client;
+  opening_balance: string;
+  opening_balance_type: "Dr" | "Cr";
   entries: LedgerEntry[];
   total_debit: string;
   total_credit: string;
@@ -102,8 +105,7 @@ function LedgerStatement() {
       if (!token) { router.push("/login"); return; }
       try {
         const config = { headers: { Authorization: `Token ${token}` } };
-        const res = await axios.get(`${API_URL}/api/clients/`, config);
-        setClients(res.data);
+        setClients(await fetchAllPages(`${API_URL}/api/clients/`, config));
 
         if (preSelectedClientId) {
           const clientId = Number(preSelectedClientId);
@@ -137,6 +139,32 @@ function LedgerStatement() {
     });
   };
 
+  // Streams straight from the API as CSV — no JSON ledger is built in the browser
+  const downloadCsv = async () => {
+    if (!selectedClientId) { alert("Please select a client"); return; }
+    const token = localStorage.getItem("token");
+    try {
+      const res = await axios.get(`${API_URL}/api/reports/ledger/`, {
+        headers: { Authorization: `Token ${token}` },
+        responseType: "blob",
+        params: {
+          client_id: selectedClientId,
+          export: "csv",
+          ...(startDate && { start_date: startDate }),
+          ...(endDate && { end_date: endDate }),
+        },
+      });
+      const url = URL.createObjectURL(res.data);
+      const link = document.createElement("a");
+      link.href = url;
+      link.download = `ledger-${selectedClientId}.csv`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch {
+      alert("Failed to export ledger");
+    }
+  };
+
   const fetchLedger = async () => {
     if (!selectedClientId) { alert("Please select a client"); return; }
     setLoading(true);
@@ -197,6 +225,11 @@ function LedgerStatement() {
               data-testid="generate-ledger-button">
               {loading ? "Generating..." : "Generate Statement of Accounts"}
             </button>
+            <button onClick={downloadCsv} disabled={!selectedClientId}
+              className="w-full py-3 border rounded-lg text-sm font-semibold hover:bg-slate-50 transition disabled:opacity-50"
+              data-testid="export-ledger-button">
+              Export CSV
+            </button>
           </div>
         </div>
 
@@ -283,7 +316,9 @@ function LedgerStatement() {
                     <td style={{ ...td, fontWeight: "700" }}>Balance B/d</td>
                     <td style={{ ...td, textAlign: "right" }}></td>
                     <td style={{ ...td, textAlign: "right" }}></td>
-                    <td style={{ ...td, textAlign: "right", fontWeight: "700" }}>0.000</td>
+                    <td style={{ ...td, textAlign: "right", fontWeight: "700" }}>
+                      {Number(ledgerData.opening_balance).toFixed(3)}&nbsp;{ledgerData.opening_balance_type}
+                    </td>
                   </tr>
 
                   {ledgerData.entries.length === 0 ? (
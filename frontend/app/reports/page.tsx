@@ -3,6 +3,7 @@ import { useState, useEffect, useMemo } from "react";
 import axios from "axios";
 import { useRouter } from "next/navigation";
 import { API_URL } from "../config";
+import { fetchAllPages, fetchPage } from "@/lib/api";
 import { StatCard } from "@/components/ui/stat-card";
 import { PageHeader } from "@/components/ui/page-header";
 import { PageSkeleton } from "@/components/ui/loading-skeleton";
@@ -18,46 +19,66 @@ const getDefaultFromDate = () => {
 
 const getToday = () => new Date().toISOString().split("T")[0];
 
+interface Statement {
+  total_received: string;
+  total_paid: string;
+  total_invoiced: string;
+  periods: { period: string; received: string; paid: string; invoiced: string }[];
+}
+
+// Statement rows per request; "Load more" follows the API's cursor link
+const STATEMENT_PAGE_SIZE = 25;
+
 export default function Reports() {
   const router = useRouter();
 
   const [transactions, setTransactions] = useState<any[]>([]);
-  const [jobMap, setJobMap] = useState<{ [key: number]: string }>({});
+  const [next, setNext] = useState<string | null>(null);
+  const [statement, setStatement] = useState<Statement | null>(null);
   const [clients, setClients] = useState<string[]>([]);
   const [selectedClient, setSelectedClient] = useState("ALL");
   const [startDate, setStartDate] = useState(getDefaultFromDate());
   const [endDate, setEndDate] = useState(getToday());
   const [loading, setLoading] = useState(true);
-  const [currentPage, setCurrentPage] = useState(1);
-  const itemsPerPage = 10;
+  const [loadingMore, setLoadingMore] = useState(false);
 
+  const authConfig = () => ({ headers: { Authorization: `Token ${localStorage.getItem("token")}` } });
+
+  // Party names for the filter: parties plus clients (a client's transactions
+  // carry its name as party_name)
+  useEffect(() => {
+    const token = localStorage.getItem("token");
+    if (!token) { window.location.href = "/login"; return; }
+    Promise.all([
+      fetchAllPages<{ name: string }>(`${API_URL}/api/parties/`, authConfig()),
+      fetchAllPages<{ name: string }>(`${API_URL}/api/clients/`, authConfig()),
+    ])
+      .then(([parties, clientList]) => {
+        const names = [...parties, ...clientList].map(p => p.name?.toUpperCase().trim()).filter(Boolean);
+        setClients(Array.from(new Set(names)).sort() as string[]);
+      })
+      .catch(err => console.error(err));
+  }, []);
+
+  // Party and date range are filtered by the API: totals and the chart come
+  // from the aggregated statement, the table is paged newest first
   useEffect(() => {
     const init = async () => {
-      const token = localStorage.getItem("token");
-      if (!token) { window.location.href = "/login"; return; }
+      if (!localStorage.getItem("token")) return;
+      const params = {
+        ...(startDate && { date_from: startDate }),
+        ...(endDate && { date_to: endDate }),
+        ...(selectedClient !== "ALL" && { party_name: selectedClient }),
+      };
 
       try {
-        const [jobsRes, transRes] = await Promise.all([
-          axios.get(`${API_URL}/api/jobs/`, { headers: { Authorization: `Token ${token}` } }),
-          axios.get(`${API_URL}/api/transactions/`, { headers: { Authorization: `Token ${token}` } }),
+        const [statementRes, page] = await Promise.all([
+          axios.get<Statement>(`${API_URL}/api/reports/statement/`, { ...authConfig(), params: { ...params, group_by: "day" } }),
+          fetchPage(`${API_URL}/api/transactions/`, { ...authConfig(), params: { ...params, page_size: STATEMENT_PAGE_SIZE } }),
         ]);
-
-        const map: { [key: number]: string } = {};
-        jobsRes.data.forEach((j: any) => {
-          map[j.id] = j.client_details?.name || j.client?.name || "Unknown";
-        });
-        setJobMap(map);
-
-        const txns = Array.isArray(transRes.data) ? transRes.data : transRes.data.results || [];
-        const sortedData = txns.sort((a: any, b: any) => new Date(a.date).getTime() - new Date(b.date).getTime());
-        setTransactions(sortedData);
-
-        const rawNames = [
-          ...sortedData.map((t: any) => t.display_party_name || t.party_name || (t.job ? map[t.job] : null) || "Unknown"),
-          ...Object.values(map),
-        ];
-        const cleanNames = Array.from(new Set(rawNames.filter(n => n).map(n => n?.toUpperCase().trim()))).sort();
-        setClients(cleanNames);
+        setStatement(statementRes.data);
+        setTransactions(page.results);
+        setNext(page.next);
       } catch (err) {
         console.error(err);
       } finally {
@@ -65,51 +86,52 @@ export default function Reports() {
       }
     };
     init();
-  }, []);
+  }, [selectedClient, startDate, endDate]);
+
+  const loadMore = async () => {
+    if (!next) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(next, authConfig());
+      setTransactions(t => [...t, ...page.results]);
+      setNext(page.next);
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
-  const reportData = useMemo(() => {
-    let runningBalance = 0;
+  const totalReceived = Number(statement?.total_received ?? 0);
+  const totalPaid = Number(statement?.total_paid ?? 0) + Number(statement?.total_invoiced ?? 0);
+  const netBalance = totalReceived - totalPaid;
 
-    let result = transactions.map(t => {
-      const nameFromJob = t.job ? jobMap[t.job] : null;
-      const resolvedName = (t.display_party_name || t.party_name || nameFromJob || "General Transaction").trim().toUpperCase();
-      return { ...t, resolvedName };
+  const chartData = useMemo(() => {
+    let balance = 0;
+    return (statement?.periods ?? []).map(p => {
+      balance += Number(p.received) - Number(p.paid) - Number(p.invoiced);
+      return { date: p.period, balance };
     });
+  }, [statement]);
 
-    if (selectedClient !== "ALL") {
-      const term = selectedClient.toUpperCase();
-      result = result.filter(t => t.resolvedName === term);
-    }
-
-    const start = startDate ? new Date(startDate) : null;
-    const end = endDate ? new Date(endDate) : null;
-    if (start) result = result.filter(t => new Date(t.date) >= start);
-    if (end) {
-      const endOfDay = new Date(end);
-      endOfDay.setHours(23, 59, 59, 999);
-      result = result.filter(t => new Date(t.date) <= endOfDay);
-    }
+  // Rows come newest first, so each row's balance is the closing balance
+  // less everything after it
+  const reportData = useMemo(() => {
+    let runningBalance = netBalance;
 
-    return result.map(t => {
+    return transactions.map(t => {
+      const resolvedName = (t.display_party_name || t.party_name || "General Transaction").trim().toUpperCase();
       const amount = Math.abs(Number(t.amount || 0));
       const isCredit = ["CR", "BR"].includes(t.trans_type);
       const isPaidOut = ["CP", "BP"].includes(t.trans_type);
       const isDebit = t.trans_type === "INVOICE";
       const received = isCredit ? amount : 0;
       const paid = (isPaidOut || isDebit) ? amount : 0;
-      runningBalance += (received - paid);
-      return { ...t, received, paid, invoiceAmt: isDebit ? amount : 0, currentBalance: runningBalance };
+      const currentBalance = runningBalance;
+      runningBalance -= (received - paid);
+      return { ...t, resolvedName, received, paid, invoiceAmt: isDebit ? amount : 0, currentBalance };
     });
-  }, [transactions, selectedClient, startDate, endDate, jobMap]);
-
-  const totalReceived = reportData.reduce((sum, t) => sum + t.received, 0);
-  const totalPaid = reportData.reduce((sum, t) => sum + t.paid, 0);
-  const netBalance = totalReceived - totalPaid;
-
-  const paginatedData = reportData.slice((currentPage - 1) * itemsPerPage, currentPage * itemsPerPage);
-  const totalPages = Math.ceil(reportData.length / itemsPerPage);
-
-  useEffect(() => { setCurrentPage(1); }, [selectedClient, startDate, endDate]);
+  }, [transactions, netBalance]);
 
   if (loading) return <PageSkeleton />;
 
@@ -152,12 +174,12 @@ export default function Reports() {
       </div>
 
       {/* Running Balance Chart */}
-      {reportData.length > 0 && (
+      {chartData.length > 0 && (
         <div className="bg-white rounded-xl border shadow-sm p-6">
           <h3 className="text-sm font-semibold mb-4">Running Balance</h3>
           <div className="h-48">
             <ResponsiveContainer width="100%" height="100%">
-              <LineChart data={reportData.map(r => ({ date: r.date, balance: r.currentBalance }))}>
+              <LineChart data={chartData}>
                 <CartesianGrid strokeDasharray="3 3" stroke="#f1f5f9" />
                 <XAxis dataKey="date" tick={{ fontSize: 10 }} stroke="#94a3b8" />
                 <YAxis tick={{ fontSize: 10 }} stroke="#94a3b8" />
@@ -183,10 +205,10 @@ export default function Reports() {
             </tr>
           </thead>
           <tbody>
-            {paginatedData.length === 0 ? (
+            {reportData.length === 0 ? (
               <tr><td colSpan={6} className="p-10 text-center text-muted-foreground">No transactions match your filters.</td></tr>
             ) : (
-              paginatedData.map((t: any) => (
+              reportData.map((t: any) => (
                 <tr key={t.id} className="border-t hover:bg-slate-50/50 transition-colors">
                   <td className="p-4 font-medium text-xs">{t.date}</td>
                   <td className="p-4">
@@ -204,21 +226,11 @@ export default function Reports() {
         </table>
       </div>
 
-      {/* Pagination */}
-      {totalPages > 1 && (
-        <div className="bg-white p-4 rounded-xl border shadow-sm flex items-center justify-between">
-          <button onClick={() => setCurrentPage(p => Math.max(1, p - 1))} disabled={currentPage === 1}
-            className="px-4 py-2 text-sm font-medium bg-slate-100 rounded-lg hover:bg-slate-200 disabled:opacity-50 transition">
-            Previous
-          </button>
-          <span className="text-sm text-muted-foreground">
-            Page {currentPage} of {totalPages} ({reportData.length} total)
-          </span>
-          <button onClick={() => setCurrentPage(p => Math.min(totalPages, p + 1))} disabled={currentPage >= totalPages}
-            className="px-4 py-2 text-sm font-medium bg-slate-100 rounded-lg hover:bg-slate-200 disabled:opacity-50 transition">
-            Next
-          </button>
-        </div>
+      {next && (
+        <button onClick={loadMore} disabled={loadingMore}
+          className="w-full py-3 text-sm font-medium bg-white border rounded-xl shadow-sm hover:bg-slate-50 disabled:opacity-50 transition">
+          {loadingMore ? "Loading..." : `Load more (${reportData.length} shown)`}
+        </button>
       )}
     </div>
   );
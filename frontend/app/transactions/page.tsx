@@ -1,10 +1,12 @@
 "use client";
 
-import { useState, useEffect, useMemo } from "react";
+import { useState, useEffect } from "react";
 import axios from "axios";
 import { useRouter } from "next/navigation";
 import { API_URL } from "../config";
-import CreatableSelect from "react-select/creatable";
+import { fetchPage } from "@/lib/api";
+import AsyncSelect from "react-select/async";
+import AsyncCreatableSelect from "react-select/async-creatable";
 import { StatCard } from "@/components/ui/stat-card";
 import { PageHeader } from "@/components/ui/page-header";
 import { PageSkeleton } from "@/components/ui/loading-skeleton";
@@ -13,9 +15,16 @@ import { DollarSign, TrendingUp, TrendingDown, ArrowLeftRight, X } from "lucide-
 interface Client {
   id: number;
   name: string;
-  address?: string;
+  vat_number?: string | null;
 }
 
+// Typeahead page size for the client and job dropdowns (server-side search)
+const CLIENT_LOOKUP_LIMIT = 20;
+const JOB_LOOKUP_LIMIT = 20;
+
+// History rows per request; "Load more" follows the API's cursor link
+const HISTORY_PAGE_SIZE = 20;
+
 interface Job {
   id: number;
   client: number;
@@ -27,6 +36,16 @@ interface SelectOption {
   value: number | string;
 }
 
+interface Summary {
+  received: number;
+  paid: number;
+  monthNet: number;
+}
+
+const jobOption = (j: Job): SelectOption => ({
+  label: `Job #${j.id} - ${j.client_details?.name || 'Unknown Client'}`, value: j.id,
+});
+
 const tabConfig = {
   CR: { label: "Cash Receive", color: "bg-emerald-100 text-emerald-700 border-emerald-300" },
   CP: { label: "Cash Pay", color: "bg-rose-100 text-rose-700 border-rose-300" },
@@ -46,11 +65,12 @@ export default function Transactions() {
   const [clients, setClients] = useState<Client[]>([]);
   const [selectedClient, setSelectedClient] = useState<SelectOption | null>(null);
 
-  const [jobs, setJobs] = useState<Job[]>([]);
+  const [jobOptions, setJobOptions] = useState<SelectOption[]>([]);
   const [history, setHistory] = useState<any[]>([]);
+  const [historyNext, setHistoryNext] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
-  const [currentPage, setCurrentPage] = useState(1);
-  const itemsPerPage = 10;
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [summary, setSummary] = useState<Summary>({ received: 0, paid: 0, monthNet: 0 });
 
   const [historyFilter, setHistoryFilter] = useState<"ALL"|"CR"|"CP"|"BR"|"BP">("ALL");
 
@@ -61,6 +81,22 @@ export default function Transactions() {
   const [editType, setEditType] = useState<"CR"|"CP"|"BR"|"BP">("CR");
   const [editLoading, setEditLoading] = useState(false);
 
+  const authConfig = () => ({ headers: { Authorization: `Token ${localStorage.getItem("token")}` } });
+
+  // Totals come from the aggregated statement, not from the loaded rows
+  const loadSummary = async () => {
+    const monthStart = new Date().toISOString().substring(0, 7) + "-01";
+    const [all, month] = await Promise.all([
+      axios.get(`${API_URL}/api/reports/statement/`, authConfig()),
+      axios.get(`${API_URL}/api/reports/statement/`, { ...authConfig(), params: { date_from: monthStart } }),
+    ]);
+    setSummary({
+      received: Number(all.data.total_received),
+      paid: Number(all.data.total_paid),
+      monthNet: Number(month.data.net_balance),
+    });
+  };
+
   useEffect(() => {
     const init = async () => {
       const token = localStorage.getItem("token");
@@ -68,16 +104,13 @@ export default function Transactions() {
 
       try {
         const config = { headers: { Authorization: `Token ${token}` } };
-        const clientsRes = await axios.get(`${API_URL}/api/clients-from-jobs/`, config);
-        setClients(clientsRes.data);
-
-        const [jobsRes, histRes] = await Promise.all([
-          axios.get(`${API_URL}/api/jobs/`, config),
-          axios.get(`${API_URL}/api/transactions/`, config),
+        const [clientsRes, jobsPage] = await Promise.all([
+          axios.get(`${API_URL}/api/clients-from-jobs/`, { ...config, params: { limit: CLIENT_LOOKUP_LIMIT } }),
+          fetchPage<Job>(`${API_URL}/api/jobs/`, { ...config, params: { page_size: JOB_LOOKUP_LIMIT } }),
+          loadSummary(),
         ]);
-
-        setJobs(jobsRes.data);
-        setHistory(histRes.data);
+        setClients(clientsRes.data);
+        setJobOptions(jobsPage.results.map(jobOption));
       } catch (err: any) {
         if (err.response?.status === 401) { router.push("/login"); }
       } finally {
@@ -87,14 +120,39 @@ export default function Transactions() {
     init();
   }, [router]);
 
+  // First history page for the selected type, filtered by the API
+  useEffect(() => {
+    if (!localStorage.getItem("token")) return;
+    fetchPage(`${API_URL}/api/transactions/`, {
+      ...authConfig(),
+      params: { page_size: HISTORY_PAGE_SIZE, ...(historyFilter !== "ALL" && { trans_type: historyFilter }) },
+    })
+      .then(page => { setHistory(page.results); setHistoryNext(page.next); })
+      .catch(() => { setHistory([]); setHistoryNext(null); });
+  }, [historyFilter]);
+
+  const loadMoreHistory = async () => {
+    if (!historyNext) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(historyNext, authConfig());
+      setHistory(h => [...h, ...page.results]);
+      setHistoryNext(page.next);
+    } catch { alert("Failed to load more transactions"); }
+    finally { setLoadingMore(false); }
+  };
+
   useEffect(() => {
     if (selectedJob && typeof selectedJob.value === 'number') {
-      const job = jobs.find(j => j.id === selectedJob.value);
-      if (job && job.client_details) {
-        setSelectedClient({ label: job.client_details.name, value: job.client_details.id });
-      }
+      axios.get<Job>(`${API_URL}/api/jobs/${selectedJob.value}/`, authConfig())
+        .then(({ data: job }) => {
+          if (job.client_details) {
+            setSelectedClient({ label: job.client_details.name, value: job.client_details.id });
+          }
+        })
+        .catch(() => {});
     }
-  }, [selectedJob, jobs]);
+  }, [selectedJob]);
 
   const handleSubmit = async () => {
     if (!amount || !selectedClient) { alert("Amount and Client are required"); return; }
@@ -118,7 +176,8 @@ export default function Transactions() {
       if (selectedJob && typeof selectedJob.value === 'number') payload.job = selectedJob.value;
 
       const res = await axios.post(`${API_URL}/api/transactions/`, payload, { headers: { Authorization: `Token ${token}` } });
-      setHistory(h => [res.data, ...h]);
+      if (historyFilter === "ALL" || historyFilter === res.data.trans_type) setHistory(h => [res.data, ...h]);
+      loadSummary().catch(() => {});
       setAmount("");
       setSelectedClient(null);
       setSelectedJob(null);
@@ -133,6 +192,7 @@ export default function Transactions() {
         headers: { Authorization: `Token ${localStorage.getItem("token")}` },
       });
       setHistory(h => h.filter(t => t.id !== id));
+      loadSummary().catch(() => {});
     } catch { alert("Delete failed"); }
   };
 
@@ -155,6 +215,7 @@ export default function Transactions() {
         { headers: { Authorization: `Token ${token}` } }
       );
       setHistory(h => h.map(t => (t.id === editingTxn.id ? res.data : t)));
+      loadSummary().catch(() => {});
       setEditingTxn(null);
     } catch (err: any) {
       alert(err.response?.data?.detail || "Failed to update transaction");
@@ -162,22 +223,36 @@ export default function Transactions() {
   };
 
   const clientOptions: SelectOption[] = clients.map(c => ({ label: c.name, value: c.id }));
-  const jobOptions: SelectOption[] = jobs.map(j => ({
-    label: `Job #${j.id} - ${j.client_details?.name || 'Unknown Client'}`, value: j.id
-  }));
+  const loadClientOptions = async (input: string): Promise<SelectOption[]> => {
+    const res = await axios.get(`${API_URL}/api/clients-from-jobs/`, {
+      headers: { Authorization: `Token ${localStorage.getItem("token")}` },
+      params: { q: input, limit: CLIENT_LOOKUP_LIMIT },
+    });
+    return res.data.map((c: Client) => ({ label: c.name, value: c.id }));
+  };
+  // A job number looks the job up directly; anything else searches job
+  // document and container numbers
+  const loadJobOptions = async (input: string): Promise<SelectOption[]> => {
+    const term = input.replace(/^#/, "").trim();
+    if (/^\d+$/.test(term)) {
+      try {
+        const res = await axios.get<Job>(`${API_URL}/api/jobs/${term}/`, authConfig());
+        return [jobOption(res.data)];
+      } catch { return []; }
+    }
+    if (!term) return jobOptions;
+    const res = await axios.get(`${API_URL}/api/search/`, {
+      ...authConfig(), params: { q: term, types: "jobs", limit: JOB_LOOKUP_LIMIT },
+    });
+    return res.data.jobs.map((j: { id: number; label: string }) => ({ label: j.label, value: j.id }));
+  };
   const isClientLocked = selectedJob !== null;
 
-  const totalCredits = useMemo(() =>
-    history.filter(t => ["CR", "BR"].includes(t.trans_type)).reduce((s, t) => s + Number(t.amount), 0), [history]);
-  const totalDebits = useMemo(() =>
-    history.filter(t => ["CP", "BP"].includes(t.trans_type)).reduce((s, t) => s + Number(t.amount), 0), [history]);
+  const totalCredits = summary.received;
+  const totalDebits = summary.paid;
 
   if (loading) return <PageSkeleton />;
 
-  const filtered = historyFilter === "ALL" ? history : history.filter(t => t.trans_type === historyFilter);
-  const paginated = filtered.slice((currentPage - 1) * itemsPerPage, currentPage * itemsPerPage);
-  const totalPages = Math.ceil(filtered.length / itemsPerPage);
-
   return (
     <div className="space-y-6">
       <PageHeader title="Transactions" description="Record and manage financial entries">
@@ -194,7 +269,7 @@ export default function Transactions() {
         <StatCard title="Total Credits" value={`${totalCredits.toFixed(3)} OMR`} icon={TrendingUp} variant="success" />
         <StatCard title="Total Debits" value={`${totalDebits.toFixed(3)} OMR`} icon={TrendingDown} variant="danger" />
         <StatCard title="Net Balance" value={`${(totalCredits - totalDebits).toFixed(3)} OMR`} icon={DollarSign} variant="info" />
-        <StatCard title="This Month" value={history.filter(t => t.date?.startsWith(new Date().toISOString().substring(0, 7))).length} icon={ArrowLeftRight} />
+        <StatCard title="This Month" value={`${summary.monthNet.toFixed(3)} OMR`} icon={ArrowLeftRight} />
       </div>
 
       <div className="grid grid-cols-1 lg:grid-cols-5 gap-6">
@@ -228,8 +303,8 @@ export default function Transactions() {
 
               <div className="col-span-2">
                 <label className="text-xs font-medium text-slate-700 mb-1 block">Link Job (Optional)</label>
-                <CreatableSelect isClearable value={selectedJob} onChange={option => setSelectedJob(option)}
-                  options={jobOptions} placeholder="Select or search job..."
+                <AsyncSelect isClearable cacheOptions value={selectedJob} onChange={option => setSelectedJob(option)}
+                  defaultOptions={jobOptions} loadOptions={loadJobOptions} placeholder="Select or search job..."
                   styles={{ control: (base) => ({ ...base, padding: '4px', borderRadius: '0.5rem', fontSize: '14px' }) }} />
                 <p className="text-xs text-muted-foreground mt-1">Selecting a job locks the client automatically</p>
               </div>
@@ -238,9 +313,10 @@ export default function Transactions() {
                 <label className="text-xs font-medium text-slate-700 mb-1 block">
                   {["CR", "BR"].includes(activeTab) ? "Received From" : "Paid To"} *
                 </label>
-                <CreatableSelect isClearable value={selectedClient}
+                <AsyncCreatableSelect isClearable cacheOptions value={selectedClient}
                   onChange={option => !isClientLocked && setSelectedClient(option)}
-                  options={clientOptions}
+                  defaultOptions={clientOptions}
+                  loadOptions={loadClientOptions}
                   placeholder={isClientLocked ? "Locked to job's client" : "Select or create new client..."}
                   isDisabled={isClientLocked}
                   styles={{ control: (base) => ({ ...base, padding: '4px', borderRadius: '0.5rem', fontSize: '14px', backgroundColor: isClientLocked ? '#f8fafc' : 'white' }) }} />
@@ -272,23 +348,21 @@ export default function Transactions() {
           <div className="bg-white rounded-xl border p-1 flex gap-1">
             {(["ALL","CR","CP","BR","BP"] as const).map(key => {
               const labels: Record<string,string> = { ALL:"All", CR:"CR", CP:"CP", BR:"BR", BP:"BP" };
-              const cnt = key === "ALL" ? history.length : history.filter(t => t.trans_type === key).length;
               return (
-                <button key={key} onClick={() => { setHistoryFilter(key); setCurrentPage(1); }}
-                  className={`flex-1 py-1.5 text-xs font-semibold rounded-lg transition flex flex-col items-center gap-0.5 ${
+                <button key={key} onClick={() => setHistoryFilter(key)}
+                  className={`flex-1 py-1.5 text-xs font-semibold rounded-lg transition ${
                     historyFilter === key ? "bg-indigo-600 text-white shadow" : "text-slate-500 hover:bg-slate-100"
                   }`}>
-                  <span>{labels[key]}</span>
-                  <span className={`text-[10px] ${historyFilter === key ? "text-white/60" : "text-slate-400"}`}>{cnt}</span>
+                  {labels[key]}
                 </button>
               );
             })}
           </div>
 
-          {filtered.length === 0 && (
+          {history.length === 0 && (
             <div className="text-sm text-muted-foreground italic p-4 bg-white rounded-xl border">No transactions yet</div>
           )}
-          {paginated.map(t => (
+          {history.map(t => (
             <div key={t.id} className="bg-white p-4 rounded-xl border shadow-sm flex justify-between items-center">
               <div>
                 <p className="font-medium text-sm">
@@ -318,18 +392,11 @@ export default function Transactions() {
             </div>
           ))}
 
-          {totalPages > 1 && (
-            <div className="flex items-center justify-between bg-white p-3 rounded-xl border text-sm">
-              <button onClick={() => setCurrentPage(p => Math.max(1, p - 1))} disabled={currentPage === 1}
-                className="px-3 py-1 text-xs font-medium bg-slate-100 rounded hover:bg-slate-200 disabled:opacity-50">
-                Previous
-              </button>
-              <span className="text-xs text-muted-foreground">Page {currentPage} of {totalPages}</span>
-              <button onClick={() => setCurrentPage(p => Math.min(totalPages, p + 1))} disabled={currentPage >= totalPages}
-                className="px-3 py-1 text-xs font-medium bg-slate-100 rounded hover:bg-slate-200 disabled:opacity-50">
-                Next
-              </button>
-            </div>
+          {historyNext && (
+            <button onClick={loadMoreHistory} disabled={loadingMore}
+              className="w-full py-2 text-xs font-medium bg-white border rounded-xl hover:bg-slate-50 disabled:opacity-50">
+              {loadingMore ? "Loading..." : "Load more"}
+            </button>
           )}
         </div>
       </div>
@@ -0,0 +1,36 @@
+import axios, { AxiosRequestConfig } from "axios";
+
+// Jobs, transactions, clients and audit logs are cursor-paginated by the API:
+// { next, previous, results }. Other list endpoints still return a bare array.
+export interface Page<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+export function listResults<T = any>(data: Page<T> | T[]): T[] {
+  return Array.isArray(data) ? data : data?.results ?? [];
+}
+
+// One page of a cursor-paginated list. Pass the filters in config.params for
+// the first page; a `next`/`previous` link already carries them.
+export async function fetchPage<T = any>(url: string, config: AxiosRequestConfig = {}): Promise<Page<T>> {
+  const res = await axios.get<Page<T> | T[]>(url, config);
+  return Array.isArray(res.data) ? { next: null, previous: null, results: res.data } : res.data;
+}
+
+// Follows `next` links until the list is exhausted — one request per page, so
+// only for short reference lists (e.g. clients for a dropdown). Large lists
+// (jobs, transactions) should page with fetchPage and a "load more" control.
+export async function fetchAllPages<T = any>(url: string, config: AxiosRequestConfig = {}): Promise<T[]> {
+  const items: T[] = [];
+  let res = await axios.get<Page<T> | T[]>(url, config);
+  items.push(...listResults(res.data));
+
+  while (!Array.isArray(res.data) && res.data.next) {
+    // `next` already carries the filters and cursor
+    res = await axios.get<Page<T>>(res.data.next, { ...config, params: undefined });
+    items.push(...listResults(res.data));
+  }
+  return items;
+}